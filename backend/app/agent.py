@@ -1,88 +1,323 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime
 from .models import Holding, StockSnapshot, AlertEvent
 from .config import settings
-from .sentiment import vader_score_0_100, llm_summarize
-from .notify import notify_telegram
-from .market import fetch_snapshot
+from .sentiment import llm_enabled, llm_summarize
+from .llm_scheduler import PRIORITY_CRITICAL, PRIORITY_ROUTINE
+from .notify import enqueue_notification
+from .market import MarketQuote, fetch_quotes
+from .price_history import PriceFeatures, price_store
 from .polygon_client import fetch_ticker_news
-from .reddit_client import fetch_reddit_mentions
-from .content_pipeline import ingest_polygon_news, ingest_reddit, build_top_bullets
-from .rules import get_or_create_rule, should_trigger
-
-def compute_risk(change_pct_1d: float, sentiment: float, risk_pref: str) -> float:
-    vol_component = min(5.0, abs(change_pct_1d) / 2.0)
-    sentiment_component = min(5.0, max(0.0, (50.0 - sentiment) / 10.0))
-    base = vol_component + sentiment_component
-    if risk_pref == "conservative":
-        base += 0.7
-    elif risk_pref == "aggressive":
-        base -= 0.4
+from .reddit_client import fetch_reddit_mentions_bulk
+from .content_pipeline import ingest_polygon_news, ingest_reddit, build_top_bullets, holding_sentiments
+from .rules import rule_table
+from .leases import claimed
+from .alerts import alerts_to_fire, hysteresis_margins
+from .rollups import record_snapshots
+from .live import broker
+from .metrics import AGENT_CYCLES, ALERTS_FIRED, ROWS_WRITTEN, profiler, span, trace
+from .summary_cache import summary_key, get_cached_summaries, store_summaries, evict_summaries
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class RiskParams:
+    """Weights of compute_risk; app.backtest replays history with alternatives."""
+    vol_div: float = 2.0
+    vol_cap: float = 5.0
+    sentiment_pivot: float = 50.0
+    sentiment_div: float = 10.0
+    sentiment_cap: float = 5.0
+    conservative: float = 0.7
+    aggressive: float = -0.4
+    # 有本地价格历史时，波动项取 max(|当日涨跌|, 加权的已实现波动率, 加权的最大跳空)
+    realized_vol_weight: float = 1.0
+    gap_weight: float = 0.5
+
+    def pref_offset(self, risk_pref: str) -> float:
+        if risk_pref == "conservative":
+            return self.conservative
+        if risk_pref == "aggressive":
+            return self.aggressive
+        return 0.0
+
+RISK_DEFAULTS = RiskParams()
+
+def compute_risk(
+    change_pct_1d: float, sentiment: float, risk_pref: str, p: RiskParams = RISK_DEFAULTS,
+    features: PriceFeatures | None = None,
+) -> float:
+    move = abs(change_pct_1d)
+    if features is not None:
+        move = max(move, p.realized_vol_weight * features.realized_vol_pct, p.gap_weight * features.max_gap_pct)
+    vol_component = min(p.vol_cap, move / p.vol_div)
+    sentiment_component = min(p.sentiment_cap, max(0.0, (p.sentiment_pivot - sentiment) / p.sentiment_div))
+    base = vol_component + sentiment_component + p.pref_offset(risk_pref)
     return float(max(0.0, min(10.0, base)))
 
-async def run_agent_once(db: Session) -> int:
-    holdings = db.query(Holding).all()
-    count = 0
-    for h in holdings:
-        symbol = h.symbol.upper()
-        
-        # 1) 行情
-        price, change_pct_1d, volume = await fetch_snapshot(symbol)
-        
-        # 2) 内容摄入
-        try:
-            news = await fetch_ticker_news(symbol, limit=settings.NEWS_LIMIT)
-            ingest_polygon_news(db, h, news)
-        except Exception:
-            pass
-        
+class ProviderLimits:
+    """Per-cycle concurrency caps, one semaphore per upstream provider."""
+
+    def __init__(self):
+        self.symbols = asyncio.Semaphore(max(1, settings.AGENT_CONCURRENCY))
+        self.news = asyncio.Semaphore(max(1, settings.NEWS_CONCURRENCY))
+
+@dataclass
+class SymbolData:
+    """Upstream data for one symbol, fetched once per cycle and shared by all its holdings."""
+    symbol: str
+    price: float = 0.0
+    change_pct_1d: float = 0.0
+    volume: float | None = None
+    features: PriceFeatures | None = None  # from the local price history
+    news: list[dict] = field(default_factory=list)
+    reddit: list[dict] = field(default_factory=list)
+
+@dataclass
+class HoldingWork:
+    holding: Holding
+    holding_id: int
+    symbol: str
+    risk_pref: str
+    data: SymbolData | None = None
+    bullets: list[str] = field(default_factory=list)
+    sentiment: float = 50.0
+    risk: float = 0.0
+    hot_now: float = 0.0
+    reason: str = ""  # non-empty when the holding's rule triggers this cycle
+    fire: list[str] = field(default_factory=list)  # reasons that alert this cycle after cooldown/hysteresis
+    summary: str | None = None
+
+def cycle_deadline_seconds() -> float:
+    if settings.AGENT_CYCLE_DEADLINE_SECONDS:
+        return float(settings.AGENT_CYCLE_DEADLINE_SECONDS)
+    return settings.AGENT_CRON_MINUTES * 60 * 0.9
+
+async def _gather_until(coros: list, deadline: float) -> list:
+    """Run coroutines concurrently; anything unfinished at `deadline` is cancelled and yields None."""
+    if not coros:
+        return []
+    loop = asyncio.get_running_loop()
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    done, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline - loop.time()))
+    for t in pending:
+        t.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+        logger.warning("agent cycle deadline hit: %d/%d tasks cancelled", len(pending), len(tasks))
+    results = []
+    failed = []
+    for t in tasks:
+        if t in done and t.exception() is None:
+            results.append(t.result())
+        else:
+            results.append(None)
+            if t in done:
+                failed.append(t.exception())
+    if failed:
+        logger.warning("%d/%d agent tasks failed, first: %r", len(failed), len(tasks), failed[0])
+    return results
+
+async def _fetch_symbol(quote: MarketQuote, limits: ProviderLimits) -> SymbolData:
+    symbol = quote.symbol
+    d = SymbolData(symbol=symbol, price=quote.price, change_pct_1d=quote.change_pct_1d, volume=quote.volume)
+    async with limits.symbols:
+        # 2) 内容抓取
         try:
-            reddit_items = fetch_reddit_mentions(symbol, limit=settings.REDDIT_LIMIT)
-            ingest_reddit(db, h, reddit_items)
-        except Exception:
-            pass
-        
-        # 3) 构建 Top bullets
-        bullets = build_top_bullets(db, h, hours=48, limit=30)
-        
-        # 4) Sentiment
-        sentiment = vader_score_0_100(bullets)
-        
-        # 5) Risk
-        risk = compute_risk(change_pct_1d, sentiment, h.risk_pref)
-        
-        # 6) LLM 摘要
-        summary = await llm_summarize(symbol, bullets)
-        
-        snap = StockSnapshot(
-            holding_id=h.id,
-            ts=datetime.utcnow(),
-            price=price,
-            change_pct_1d=change_pct_1d,
-            volume=volume,
-            sentiment_score=sentiment,
-            risk_score=risk,
-            summary=summary,
-        )
-        db.add(snap)
-        db.commit()
-        
-        # 7) 规则触发
-        rule = get_or_create_rule(db, h)
-        hot_now = 0.0
-        if bullets:
+            async with limits.news:
+                d.news = await fetch_ticker_news(symbol, limit=settings.NEWS_LIMIT)
+        except Exception as e:
+            # 已计入 guardian_upstream_errors_total；该 symbol 本轮只用已存内容
+            logger.warning("news fetch for %s failed: %r", symbol, e)
+        return d
+
+def _ingest_and_score(db: Session, work: list[HoldingWork]) -> None:
+    """Sync DB phase: ingest content, rank bullets, score sentiment/risk and evaluate rules + alert state."""
+    # 2-3) 单写入阶段：内容摄入 + Top bullets
+    for w in work:
+        for source, ingest, rows in (("news", ingest_polygon_news, w.data.news), ("reddit", ingest_reddit, w.data.reddit)):
             try:
-                hot_now = float(bullets[0].split("hot:")[1].split(")")[0])
+                with span("ingest_" + source):
+                    ingest(db, w.holding, rows)
             except Exception:
-                hot_now = 0.0
-        
-        ok, reason = should_trigger(rule, risk, sentiment, hot_now, change_pct_1d)
-        if ok:
-            title = f"{symbol} alert ({reason})"
-            detail = f"Risk={risk:.1f}/10, Sentiment={sentiment:.0f}/100, Hot={hot_now:.0f}, Change={change_pct_1d:.2f}%"
-            alert = AlertEvent(holding_id=h.id, level="critical", title=title, detail=detail)
-            db.add(alert)
-            db.commit()
-            await notify_telegram(f"[CRITICAL] {title} {detail}")
-            count += 1
-    return count
+                logger.exception("%s ingest failed for %s", source, w.symbol)
+                db.rollback()
+        with span("bullets"):
+            w.bullets = build_top_bullets(db, w.holding, hours=settings.CONTENT_WINDOW_HOURS, limit=30)
+
+    # 4) Sentiment：直接聚合已存储的逐条得分，不再对 bullets 重跑 VADER
+    with span("sentiment"):
+        sentiments = holding_sentiments(
+            db, [w.holding_id for w in work], hours=settings.CONTENT_WINDOW_HOURS, limit=30,
+            hot_weighted=settings.SENTIMENT_HOT_WEIGHTED,
+        )
+
+    # 5, 7) Risk / 规则判定（先于 LLM，触发告警的持仓摘要优先调度）
+    for w in work:
+        w.sentiment = sentiments[w.holding_id]
+        w.risk = compute_risk(w.data.change_pct_1d, w.sentiment, w.risk_pref, features=w.data.features)
+        if w.bullets:
+            try:
+                w.hot_now = float(w.bullets[0].split("hot:")[1].split(")")[0])
+            except (IndexError, ValueError):
+                w.hot_now = 0.0
+    holding_ids = [w.holding_id for w in work]
+    with span("rules"):
+        conds = rule_table.conditions(
+            db,
+            holding_ids,
+            [w.risk for w in work],
+            [w.sentiment for w in work],
+            [w.hot_now for w in work],
+            [w.data.change_pct_1d for w in work],
+            margins=hysteresis_margins(),
+        )
+        for w, reason, fire in zip(work, conds.reasons(), alerts_to_fire(db, holding_ids, conds)):
+            w.reason = reason
+            w.fire = fire
+
+def _persist_cycle(db: Session, work: list[HoldingWork]) -> int:
+    # 快照 + 告警 + 通知入队，单次提交；发送由 outbox worker 异步完成
+    fired = 0
+    now = datetime.utcnow()
+    for w in work:
+        d = w.data
+        db.add(StockSnapshot(
+            holding_id=w.holding_id,
+            ts=now,
+            price=d.price,
+            change_pct_1d=d.change_pct_1d,
+            volume=d.volume,
+            sentiment_score=w.sentiment,
+            risk_score=w.risk,
+            summary=w.summary,
+        ))
+        if w.fire:
+            title = f"{w.symbol} alert ({', '.join(w.fire)})"
+            detail = f"Risk={w.risk:.1f}/10, Sentiment={w.sentiment:.0f}/100, Hot={w.hot_now:.0f}, Change={d.change_pct_1d:.2f}%"
+            if d.features is not None:
+                detail += f", RVol={d.features.realized_vol_pct:.2f}%, MaxGap={d.features.max_gap_pct:.2f}%"
+            db.add(AlertEvent(holding_id=w.holding_id, level="critical", title=title, detail=detail))
+            enqueue_notification(db, f"[CRITICAL] {title} {detail}")
+            fired += 1
+    record_snapshots(
+        db,
+        [(w.holding_id, now, w.data.price, w.risk, w.sentiment) for w in work],
+        {w.holding_id for w in work if w.fire},
+    )
+    with span("commit"):
+        db.commit()
+    ROWS_WRITTEN.inc(len(work), table="snapshots")
+    ROWS_WRITTEN.inc(fired, table="alerts")
+    ALERTS_FIRED.inc(fired)
+    return fired
+
+async def run_agent_once(db: AsyncSession, cycle: int | None = None) -> int:
+    """One agent cycle. With AGENT_COORDINATION=claim only the symbols this process claims for `cycle`
+    (default: the current AGENT_CRON_MINUTES window) are processed.
+
+    Stage timings are logged as one line per cycle and exported on /metrics."""
+    with trace("agent_cycle"), profiler.profile("agent"):
+        fired = await _agent_cycle(db, cycle)
+    AGENT_CYCLES.inc()
+    return fired
+
+async def _agent_cycle(db: AsyncSession, cycle: int | None) -> int:
+    work = [
+        HoldingWork(holding=h, holding_id=h.id, symbol=h.symbol.upper(), risk_pref=h.risk_pref)
+        for h in (await db.execute(select(Holding))).scalars()
+    ]
+    by_symbol: dict[str, list[HoldingWork]] = {}
+    for w in work:
+        by_symbol.setdefault(w.symbol, []).append(w)
+
+    deadline = asyncio.get_running_loop().time() + cycle_deadline_seconds()
+    if settings.AGENT_COORDINATION != "claim":
+        return await _run_cycle(db, by_symbol, deadline)
+
+    # 分批认领：先完成的进程继续领下一批，负载在进程间自然摊开
+    window = settings.AGENT_CRON_MINUTES * 60
+    if cycle is None:
+        cycle = int(time.time() // window)
+    fired = 0
+    remaining = list(by_symbol)
+    while remaining and asyncio.get_running_loop().time() < deadline:
+        async with claimed(db, "agent", remaining, window, cycle, limit=settings.AGENT_CLAIM_BATCH) as mine:
+            if not mine:
+                break
+            fired += await _run_cycle(db, {s: by_symbol[s] for s in mine}, deadline)
+        done = set(mine)
+        remaining = [s for s in remaining if s not in done]
+    return fired
+
+async def _summarize(db: AsyncSession, work: list[HoldingWork], deadline: float) -> None:
+    prompts: dict[str, list[HoldingWork]] = {}
+    for w in work:
+        prompts.setdefault(summary_key(w.symbol, w.bullets), []).append(w)
+    cached = await db.run_sync(get_cached_summaries, list(prompts))
+    misses = [k for k in prompts if k not in cached]
+    calls = []
+    for k in misses:
+        w = prompts[k][0]
+        priority = PRIORITY_CRITICAL if any(x.reason for x in prompts[k]) else PRIORITY_ROUTINE
+        calls.append(llm_summarize(w.symbol, w.bullets, priority=priority))
+    results = await _gather_until(calls, deadline)
+    fresh = {k: (prompts[k][0].symbol, text) for k, text in zip(misses, results) if text}
+    await db.run_sync(store_summaries, fresh)
+    for k, ws in prompts.items():
+        text = cached.get(k) or (fresh[k][1] if k in fresh else None)
+        for w in ws:
+            w.summary = text
+    await db.run_sync(evict_summaries)
+
+async def _run_cycle(db: AsyncSession, by_symbol: dict[str, list[HoldingWork]], deadline: float) -> int:
+    limits = ProviderLimits()
+
+    # 1) 行情：按 provider 批量请求，TTL 缓存内直接复用
+    with span("quotes"):
+        (quotes,) = await _gather_until([fetch_quotes(list(by_symbol))], deadline)
+    quotes = quotes or {}
+    symbols = [s for s in by_symbol if s in quotes]
+    if len(symbols) < len(by_symbol):
+        logger.warning("no quote for %d/%d symbols", len(by_symbol) - len(symbols), len(by_symbol))
+    # 本地价格历史：追加本轮报价并取窗口特征（文件 I/O 放到线程里）
+    features: dict[str, PriceFeatures] = {}
+    if price_store.enabled:
+        with span("price_history"):
+            features = await asyncio.to_thread(price_store.record_quotes, [quotes[s] for s in symbols])
+
+    # 2) 按 symbol 并发抓取新闻，每个 symbol 每轮只抓一次；Reddit 整轮只拉一次 new 列表再本地分发（不触碰 DB）
+    with span("fetch"):
+        reddit_task = asyncio.ensure_future(fetch_reddit_mentions_bulk(symbols, settings.REDDIT_LIMIT))
+        fetched = await _gather_until([_fetch_symbol(quotes[s], limits) for s in symbols], deadline)
+        (reddit_by_symbol,) = await _gather_until([reddit_task], deadline)
+    reddit_by_symbol = reddit_by_symbol or {}
+    work = []
+    for symbol, data in zip(symbols, fetched):
+        if data is None:
+            continue
+        data.reddit = reddit_by_symbol.get(symbol, [])
+        data.features = features.get(symbol)
+        for w in by_symbol[symbol]:
+            w.data = data
+            work.append(w)
+
+    # 2-5, 7) DB 阶段在 run_sync 中执行：I/O 走异步驱动，不阻塞 event loop
+    with span("ingest_and_score"):
+        await db.run_sync(_ingest_and_score, work)
+
+    # 6) LLM 摘要：按 (symbol, model, bullets) 内容寻址缓存，未命中的才并发请求（受 deadline 约束）
+    if llm_enabled():
+        with span("summaries"):
+            await _summarize(db, work, deadline)
+
+    with span("persist"):
+        fired = await db.run_sync(_persist_cycle, work)
+    broker.notify()  # 推送本轮新快照/告警
+    return fired
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from .config import settings
+from .models import AlertState
+from .rules import REASON_KINDS, RuleConditions
+
+def hysteresis_margins() -> tuple[float, float, float, float]:
+    return (
+        settings.ALERT_HYSTERESIS_RISK,
+        settings.ALERT_HYSTERESIS_SENTIMENT,
+        settings.ALERT_HYSTERESIS_HOT,
+        settings.ALERT_HYSTERESIS_CHANGE,
+    )
+
+def alerts_to_fire(db: Session, holding_ids: list[int], conds: RuleConditions, now: datetime | None = None) -> list[list[str]]:
+    """Reasons that should alert now, per holding, after cooldown and hysteresis.
+
+    A condition fires when it turns active while its state is idle and the last firing is older than
+    ALERT_COOLDOWN_MINUTES; it only re-arms once the metric leaves the hysteresis band. States are
+    updated in the session; the caller commits.
+    """
+    now = now or datetime.utcnow()
+    cooldown = timedelta(minutes=settings.ALERT_COOLDOWN_MINUTES)
+    out: list[list[str]] = [[] for _ in holding_ids]
+    if not holding_ids:
+        return out
+    pos = {hid: i for i, hid in enumerate(holding_ids)}
+    states = {
+        (st.holding_id, st.kind): st
+        for st in db.execute(select(AlertState).where(AlertState.holding_id.in_(holding_ids))).scalars()
+    }
+
+    # 离开滞回区间的激活态先解除
+    for (hid, kind), st in states.items():
+        if st.active and conds.cleared[REASON_KINDS.index(kind), pos[hid]]:
+            st.active = False
+
+    new_states = []
+    for k, i in zip(*np.nonzero(conds.active)):
+        k, i = int(k), int(i)
+        hid, kind = holding_ids[i], REASON_KINDS[k]
+        st = states.get((hid, kind))
+        if st is None:
+            out[i].append(conds.reason(k, i))
+            new_states.append({"holding_id": hid, "kind": kind, "active": True, "last_fired_at": now})
+            continue
+        if st.active:
+            continue  # 条件持续成立，不重复告警
+        st.active = True
+        if st.last_fired_at is None or now - st.last_fired_at >= cooldown:
+            out[i].append(conds.reason(k, i))
+            st.last_fired_at = now
+    if new_states:
+        db.execute(insert(AlertState), new_states)
+    return out
@@ -0,0 +1,416 @@
+"""Offline replay of risk scoring and trigger rules over stored history.
+
+Snapshots and content items are loaded once into NumPy columns; every candidate parameter set is then
+replayed across all holdings and time steps without touching the DB. The per-(holding, kind) alert
+state machine of alerts.alerts_to_fire (latch on the condition, re-arm outside the hysteresis band,
+cooldown between firings) is reproduced exactly, with each snapshot as one agent cycle and every state
+starting idle. Price-history features (realized volatility, gaps) come from the local price store as of
+each snapshot. Series shared between parameter sets (recomputed sentiment, risk, per-kind firings) are
+computed once per distinct input.
+
+Approximations against the live cycle: recomputed sentiment averages every cluster head in the window
+rather than the 30 hottest, each head placed at its own ts rather than its newest member's, and the hot
+metric is the hottest single item instead of its cluster.
+
+    cd backend && python -m app.backtest --days 30 --set risk_ge=7,8,9 --set cooldown_minutes=60,240
+"""
+import argparse
+import itertools
+import json
+import math
+import time
+from dataclasses import asdict, dataclass, field, fields, replace
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from .agent import RISK_DEFAULTS, RiskParams
+from .alerts import hysteresis_margins
+from .config import settings
+from .price_history import PriceStore, price_store
+from .models import AlertEvent, ContentItem, Holding, StockSnapshot, TriggerRule
+from .rules import REASON_KINDS, RULE_DEFAULTS
+from .scoring import RANK_EPOCH, ensure_utc
+
+THRESHOLDS = ("risk_ge", "sentiment_le", "hot_ge", "change_abs_ge")  # REASON_KINDS order
+
+@dataclass(frozen=True)
+class Params:
+    """One candidate configuration. Thresholds left at None use each holding's own TriggerRule."""
+    risk_ge: float | None = None
+    sentiment_le: float | None = None
+    hot_ge: float | None = None
+    change_abs_ge: float | None = None
+    cooldown_minutes: float = field(default_factory=lambda: settings.ALERT_COOLDOWN_MINUTES)
+    hysteresis: tuple[float, float, float, float] = field(default_factory=hysteresis_margins)
+    sentiment_hours: float | None = None  # None: the sentiment stored on each snapshot
+    hot_weighted: bool = field(default_factory=lambda: settings.SENTIMENT_HOT_WEIGHTED)
+    risk: RiskParams = RISK_DEFAULTS
+
+    def label(self) -> str:
+        base = Params()
+        parts = [f"{f.name}={getattr(self, f.name)}" for f in fields(self) if f.name != "risk" and getattr(self, f.name) != getattr(base, f.name)]
+        parts += [f"{k}={v}" for k, v in asdict(self.risk).items() if v != getattr(RISK_DEFAULTS, k)]
+        return " ".join(parts) or "current"
+
+@dataclass
+class History:
+    """Snapshots and content of the replayed holdings, sorted by (holding, ts); `seg` indexes holding_ids."""
+    holding_ids: np.ndarray
+    risk_pref: list[str]
+    enabled: np.ndarray
+    thresholds: np.ndarray  # (4, H) stored TriggerRule thresholds
+    seg: np.ndarray
+    ts: np.ndarray  # epoch seconds
+    change: np.ndarray
+    sentiment: np.ndarray
+    realized_vol: np.ndarray  # price-history features per snapshot, 0 where the store has too little history
+    max_gap: np.ndarray
+    c_seg: np.ndarray
+    c_ts: np.ndarray
+    c_rank: np.ndarray
+    c_sentiment: np.ndarray
+    c_head: np.ndarray
+    actual_alerts: int
+    _cache: dict = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        n = self.seg.size
+        starts = np.searchsorted(self.seg, np.arange(self.holding_ids.size))
+        self.seg_start = starts[self.seg] if n else np.zeros(0, dtype=np.int64)
+        self.t0 = int(min(self.ts.min(initial=0), self.c_ts.min(initial=0)))
+        # (seg, ts) 合成单调键，按持仓分段的 searchsorted 只需一次
+        self.span = int(max(self.ts.max(initial=0), self.c_ts.max(initial=0)) - self.t0) + 1
+
+    def _key(self, seg: np.ndarray, ts: np.ndarray) -> np.ndarray:
+        return seg.astype(np.int64) * self.span + np.clip(ts - self.t0, 0, self.span - 1)
+
+    def _content_upto(self, mask: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Content (optionally masked), its (seg, ts) keys and, per snapshot, one past the last item at or before it."""
+        seg, ts = (self.c_seg, self.c_ts) if mask is None else (self.c_seg[mask], self.c_ts[mask])
+        keys = self._key(seg, ts)
+        return keys, seg, np.searchsorted(keys, self._key(self.seg, self.ts), side="right")
+
+    def hot(self) -> np.ndarray:
+        """Hot score of the hottest item at each snapshot (0 without content)."""
+        if "hot" in self._cache:
+            return self._cache["hot"]
+        _, seg, hi = self._content_upto()
+        out = np.zeros(self.seg.size)
+        if self.c_rank.size:
+            # 分段累计最大值：每段加上足够大的偏移，让全局 maximum.accumulate 不跨段
+            off = float(np.ptp(self.c_rank)) + 1.0
+            cm = np.maximum.accumulate(self.c_rank + seg * off) - seg * off
+            last = hi - 1
+            has = (last >= 0) & (seg[np.maximum(last, 0)] == self.seg)
+            out[has] = np.exp(np.minimum(cm[last[has]] - _rank_hours(self.ts[has]), 700.0))
+        self._cache["hot"] = out
+        return out
+
+    def sentiment_for(self, hours: float | None, hot_weighted: bool) -> np.ndarray:
+        """Holding sentiment at each snapshot: stored, or re-aggregated from cluster heads of the last `hours`."""
+        if hours is None:
+            return self.sentiment
+        key = ("sentiment", hours, hot_weighted)
+        if key in self._cache:
+            return self._cache[key]
+        head = self.c_head
+        keys, seg, hi = self._content_upto(head)
+        span = max(int(hours * 3600), 1)
+        lo = np.searchsorted(keys, self._key(self.seg, self.ts - span), side="left")
+        out = np.full(self.seg.size, 50.0)
+        if not keys.size:
+            self._cache[key] = out
+            return out
+        # 热度权重随时间指数增长，不能共用一个基准做前缀和：按 (持仓, 长度为窗口的时间块) 分组，
+        # 权重相对组内最热一条取指数（≤ 1）；每个窗口最多跨两个相邻块，按两块基准之差换算后合并
+        rank = self.c_rank[head] if hot_weighted else np.zeros(keys.size)
+        block = (self.c_ts[head] - self.t0) // span
+        nblocks = (self.span - 1) // span + 2  # 覆盖快照与内容的全部时间；多留一块使 b - 1 不会落到上一个持仓
+        group = seg.astype(np.int64) * nblocks + block
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        groups, ref = group[starts], np.maximum.reduceat(rank, starts)
+        w = np.exp(rank - np.repeat(ref, np.diff(np.r_[starts, group.size])))
+        ws = np.concatenate([[0.0], np.cumsum(w)])
+        wss = np.concatenate([[0.0], np.cumsum(w * self.c_sentiment[head])])
+
+        b = (self.ts - self.t0) // span
+        cut = np.searchsorted(keys, self._key(self.seg, self.t0 + b * span), side="left")  # 当前块的第一条
+
+        def group_ref(q: np.ndarray) -> np.ndarray:
+            i = np.minimum(np.searchsorted(groups, q), groups.size - 1)
+            return np.where(groups[i] == q, ref[i], -np.inf)
+
+        q = self.seg.astype(np.int64) * nblocks + b
+        r_cur, r_prev = group_ref(q), group_ref(q - 1)
+        top = np.maximum(r_cur, r_prev)
+        has = np.isfinite(top)
+        with np.errstate(invalid="ignore"):
+            f_cur = np.where(has, np.exp(r_cur - top), 0.0)
+            f_prev = np.where(has, np.exp(r_prev - top), 0.0)
+        total = (ws[hi] - ws[cut]) * f_cur + (ws[cut] - ws[lo]) * f_prev
+        num = (wss[hi] - wss[cut]) * f_cur + (wss[cut] - wss[lo]) * f_prev
+        ok = total > 0
+        out[ok] = np.clip(num[ok] / total[ok], 0.0, 100.0)
+        self._cache[key] = out
+        return out
+
+    def risk_for(self, p: Params) -> np.ndarray:
+        key = ("risk", p.risk, p.sentiment_hours, p.hot_weighted)
+        if key not in self._cache:
+            offset = np.array([p.risk.pref_offset(pref) for pref in self.risk_pref], dtype=np.float64)
+            self._cache[key] = risk_scores(
+                self.change, self.sentiment_for(p.sentiment_hours, p.hot_weighted), offset[self.seg], p.risk,
+                self.realized_vol, self.max_gap,
+            )
+        return self._cache[key]
+
+    def fires(self, p: Params, kind: int) -> np.ndarray:
+        """Snapshot positions at which condition `kind` fires under `p`."""
+        th = getattr(p, THRESHOLDS[kind])
+        series = {0: (p.risk, p.sentiment_hours, p.hot_weighted), 1: (p.sentiment_hours, p.hot_weighted)}.get(kind)
+        key = ("fires", kind, th, p.hysteresis[kind], p.cooldown_minutes, series)
+        if key in self._cache:
+            return self._cache[key]
+        value = (
+            self.risk_for(p) if kind == 0
+            else self.sentiment_for(p.sentiment_hours, p.hot_weighted) if kind == 1
+            else self.hot() if kind == 2
+            else np.abs(self.change)
+        )
+        threshold = self.thresholds[kind][self.seg] if th is None else th
+        out = replay(
+            value, threshold, p.hysteresis[kind], self.enabled[self.seg], kind == 1,
+            self.seg, self.seg_start, self.ts, int(p.cooldown_minutes * 60),
+        )
+        self._cache[key] = out
+        return out
+
+def _rank_hours(ts: np.ndarray) -> np.ndarray:
+    return (ts - RANK_EPOCH.timestamp()) / 3600.0 * math.log(2.0) / settings.RANK_HALF_LIFE_HOURS
+
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+def _epoch(values) -> np.ndarray:
+    # 库里的时间按 naive UTC 存；带时区的先归一
+    return np.fromiter(
+        (((v if v.tzinfo is None else ensure_utc(v).replace(tzinfo=None)) - _EPOCH) // _SECOND for v in values), dtype=np.int64,
+    )
+
+def risk_scores(
+    change: np.ndarray, sentiment: np.ndarray, offset: np.ndarray, p: RiskParams = RISK_DEFAULTS,
+    realized_vol: np.ndarray | None = None, max_gap: np.ndarray | None = None,
+) -> np.ndarray:
+    """agent.compute_risk over arrays; `offset` is the risk_pref adjustment per element."""
+    move = np.abs(change)
+    if realized_vol is not None:
+        move = np.maximum(move, p.realized_vol_weight * realized_vol)
+    if max_gap is not None:
+        move = np.maximum(move, p.gap_weight * max_gap)
+    vol = np.minimum(p.vol_cap, move / p.vol_div)
+    sent = np.minimum(p.sentiment_cap, np.maximum(0.0, (p.sentiment_pivot - sentiment) / p.sentiment_div))
+    return np.clip(vol + sent + offset, 0.0, 10.0)
+
+def replay(
+    value: np.ndarray, threshold, margin: float, enabled: np.ndarray, below: bool,
+    seg: np.ndarray, seg_start: np.ndarray, ts: np.ndarray, cooldown_s: int,
+) -> np.ndarray:
+    """Positions where one condition fires, following alerts_to_fire over per-holding series.
+
+    The latch is "the last active step is not older than the last cleared step"; firings are the
+    latch's rising edges, thinned by the cooldown.
+    """
+    if below:
+        active, cleared = value <= threshold, value > threshold + margin
+    else:
+        active, cleared = value >= threshold, value < threshold - margin
+    active &= enabled
+    cleared |= ~enabled
+    pos = np.arange(value.size)
+    last_set = np.maximum.accumulate(np.where(active, pos, -1))
+    last_clr = np.maximum.accumulate(np.where(cleared, pos, -1))
+    latched = (last_set >= seg_start) & (last_set >= last_clr)
+    was = np.zeros(value.size, dtype=bool)
+    was[1:] = latched[:-1]
+    was &= pos > seg_start
+    edges = np.flatnonzero(active & ~was)
+    return _cooldown(edges, seg[edges], ts[edges], cooldown_s)
+
+def _cooldown(edges: np.ndarray, seg: np.ndarray, ts: np.ndarray, cooldown_s: int) -> np.ndarray:
+    """Greedy cooldown per holding: keep the first edge, then the first one at least `cooldown_s` later, ..."""
+    if edges.size == 0 or cooldown_s <= 0:
+        return edges
+    span = int(ts.max() - ts.min()) + cooldown_s + 1
+    key = seg.astype(np.int64) * span + (ts - ts.min())
+    nxt = np.searchsorted(key, key + cooldown_s, side="left")
+    keep = np.zeros(edges.size, dtype=bool)
+    # 每轮所有持仓并行前进一跳，轮数 = 单个持仓的最大告警数
+    cur = np.flatnonzero(np.r_[True, seg[1:] != seg[:-1]])
+    while cur.size:
+        keep[cur] = True
+        n = nxt[cur]
+        ok = n < edges.size
+        cur, n = cur[ok], n[ok]
+        cur = n[seg[n] == seg[cur]]
+    return edges[keep]
+
+def load_history(
+    db: Session, since: datetime, until: datetime | None = None, holding_ids: list[int] | None = None,
+    store: PriceStore | None = price_store,
+) -> History:
+    until = until or datetime.utcnow()
+    hq = select(Holding.id, Holding.symbol, Holding.risk_pref).order_by(Holding.id)
+    if holding_ids is not None:
+        hq = hq.where(Holding.id.in_(holding_ids))
+    holdings = db.execute(hq).all()
+    ids = np.array([h.id for h in holdings], dtype=np.int64)
+    rules = {r.holding_id: r for r in db.execute(select(TriggerRule)).scalars()}
+    enabled = np.array([rules[h].enabled if h in rules else RULE_DEFAULTS["enabled"] for h in ids.tolist()], dtype=bool)
+    thresholds = np.array([
+        [getattr(rules[h], name) if h in rules else RULE_DEFAULTS[name] for h in ids.tolist()] for name in THRESHOLDS
+    ], dtype=np.float64).reshape(4, ids.size)
+
+    def rows(*cols, model):
+        q = select(model.holding_id, model.ts, *cols).where(model.ts >= since, model.ts <= until)
+        if holding_ids is not None:
+            q = q.where(model.holding_id.in_(holding_ids))
+        return db.execute(q.order_by(model.holding_id, model.ts)).all()
+
+    snaps = rows(StockSnapshot.change_pct_1d, StockSnapshot.sentiment_score, model=StockSnapshot)
+    # 热度与情绪窗口需要区间开始前的内容
+    content_since = since - timedelta(days=7)
+    q = (
+        select(ContentItem.holding_id, ContentItem.ts, ContentItem.rank_key, ContentItem.sentiment_score,
+               ContentItem.cluster_id == ContentItem.id)
+        .where(ContentItem.ts >= content_since, ContentItem.ts <= until, ContentItem.rank_key.is_not(None))
+        .order_by(ContentItem.holding_id, ContentItem.ts)
+    )
+    if holding_ids is not None:
+        q = q.where(ContentItem.holding_id.in_(holding_ids))
+    content = db.execute(q).all()
+    aq = select(func.count(AlertEvent.id)).where(AlertEvent.ts >= since, AlertEvent.ts <= until)
+    if holding_ids is not None:
+        aq = aq.where(AlertEvent.holding_id.in_(holding_ids))
+
+    def col(data, i, dtype=np.float64):
+        return np.array([r[i] for r in data], dtype=dtype)
+
+    seg = np.searchsorted(ids, col(snaps, 0, np.int64))
+    ts = _epoch(r[1] for r in snaps)
+    realized_vol, max_gap = np.zeros(seg.size), np.zeros(seg.size)
+    if store is not None and store.enabled:
+        bounds = np.searchsorted(seg, np.arange(ids.size + 1))
+        for i, h in enumerate(holdings):
+            lo, hi = bounds[i], bounds[i + 1]
+            if hi > lo:
+                st = store.features_at(h.symbol, ts[lo:hi])
+                realized_vol[lo:hi] = np.where(st["valid"], st["realized_vol_pct"], 0.0)
+                max_gap[lo:hi] = np.where(st["valid"], st["max_gap_pct"], 0.0)
+
+    return History(
+        holding_ids=ids,
+        risk_pref=[h.risk_pref for h in holdings],
+        enabled=enabled,
+        thresholds=thresholds,
+        seg=seg,
+        ts=ts,
+        change=col(snaps, 2),
+        sentiment=col(snaps, 3),
+        realized_vol=realized_vol,
+        max_gap=max_gap,
+        c_seg=np.searchsorted(ids, col(content, 0, np.int64)),
+        c_ts=_epoch(r[1] for r in content),
+        c_rank=col(content, 2),
+        c_sentiment=col(content, 3),
+        c_head=col(content, 4, bool),
+        actual_alerts=int(db.execute(aq).scalar() or 0),
+    )
+
+@dataclass
+class Result:
+    params: Params
+    alerts: int  # alert events: snapshots with at least one firing, as AlertEvent rows
+    holdings: int  # holdings alerted at least once
+    by_kind: dict[str, int]
+
+    def row(self) -> dict:
+        return {"params": self.params.label(), "alerts": self.alerts, "holdings": self.holdings, **self.by_kind}
+
+def evaluate(history: History, p: Params) -> Result:
+    per_kind = [history.fires(p, k) for k in range(len(REASON_KINDS))]
+    mask = np.zeros(history.seg.size, dtype=bool)
+    for f in per_kind:
+        mask[f] = True
+    fired = np.flatnonzero(mask)
+    segs = history.seg[fired]  # 已按持仓有序
+    return Result(
+        params=p, alerts=int(fired.size), holdings=int(np.count_nonzero(np.diff(segs)) + 1 if segs.size else 0),
+        by_kind={kind: int(f.size) for kind, f in zip(REASON_KINDS, per_kind)},
+    )
+
+def sweep(history: History, params: list[Params]) -> list[Result]:
+    return [evaluate(history, p) for p in params]
+
+_RISK_FIELDS = {f.name for f in fields(RiskParams)}
+
+def grid(base: Params | None = None, **axes: list) -> list[Params]:
+    """Cartesian product of `axes` (Params or RiskParams field names) on top of `base`."""
+    base = base or Params()
+    names = list(axes)
+    out = []
+    for values in itertools.product(*(axes[n] for n in names)):
+        p = replace(base, **{n: v for n, v in zip(names, values) if n not in _RISK_FIELDS})
+        risk = {n: v for n, v in zip(names, values) if n in _RISK_FIELDS}
+        out.append(replace(p, risk=replace(p.risk, **risk)) if risk else p)
+    return out
+
+def _parse_axis(spec: str) -> tuple[str, list]:
+    name, _, values = spec.partition("=")
+    name = name.strip().replace("-", "_")
+    if name == "hot_weighted":
+        return name, [v.strip().lower() in ("1", "true", "yes") for v in values.split(",")]
+    if name == "hysteresis":
+        return name, [tuple(float(x) for x in v.split("/")) for v in values.split(",")]
+    if name not in _RISK_FIELDS and name not in {f.name for f in fields(Params)}:
+        raise SystemExit(f"unknown parameter {name!r}")
+    return name, [None if v.strip() in ("", "none", "stored") else float(v) for v in values.split(",")]
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Replay stored history with candidate risk / rule parameters.")
+    ap.add_argument("--days", type=float, default=30.0)
+    ap.add_argument("--holding", type=int, action="append", help="restrict to these holding ids")
+    ap.add_argument("--set", action="append", default=[], metavar="NAME=V1,V2",
+                    help="parameter axis, e.g. risk_ge=7,8,9 or hysteresis=0.5/5/5/1,1/10/10/2")
+    ap.add_argument("--top", type=int, default=20, help="rows to print, fewest alerts first")
+    ap.add_argument("--json", help="write every result to this file")
+    args = ap.parse_args()
+
+    from .db import SessionLocal
+    t0 = time.perf_counter()
+    db = SessionLocal()
+    try:
+        history = load_history(db, datetime.utcnow() - timedelta(days=args.days), holding_ids=args.holding)
+    finally:
+        db.close()
+    t_load = time.perf_counter() - t0
+    params = [Params()] + (grid(**dict(_parse_axis(s) for s in args.set)) if args.set else [])
+    t0 = time.perf_counter()
+    results = sweep(history, params)
+    t_sweep = time.perf_counter() - t0
+
+    print(
+        f"{history.holding_ids.size} holdings, {history.seg.size} snapshots, {history.c_seg.size} content items "
+        f"(loaded in {t_load:.2f}s); {len(params)} parameter sets in {t_sweep:.2f}s; "
+        f"{history.actual_alerts} alerts actually recorded"
+    )
+    rows = [results[0].row()] + sorted((r.row() for r in results[1:]), key=lambda r: (r["alerts"], r["params"]))
+    print(f"{'alerts':>7} {'holdings':>8} " + " ".join(f"{k:>9}" for k in REASON_KINDS) + "  params")
+    for r in rows[:args.top + 1]:
+        print(f"{r['alerts']:>7} {r['holdings']:>8} " + " ".join(f"{r[k]:>9}" for k in REASON_KINDS) + f"  {r['params']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"days": args.days, "snapshots": int(history.seg.size), "results": rows}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
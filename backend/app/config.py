@@ -6,30 +6,128 @@ class Settings(BaseSettings):
     JWT_ALG: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7
     DATABASE_URL: str = "sqlite:///./guardian.db"
+    ASYNC_DATABASE_URL: str | None = None  # default: DATABASE_URL with the aiosqlite / asyncpg driver
+    DB_POOL_SIZE: int = 10  # Postgres, and the async SQLite engine
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    SQLITE_JOURNAL_MODE: str = "WAL"  # readers no longer block behind the agent's writes
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # durable across app crashes in WAL mode; fsync on checkpoint only
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
     
     # LLM (OpenAI-compatible). Optional.
     LLM_BASE_URL: str | None = None  # e.g. https://api.openai.com/v1
     LLM_API_KEY: str | None = None
     LLM_MODEL: str = "gpt-4o-mini"
+    SUMMARY_CACHE_MAX_ENTRIES: int = 5000
+    # LLM dispatch: in-flight cap is LLM_CONCURRENCY; budgets <= 0 disable the limit
+    LLM_RPM: int = 60
+    LLM_TPM: int = 60000
+    LLM_MAX_OUTPUT_TOKENS: int = 400  # used when estimating a request's token cost
+    LLM_MAX_RETRIES: int = 4
+    LLM_BACKOFF_BASE_SECONDS: float = 1.0
+    LLM_BACKOFF_MAX_SECONDS: float = 30.0
+    LLM_BATCH_SIZE: int = 1  # >1 packs small routine summaries into one prompt
+    LLM_BATCH_MAX_BULLETS: int = 5
+    LLM_BATCH_WINDOW_MS: int = 200
+    SUMMARY_CACHE_MAX_AGE_HOURS: float = 24.0
     
     # Telegram notify optional
     TELEGRAM_BOT_TOKEN: str | None = None
     TELEGRAM_CHAT_ID: str | None = None
+    TELEGRAM_MIN_INTERVAL_SECONDS: float = 1.0  # Telegram allows ~1 msg/s per chat
+    TELEGRAM_API_URL: str = "https://api.telegram.org"
+    OUTBOX_POLL_SECONDS: float = 5.0
+    OUTBOX_BATCH: int = 50  # outbox rows folded into digests per drain
+    OUTBOX_MAX_ATTEMPTS: int = 8
+
+    # Alert cooldown / hysteresis
+    ALERT_COOLDOWN_MINUTES: float = 240.0
+    ALERT_HYSTERESIS_RISK: float = 0.5
+    ALERT_HYSTERESIS_SENTIMENT: float = 5.0
+    ALERT_HYSTERESIS_HOT: float = 5.0
+    ALERT_HYSTERESIS_CHANGE: float = 1.0
     
     # Reddit (optional)
     REDDIT_CLIENT_ID: str | None = None
     REDDIT_CLIENT_SECRET: str | None = None
     REDDIT_USER_AGENT: str = "StockGuardian/1.0"
     REDDIT_SUBREDDITS: str = "wallstreetbets+stocks+investing"
+    REDDIT_SCAN_LIMIT: int = 500  # newest posts read per cycle across REDDIT_SUBREDDITS
+    REDDIT_OAUTH_URL: str = "https://oauth.reddit.com"  # API and token endpoints; overridable for local stand-ins
+    REDDIT_URL: str = "https://www.reddit.com"
     
     # Polygon.io (optional, for news)
     POLYGON_API_KEY: str | None = None
+    POLYGON_BASE_URL: str = "https://api.polygon.io"
     
     # Market adapter
-    MARKET_DATA_PROVIDER: str = "stooq"  # "stooq" or "mock"
+    MARKET_DATA_PROVIDER: str = "stooq"  # "stooq", "polygon" or "mock"
+    STOOQ_BASE_URL: str = "https://stooq.com"
+    QUOTE_CACHE_TTL_SECONDS: float = 60.0
+    MARKET_MOCK_LATENCY_MS: int = 0  # simulated upstream latency for the mock provider
+    # Local price history: one append-only file of fixed-size records per symbol, filled from the quotes
+    PRICE_HISTORY_DIR: str | None = "./data/price_history"  # under the /app/data volume in Docker; None disables (change_pct_1d only)
+    PRICE_WINDOW_DAYS: float = 5.0  # window of the rolling return, realized volatility and gap stats
+    PRICE_GAP_HOURS: float = 4.0  # a quiet spell this long ends a session; the move across it is a gap
+    PRICE_MIN_POINTS: int = 8  # fewer points in the window: no features
     AGENT_CRON_MINUTES: int = 15
+    # Multi-process coordination: "leader" = one elected process runs all jobs, "claim" = every process
+    # runs the agent and claims a share of the symbols per cycle (other jobs stay leader-only), "none" = off
+    AGENT_COORDINATION: str = "leader"
+    LEASE_TTL_SECONDS: float = 60.0  # heartbeats renew every TTL/3
+    AGENT_CLAIM_BATCH: int = 100  # symbols claimed at a time in "claim" mode
+    JOB_JITTER_SECONDS: float = 30.0  # random delay added to each scheduled job start; 0 disables
     NEWS_LIMIT: int = 20
     REDDIT_LIMIT: int = 20
+    SENTIMENT_HOT_WEIGHTED: bool = False  # weight holding sentiment by each item's hot score
+    CONTENT_WINDOW_HOURS: int = 48  # clusters with a member this recent feed both the summary bullets and the sentiment
+    # One half-life for every source so a single indexed ORDER BY rank_key ranks news and reddit together;
+    # changing it only affects newly ingested items.
+    RANK_HALF_LIFE_HOURS: float = 18.0
+    CONTENT_DUP_JACCARD: float = 0.75  # title-token Jaccard at which items join an existing cluster
+    SENTIMENT_MEMO_SIZE: int = 50000
+
+    # Agent concurrency
+    AGENT_CONCURRENCY: int = 32  # symbols fetched in parallel per cycle; 1 = sequential
+    MARKET_CONCURRENCY: int = 4  # concurrent quote batch requests
+    NEWS_CONCURRENCY: int = 4
+    REDDIT_CONCURRENCY: int = 2  # praw worker threads
+    LLM_CONCURRENCY: int = 4  # max in-flight LLM requests
+    AGENT_CYCLE_DEADLINE_SECONDS: float | None = None  # default: 90% of AGENT_CRON_MINUTES
+    DAILY_REPORT_CONCURRENCY: int = 16
+    RULES_RELOAD_SECONDS: float = 300.0  # full reload of the in-memory rule table
+    DAILY_REPORT_COMMIT_BATCH: int = 200
+
+    # Retention / rollups (days; raw rows past the horizon are deleted in batches)
+    SNAPSHOT_RETENTION_DAYS: int = 14
+    CONTENT_RETENTION_DAYS: int = 30
+    HOURLY_ROLLUP_RETENTION_DAYS: int = 180  # daily rollups are kept forever
+    RETENTION_BATCH: int = 5000
+    RETENTION_INTERVAL_MINUTES: int = 60
+
+    # In-process identity cache (token -> email, email -> user); changes made through the ORM invalidate at once
+    IDENTITY_CACHE_SIZE: int = 10000
+    IDENTITY_CACHE_TTL_SECONDS: float = 300.0  # 0 disables
+
+    # Live push (/api/live/stream, Server-Sent Events)
+    LIVE_POLL_SECONDS: float = 2.0  # tail poll for rows committed by other processes; local commits wake it at once
+    LIVE_QUEUE_SIZE: int = 256  # per-subscriber backlog before it falls back to a DB catch-up
+    LIVE_BUFFER_EVENTS: int = 20000  # recent events kept in memory for lagging / reconnecting clients
+    LIVE_REPLAY_LIMIT: int = 1000  # rows per table replayed from the DB on resume before a "reset" event
+    LIVE_REPLAY_CONCURRENCY: int = 4
+    LIVE_KEEPALIVE_SECONDS: float = 15.0
+    LIVE_RETRY_MS: int = 3000
+
+    # Observability: /metrics is always on; profiling needs a directory for the dumps
+    PROFILE_DIR: str | None = None  # enables POST /debug/profile?cycles=N (cProfile the next N agent cycles)
+
+    # Shared outbound HTTP pools
+    HTTP2_ENABLED: bool = False  # needs the optional "h2" package
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = 20
+    HTTP_KEEPALIVE_SECONDS: float = 30.0
+    HTTP_HOST_MAX_CONNECTIONS: dict[str, int] = {}  # e.g. {"api.polygon.io": 5}
+    HTTP_HOST_TIMEOUTS: dict[str, float] = {}  # e.g. {"stooq.com": 10}
 
     class Config:
         env_file = ".env"
@@ -1,8 +1,13 @@
+import math
 from datetime import datetime, timezone
+from sqlalchemy import func, insert, select, update
 from sqlalchemy.orm import Session
+from .config import settings
+from .metrics import ROWS_WRITTEN
 from .models import Holding, ContentItem
-from .sentiment import vader_score_0_100
-from .scoring import sha256_key, hot_score_news, hot_score_reddit, ensure_utc
+from .sentiment import title_sentiment
+from .scoring import sha256_key, hot_score_news, hot_score_reddit, ensure_utc, rank_key, hot_at, news_base, reddit_base
+from .neardup import add_bands, band_keys, best_match, find_heads, refresh_clusters, strip_decoration, title_tokens
 
 NEWS_PUBLISHER_WEIGHT = {
     "Bloomberg": 1.0,
@@ -12,49 +17,135 @@ NEWS_PUBLISHER_WEIGHT = {
     "MarketWatch": 0.8,
 }
 
+UPSERT_CHUNK = 500
+
 def publisher_weight(name: str | None) -> float:
     if not name:
         return 0.7
     return NEWS_PUBLISHER_WEIGHT.get(name, 0.75)
 
-def upsert_dedup_content(
-    db: Session, holding: Holding, source: str, title: str, ts: datetime, url: str | None, hot_score: float,
-) -> ContentItem | None:
-    key = sha256_key(source, title[:220], url or "")
-    existing = db.query(ContentItem).filter(
-        ContentItem.holding_id == holding.id,
-        ContentItem.dedupe_key == key,
-    ).first()
-    now = datetime.now(timezone.utc)
-    ts = ensure_utc(ts)
-    sentiment = vader_score_0_100([title])
-    if existing:
-        if hot_score > existing.hot_score or ts > existing.ts:
-            existing.ts = ts
-            existing.hot_score = hot_score
-            existing.sentiment_score = sentiment
-            existing.title = title[:400]
-            existing.url = url
-            db.commit()
-        return existing
-    item = ContentItem(
-        holding_id=holding.id,
-        ts=ts,
-        source=source,
-        title=title[:400],
-        url=url,
-        dedupe_key=key,
-        sentiment_score=sentiment,
-        hot_score=hot_score,
+def _upsert_statement(db: Session, rows: list[dict]):
+    """Native INSERT .. ON CONFLICT upsert on (holding_id, dedupe_key), or None if the dialect has none."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    table = ContentItem.__table__
+    stmt = insert(table).values(rows)
+    ex = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.holding_id, table.c.dedupe_key],
+        set_={
+            "ts": ex.ts, "hot_score": ex.hot_score, "rank_key": ex.rank_key,
+            "sentiment_score": ex.sentiment_score, "title": ex.title, "url": ex.url,
+        },
+        where=table.c.rank_key.is_(None) | (ex.rank_key > table.c.rank_key) | (ex.ts > table.c.ts),
     )
-    db.add(item)
+
+def upsert_content_batch(
+    db: Session, holding: Holding, items: list[tuple[str, str, datetime, str | None, float, float]],
+) -> int:
+    """Bulk dedup upsert of (source, title, ts, url, hot_score, rank_key) tuples for one holding; commits once.
+
+    Existing rows are only rewritten when the new copy is hotter or newer. Returns the number of rows written.
+    """
+    holding_id = holding.id
+    # 1) 先算出全部 dedupe key（reddit 去掉会变的分数前缀），批内重复保留更热/更新的一条
+    batch: dict[str, dict] = {}
+    for source, title, ts, url, hot_score, rk in items:
+        key = sha256_key(source, strip_decoration(title)[:220], url or "")
+        row = {
+            "holding_id": holding_id, "ts": ensure_utc(ts), "source": source, "title": title[:400],
+            "url": url, "dedupe_key": key, "hot_score": hot_score, "rank_key": rk,
+        }
+        prev = batch.get(key)
+        if prev is None or rk > prev["rank_key"] or row["ts"] > prev["ts"]:
+            batch[key] = row
+    if not batch:
+        return 0
+
+    # 2) 一次 IN 查询取回已存在的行
+    existing = {
+        r.dedupe_key: r
+        for r in db.query(
+            ContentItem.id, ContentItem.dedupe_key, ContentItem.ts, ContentItem.rank_key,
+            ContentItem.title, ContentItem.sentiment_score, ContentItem.cluster_id,
+        ).filter(ContentItem.holding_id == holding_id, ContentItem.dedupe_key.in_(list(batch)))
+    }
+    rows: list[dict] = []
+    touched: set[int] = set()
+    for key, row in batch.items():
+        old = existing.get(key)
+        if old is not None:
+            if old.rank_key is not None and not (row["rank_key"] > old.rank_key or row["ts"] > ensure_utc(old.ts)):
+                continue
+            if old.title == row["title"]:
+                row["sentiment_score"] = old.sentiment_score
+            if old.cluster_id is not None:
+                touched.add(old.cluster_id)
+        rows.append(row)
+    if not rows:
+        return 0
+
+    # 3) 新条目按 MinHash-LSH 找近似重复的簇首；并入已有簇的直接沿用簇首情感分，不再跑 VADER
+    fresh = [r for r in rows if r["dedupe_key"] not in existing]
+    tokens = {r["dedupe_key"]: title_tokens(r["title"]) for r in fresh}
+    bands = {k: band_keys(t) for k, t in tokens.items()}
+    candidates = find_heads(db, holding_id, {b for bs in bands.values() for b in bs})
+    joins: dict[str, int | str] = {}  # dedupe_key -> 簇首 id（已存在）或簇首 dedupe_key（本批新建）
+    new_heads: list[str] = []
+    for r in fresh:
+        key = r["dedupe_key"]
+        match = best_match(tokens[key], bands[key], candidates)
+        if match is not None:
+            joins[key] = match[0]
+            r["sentiment_score"] = match[2]
+            continue
+        new_heads.append(key)
+        r["sentiment_score"] = title_sentiment(key, r["title"])
+        for b in bands[key]:
+            candidates.setdefault(b, []).append((key, tokens[key], r["sentiment_score"]))
+    for r in rows:
+        if "sentiment_score" not in r:
+            r["sentiment_score"] = title_sentiment(r["dedupe_key"], r["title"])
+
+    # 4) 单条批量语句写入
+    for i in range(0, len(rows), UPSERT_CHUNK):
+        chunk = rows[i:i + UPSERT_CHUNK]
+        stmt = _upsert_statement(db, chunk)
+        if stmt is not None:
+            db.execute(stmt)
+            continue
+        inserts = [r for r in chunk if r["dedupe_key"] not in existing]
+        updates = [dict(r, id=existing[r["dedupe_key"]].id) for r in chunk if r["dedupe_key"] in existing]
+        if inserts:
+            db.execute(insert(ContentItem), inserts)
+        if updates:
+            db.execute(update(ContentItem), updates)
+
+    # 5) 回填新行的 cluster_id、簇首 band，并重算受影响簇的聚合热度；每批只提交一次
+    if fresh:
+        ids = dict(db.execute(
+            select(ContentItem.dedupe_key, ContentItem.id)
+            .where(ContentItem.holding_id == holding_id, ContentItem.dedupe_key.in_(list(tokens)))
+        ).all())
+        cluster_of = {k: ids[k] for k in new_heads}
+        for k, head in joins.items():
+            cluster_of[k] = head if isinstance(head, int) else ids[head]
+        db.execute(update(ContentItem), [{"id": ids[k], "cluster_id": c} for k, c in cluster_of.items()])
+        add_bands(db, holding_id, {ids[k]: bands[k] for k in new_heads})
+        touched.update(cluster_of.values())
+    refresh_clusters(db, touched)
     db.commit()
-    db.refresh(item)
-    return item
+    ROWS_WRITTEN.inc(len(rows), table="content_items")
+    return len(rows)
 
 def ingest_polygon_news(db: Session, holding: Holding, news_rows: list[dict]) -> int:
     now = datetime.now(timezone.utc)
-    n = 0
+    items = []
     for r in news_rows:
         title = r.get("title") or ""
         pub = (r.get("publisher") or {}).get("name")
@@ -66,40 +157,93 @@ def ingest_polygon_news(db: Session, holding: Holding, news_rows: list[dict]) ->
                 ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
             except Exception:
                 ts = now
-        hs = hot_score_news(publisher_weight(pub), ensure_utc(ts), now)
+        ts = ensure_utc(ts)
+        hs = hot_score_news(publisher_weight(pub), ts, now)
+        rk = rank_key(news_base(publisher_weight(pub)), min(ts, now), settings.RANK_HALF_LIFE_HOURS)
         if title.strip():
-            upsert_dedup_content(db, holding, "polygon_news", title, ts, url, hs)
-            n += 1
-    return n
+            items.append(("polygon_news", title, ts, url, hs, rk))
+    upsert_content_batch(db, holding, items)
+    return len(items)
 
 def ingest_reddit(db: Session, holding: Holding, reddit_items: list[dict]) -> int:
     now = datetime.now(timezone.utc)
-    n = 0
+    items = []
     for it in reddit_items:
         title = it.get("title") or ""
         url = it.get("url")
         ts = it.get("ts") or now
         score = int(it.get("score", 0) or 0)
         comments = int(it.get("num_comments", 0) or 0)
-        hs = hot_score_reddit(score, comments, ensure_utc(ts), now)
+        ts = ensure_utc(ts)
+        hs = hot_score_reddit(score, comments, ts, now)
+        rk = rank_key(reddit_base(score, comments), min(ts, now), settings.RANK_HALF_LIFE_HOURS)
         if title.strip():
             sub = it.get("subreddit")
             decorated = f"[r/{sub}] ({score}/{comments}) {title}" if sub else title
-            upsert_dedup_content(db, holding, "reddit", decorated, ts, url, hs)
-            n += 1
-    return n
+            items.append(("reddit", decorated, ts, url, hs, rk))
+    upsert_content_batch(db, holding, items)
+    return len(items)
 
-def build_top_bullets(db: Session, holding: Holding, hours: int = 48, limit: int = 30) -> list[str]:
+def build_top_bullets(db: Session, holding: Holding, hours: int | None = None, limit: int = 30) -> list[str]:
+    """Titles of the `limit` currently hottest near-duplicate clusters, labelled with the cluster's hot score as of now.
+
+    Ordered by cluster_rank over the (holding_id, cluster_rank) index; `hours` optionally drops clusters
+    without a member that recent.
+    """
     from datetime import timedelta
-    since = datetime.now(timezone.utc) - timedelta(hours=hours)
-    rows = (
-        db.query(ContentItem)
-        .filter(ContentItem.holding_id == holding.id, ContentItem.ts >= since)
-        .order_by(ContentItem.hot_score.desc(), ContentItem.ts.desc())
-        .limit(limit)
-        .all()
+    now = datetime.now(timezone.utc)
+    q = db.query(ContentItem.title, ContentItem.cluster_rank, ContentItem.cluster_size).filter(
+        ContentItem.holding_id == holding.id, ContentItem.cluster_rank.is_not(None),
     )
+    if hours is not None:
+        q = q.filter(ContentItem.cluster_ts >= now - timedelta(hours=hours))
+    rows = q.order_by(ContentItem.cluster_rank.desc(), ContentItem.ts.desc()).limit(limit).all()
+    hl = settings.RANK_HALF_LIFE_HOURS
     bullets = []
     for r in rows:
-        bullets.append(f"{r.title} (hot:{r.hot_score:.0f})")
+        similar = f" (+{r.cluster_size - 1} similar)" if r.cluster_size > 1 else ""
+        # 热度标签放最后：summary_key 只剥离末尾的 (hot:N)
+        bullets.append(f"{r.title}{similar} (hot:{hot_at(r.cluster_rank, now, hl):.0f})")
     return bullets
+
+def holding_sentiments(
+    db: Session, holding_ids: list[int], hours: int = 48, limit: int = 30, hot_weighted: bool = False,
+) -> dict[int, float]:
+    """0-100 sentiment per holding from the stored scores of its `limit` hottest clusters (one head each), in one query.
+
+    A cluster counts while its newest member is within `hours`. Holdings without recent content get the neutral 50.0.
+    """
+    from datetime import timedelta
+    if not holding_ids:
+        return {}
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    rn = func.row_number().over(
+        partition_by=ContentItem.holding_id,
+        order_by=(ContentItem.cluster_rank.desc(), ContentItem.ts.desc()),
+    )
+    ranked = (
+        select(ContentItem.holding_id, ContentItem.sentiment_score, ContentItem.cluster_rank.label("rank_key"), rn.label("rn"))
+        .where(ContentItem.holding_id.in_(holding_ids), ContentItem.cluster_ts >= since, ContentItem.cluster_rank.is_not(None))
+        .subquery()
+    )
+    out = {hid: 50.0 for hid in holding_ids}
+    if not hot_weighted:
+        rows = db.execute(
+            select(ranked.c.holding_id, func.avg(ranked.c.sentiment_score))
+            .where(ranked.c.rn <= limit).group_by(ranked.c.holding_id)
+        ).all()
+    else:
+        # 当前热度 ∝ exp(cluster_rank)；相对最热一簇取指数，避免溢出且与 now 无关
+        per: dict[int, list[tuple[float, float]]] = {}
+        for hid, score, rk in db.execute(
+            select(ranked.c.holding_id, ranked.c.sentiment_score, ranked.c.rank_key).where(ranked.c.rn <= limit)
+        ):
+            per.setdefault(hid, []).append((score, rk if rk is not None else -math.inf))
+        rows = []
+        for hid, items in per.items():
+            top = max(rk for _, rk in items)
+            weights = [math.exp(rk - top) if top > -math.inf else 1.0 for _, rk in items]
+            rows.append((hid, sum(s * w for (s, _), w in zip(items, weights)) / sum(weights)))
+    for hid, score in rows:
+        out[hid] = float(max(0.0, min(100.0, score)))
+    return out
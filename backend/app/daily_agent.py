@@ -1,42 +1,95 @@
+import asyncio
+import logging
 from datetime import datetime, timezone, timedelta
+from sqlalchemy import exists, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from .config import settings
 from .models import User, Holding, StockSnapshot, DailyReport
 from .sentiment import llm_summarize
-from .notify import notify_telegram
+from .llm_scheduler import PRIORITY_DAILY
+from .notify import enqueue_notification
+from .live import broker
+from .metrics import ROWS_WRITTEN, span, trace
+
+logger = logging.getLogger(__name__)
 
 def _today_yyyymmdd() -> str:
     return datetime.now(timezone.utc).strftime("%Y-%m-%d")
 
-async def run_daily_reports(db: Session) -> int:
-    users = db.query(User).all()
+def _pending_users(db: Session, day: str) -> list[tuple[int, str]]:
+    """Users without a report for `day` (single anti-join)."""
+    has_report = exists().where(DailyReport.user_id == User.id, DailyReport.date_yyyymmdd == day)
+    return [(uid, email) for uid, email in db.execute(select(User.id, User.email).where(~has_report).order_by(User.id))]
+
+def _latest_snapshot_blocks(db: Session, since: datetime) -> dict[int, list[str]]:
+    """user_id -> one line per holding from its newest snapshot since `since` (single windowed query)."""
+    rn = func.row_number().over(
+        partition_by=StockSnapshot.holding_id,
+        order_by=(StockSnapshot.ts.desc(), StockSnapshot.id.desc()),
+    )
+    latest = (
+        select(StockSnapshot.holding_id, StockSnapshot.price, StockSnapshot.risk_score, StockSnapshot.sentiment_score, rn.label("rn"))
+        .where(StockSnapshot.ts >= since)
+        .subquery()
+    )
+    rows = db.execute(
+        select(Holding.user_id, Holding.symbol, latest.c.price, latest.c.risk_score, latest.c.sentiment_score)
+        .join(latest, latest.c.holding_id == Holding.id)
+        .where(latest.c.rn == 1)
+        .order_by(Holding.user_id, Holding.id)
+    )
+    out: dict[int, list[str]] = {}
+    for uid, symbol, price, risk, sentiment in rows:
+        out.setdefault(uid, []).append(f"{symbol}: price ${price:.2f}, risk {risk:.1f}/10, sentiment {sentiment:.0f}/100")
+    return out
+
+async def _report_content(blocks: list[str]) -> str:
+    if not blocks:
+        return "No snapshots today. Agent may not have run yet."
+    try:
+        summary = await llm_summarize("PORTFOLIO", blocks, priority=PRIORITY_DAILY)
+    except Exception:
+        logger.exception("daily report summary failed")
+        summary = None
+    return summary or ("Daily Brief: " + " ".join(["- " + b for b in blocks]))
+
+def _write_batch(db: Session, day: str, batch: list[tuple[int, str, str]]) -> int:
+    db.execute(insert(DailyReport), [{"user_id": uid, "date_yyyymmdd": day, "content": content} for uid, _, content in batch])
+    for _, email, content in batch:
+        enqueue_notification(db, f"[Daily Report {day}] {email} {content[:3500]}")
+    with span("commit"):
+        db.commit()
+    ROWS_WRITTEN.inc(len(batch), table="daily_reports")
+    return len(batch)
+
+async def run_daily_reports(db: AsyncSession) -> int:
+    with trace("daily_reports"):
+        return await _run_daily_reports(db)
+
+async def _run_daily_reports(db: AsyncSession) -> int:
     day = _today_yyyymmdd()
+    users = await db.run_sync(_pending_users, day)
+    if not users:
+        return 0
+    with span("daily_blocks"):
+        blocks = await db.run_sync(_latest_snapshot_blocks, datetime.utcnow() - timedelta(hours=24))
+    sem = asyncio.Semaphore(max(1, settings.DAILY_REPORT_CONCURRENCY))
+
+    async def build(uid: int, email: str) -> tuple[int, str, str]:
+        async with sem:
+            return uid, email, await _report_content(blocks.get(uid, []))
+
+    # 并发生成，单写入者按批提交
     created = 0
-    for u in users:
-        exists = db.query(DailyReport).filter(DailyReport.user_id == u.id, DailyReport.date_yyyymmdd == day).first()
-        if exists:
-            continue
-        holdings = db.query(Holding).filter(Holding.user_id == u.id).all()
-        blocks = []
-        for h in holdings:
-            since = datetime.utcnow() - timedelta(hours=24)
-            snap = (
-                db.query(StockSnapshot)
-                .filter(StockSnapshot.holding_id == h.id, StockSnapshot.ts >= since)
-                .order_by(StockSnapshot.ts.desc())
-                .first()
-            )
-            if not snap:
-                continue
-            blocks.append(f"{h.symbol}: price ${snap.price:.2f}, risk {snap.risk_score:.1f}/10, sentiment {snap.sentiment_score:.0f}/100")
-        if not blocks:
-            content = "No snapshots today. Agent may not have run yet."
-        else:
-            summary = await llm_summarize("PORTFOLIO", blocks)
-            content = summary or ("Daily Brief: " + " ".join(["- " + b for b in blocks]))
-        r = DailyReport(user_id=u.id, date_yyyymmdd=day, content=content)
-        db.add(r)
-        db.commit()
-        db.refresh(r)
-        created += 1
-        await notify_telegram(f"[Daily Report {day}] {u.email} {content[:3500]}")
+    batch: list[tuple[int, str, str]] = []
+    for fut in asyncio.as_completed([build(uid, email) for uid, email in users]):
+        batch.append(await fut)
+        if len(batch) >= settings.DAILY_REPORT_COMMIT_BATCH:
+            created += await db.run_sync(_write_batch, day, batch)
+            broker.notify()
+            batch = []
+    if batch:
+        created += await db.run_sync(_write_batch, day, batch)
+        broker.notify()
     return created
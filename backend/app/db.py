@@ -1,11 +1,55 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from .config import settings
 
-connect_args = {"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(settings.DATABASE_URL, connect_args=connect_args, future=True)
+IS_SQLITE = settings.DATABASE_URL.startswith("sqlite")
+
+def _async_url(url: str) -> str:
+    u = make_url(url)
+    if u.get_backend_name() == "sqlite":
+        return str(u.set(drivername="sqlite+aiosqlite"))
+    if u.get_backend_name() == "postgresql":
+        return u.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+    return url
+
+def _engine_kwargs(is_async: bool = False) -> dict:
+    pool = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+    }
+    if IS_SQLITE:
+        kw = {"connect_args": {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000}}
+        if is_async:
+            # aiosqlite 默认 NullPool，每个会话都要新建连接并重跑 PRAGMA
+            kw.update(pool, poolclass=AsyncAdaptedQueuePool)
+        return kw
+    return {**pool, "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS, "pool_pre_ping": True}
+
+def _sqlite_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    cur.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cur.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cur.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cur.close()
+
+engine = create_engine(settings.DATABASE_URL, future=True, **_engine_kwargs())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
 
+# 路由与 agent 使用的异步引擎（aiosqlite / asyncpg）；同步引擎保留给建表、迁移和保留期清理
+# aiosqlite 连接持有非 daemon 线程：脚本退出前需 await async_engine.dispose()
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL or _async_url(settings.DATABASE_URL), **_engine_kwargs(is_async=True),
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+
 class Base(DeclarativeBase):
     pass
 
@@ -15,3 +59,132 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _index_names(conn, table: str) -> set[str]:
+    return {ix["name"] for ix in inspect(conn).get_indexes(table)}
+
+def _column_names(conn, table: str) -> set[str]:
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+def _backfill_rank_keys(conn, batch: int = 5000) -> None:
+    # 旧行没有 rank_key：把入库时的 hot_score 当作发布时的基础热度
+    from .scoring import rank_key
+    hl = settings.RANK_HALF_LIFE_HOURS
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, ts, hot_score FROM content_items WHERE rank_key IS NULL LIMIT :n"
+        ), {"n": batch}).all()
+        if not rows:
+            return
+        conn.execute(
+            text("UPDATE content_items SET rank_key = :rk WHERE id = :id"),
+            [{"id": r.id, "rk": rank_key(r.hot_score or 0.0, _as_datetime(r.ts), hl)} for r in rows],
+        )
+
+def _rekey_reddit(conn, batch: int = 5000) -> None:
+    # 旧的 reddit dedupe key 含每次抓取都会变的 "[r/sub] (score/comments)" 前缀：按现行规则重算，
+    # 重算后撞键的只保留 id 最大的一行（与 uq_content_holding_key 迁移一致），先删后改避免唯一索引冲突
+    from .neardup import strip_decoration
+    from .scoring import sha256_key
+    seen: set[tuple[int, str]] = set()
+    updates, drop = [], []
+    last = None
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, holding_id, title, url, dedupe_key FROM content_items WHERE source = 'reddit'"
+            + (" AND id < :last" if last is not None else "") + " ORDER BY id DESC LIMIT :n"
+        ), {"last": last, "n": batch}).all()
+        if not rows:
+            break
+        for r in rows:
+            key = sha256_key("reddit", strip_decoration(r.title)[:220], r.url or "")
+            if (r.holding_id, key) in seen:
+                drop.append(r.id)
+                continue
+            seen.add((r.holding_id, key))
+            if key != r.dedupe_key:
+                updates.append({"id": r.id, "k": key})
+        last = rows[-1].id
+    for i in range(0, len(drop), 500):
+        conn.execute(text("DELETE FROM content_items WHERE id IN (%s)" % ",".join(map(str, drop[i:i + 500]))))
+    for i in range(0, len(updates), batch):
+        conn.execute(text("UPDATE content_items SET dedupe_key = :k WHERE id = :id"), updates[i:i + batch])
+
+def _backfill_clusters(conn, batch: int = 5000) -> None:
+    # 旧行各自成簇（不回溯合并），并写入 band 供之后的新条目匹配
+    from .neardup import band_keys, title_tokens
+    conn.execute(text(
+        "UPDATE content_items SET cluster_id = id, cluster_rank = rank_key, cluster_size = 1, cluster_ts = ts "
+        "WHERE cluster_id IS NULL"
+    ))
+    last = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, holding_id, title FROM content_items WHERE id > :last ORDER BY id LIMIT :n"
+        ), {"last": last, "n": batch}).all()
+        if not rows:
+            return
+        bands = [
+            {"h": r.holding_id, "b": b, "i": r.id}
+            for r in rows for b in set(band_keys(title_tokens(r.title)))
+        ]
+        if bands:
+            conn.execute(text("INSERT INTO content_dup_bands (holding_id, band_key, item_id) VALUES (:h, :b, :i)"), bands)
+        last = rows[-1].id
+
+def _as_datetime(v):
+    from datetime import datetime
+    return v if isinstance(v, datetime) else datetime.fromisoformat(str(v))
+
+def _upgrade_schema(conn):
+    # create_all 不会修改已存在的表，这里做幂等的增量变更
+    if "uq_content_holding_key" not in _index_names(conn, "content_items"):
+        conn.execute(text(
+            "DELETE FROM content_items WHERE id NOT IN "
+            "(SELECT MAX(id) FROM content_items GROUP BY holding_id, dedupe_key)"
+        ))
+        conn.execute(text("CREATE UNIQUE INDEX uq_content_holding_key ON content_items (holding_id, dedupe_key)"))
+    if "ix_content_holding_ts" not in _index_names(conn, "content_items"):
+        conn.execute(text("CREATE INDEX ix_content_holding_ts ON content_items (holding_id, ts)"))
+    if "ix_snapshots_holding_ts" not in _index_names(conn, "snapshots"):
+        conn.execute(text("CREATE INDEX ix_snapshots_holding_ts ON snapshots (holding_id, ts)"))
+    if "ix_alerts_holding_ts" not in _index_names(conn, "alerts"):
+        conn.execute(text("CREATE INDEX ix_alerts_holding_ts ON alerts (holding_id, ts)"))
+    if "rank_key" not in _column_names(conn, "content_items"):
+        conn.execute(text("ALTER TABLE content_items ADD COLUMN rank_key FLOAT"))
+        _backfill_rank_keys(conn)
+    if "cluster_id" not in _column_names(conn, "content_items"):
+        conn.execute(text("ALTER TABLE content_items ADD COLUMN cluster_id INTEGER"))
+        conn.execute(text("ALTER TABLE content_items ADD COLUMN cluster_rank FLOAT"))
+        conn.execute(text("ALTER TABLE content_items ADD COLUMN cluster_size INTEGER DEFAULT 1"))
+        conn.execute(text("ALTER TABLE content_items ADD COLUMN cluster_ts TIMESTAMP"))
+        _rekey_reddit(conn)  # 与聚类同一版本引入：升级前的库必然缺 cluster_id
+        _backfill_clusters(conn)
+    if "cluster_ts" not in _column_names(conn, "content_items"):
+        conn.execute(text("ALTER TABLE content_items ADD COLUMN cluster_ts TIMESTAMP"))
+        conn.execute(text(
+            "UPDATE content_items SET cluster_ts = "
+            "(SELECT MAX(m.ts) FROM content_items m WHERE m.cluster_id = content_items.id) WHERE cluster_id = id"
+        ))
+    content_indexes = _index_names(conn, "content_items")
+    if "ix_content_holding_rank" in content_indexes:
+        conn.execute(text("DROP INDEX ix_content_holding_rank"))
+    if "ix_content_items_cluster_id" not in content_indexes:
+        conn.execute(text("CREATE INDEX ix_content_items_cluster_id ON content_items (cluster_id)"))
+    if "ix_content_holding_cluster_rank" not in content_indexes:
+        conn.execute(text("CREATE INDEX ix_content_holding_cluster_rank ON content_items (holding_id, cluster_rank)"))
+
+def init_db():
+    from . import models  # noqa: F401  register tables
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        _upgrade_schema(conn)
+    from .rollups import backfill_rollups
+    from .price_history import price_store
+    with SessionLocal() as db:
+        backfill_rollups(db)
+        price_store.seed(db)
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from urllib.parse import urlsplit
+import httpx
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# 每个上游 host 的默认超时（秒），可用 HTTP_HOST_TIMEOUTS 覆盖
+DEFAULT_HOST_TIMEOUTS = {
+    "stooq.com": 15.0,
+    "api.polygon.io": 20.0,
+    "api.telegram.org": 10.0,
+}
+DEFAULT_TIMEOUT = 15.0
+LLM_TIMEOUT = 25.0
+
+# httpx clients are bound to the event loop they were first used on, so pools are kept per loop.
+_pools: dict[asyncio.AbstractEventLoop, dict[str, httpx.AsyncClient]] = {}
+
+def _host(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+def _llm_host() -> str | None:
+    return _host(settings.LLM_BASE_URL) if settings.LLM_BASE_URL else None
+
+def _timeout_for(host: str) -> float:
+    if host in settings.HTTP_HOST_TIMEOUTS:
+        return float(settings.HTTP_HOST_TIMEOUTS[host])
+    if host == _llm_host():
+        return LLM_TIMEOUT
+    return DEFAULT_HOST_TIMEOUTS.get(host, DEFAULT_TIMEOUT)
+
+def _http2_available() -> bool:
+    if not settings.HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("HTTP2_ENABLED is set but the 'h2' package is missing; using HTTP/1.1")
+        return False
+    return True
+
+def _build_client(host: str) -> httpx.AsyncClient:
+    max_conn = int(settings.HTTP_HOST_MAX_CONNECTIONS.get(host, settings.HTTP_MAX_CONNECTIONS_PER_HOST))
+    limits = httpx.Limits(
+        max_connections=max_conn,
+        max_keepalive_connections=max_conn,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_SECONDS,
+    )
+    return httpx.AsyncClient(timeout=_timeout_for(host), limits=limits, http2=_http2_available())
+
+def get_client(url: str) -> httpx.AsyncClient:
+    """Shared keep-alive client for the host of `url` on the running event loop."""
+    loop = asyncio.get_running_loop()
+    pool = _pools.setdefault(loop, {})
+    host = _host(url)
+    client = pool.get(host)
+    if client is None or client.is_closed:
+        client = pool[host] = _build_client(host)
+    return client
+
+async def open_clients() -> None:
+    """Pre-create pools for the configured upstreams on the running loop."""
+    urls = ["https://stooq.com", "https://api.telegram.org"]
+    if settings.POLYGON_API_KEY:
+        urls.append("https://api.polygon.io")
+    if settings.LLM_BASE_URL:
+        urls.append(settings.LLM_BASE_URL)
+    for u in urls:
+        get_client(u)
+
+async def close_clients() -> None:
+    """Close every pool that belongs to the running loop."""
+    pool = _pools.pop(asyncio.get_running_loop(), {})
+    await asyncio.gather(*[c.aclose() for c in pool.values()], return_exceptions=True)
@@ -0,0 +1,102 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy import event, inspect, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from .config import settings
+from .models import User
+
+DEFAULT_EMAIL = "default@user.com"
+
+@dataclass(frozen=True)
+class Identity:
+    """Detached snapshot of a User row, safe to share across sessions and requests."""
+    id: int
+    email: str
+    created_at: datetime
+
+    @classmethod
+    def of(cls, user: User) -> "Identity":
+        return cls(id=user.id, email=user.email, created_at=user.created_at)
+
+class TTLCache:
+    """Bounded LRU with a per-entry deadline; ttl <= 0 disables caching."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None or item[1] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def put(self, key, value, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+# 解码后的 token -> email；email -> Identity。用户行变更时按 email 失效
+tokens = TTLCache(settings.IDENTITY_CACHE_SIZE, settings.IDENTITY_CACHE_TTL_SECONDS)
+users = TTLCache(settings.IDENTITY_CACHE_SIZE, settings.IDENTITY_CACHE_TTL_SECONDS)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(_mapper, _conn, target: User) -> None:
+    # ORM 变更即时失效（含改邮箱时的旧邮箱）；其他进程或批量 UPDATE 的变更靠 TTL 兜底
+    users.pop(target.email)
+    for old in inspect(target).attrs.email.history.deleted or ():
+        users.pop(old)
+
+async def user_by_email(db: AsyncSession, email: str) -> Identity | None:
+    ident = users.get(email)
+    if ident is None:
+        user = (await db.execute(select(User).where(User.email == email))).scalars().first()
+        if user is None:
+            return None
+        ident = Identity.of(user)
+        users.put(email, ident)
+    return ident
+
+async def default_user(db: AsyncSession) -> Identity:
+    """The shared default user (no login), created on first use; resolved once at startup and then cached."""
+    ident = await user_by_email(db, DEFAULT_EMAIL)
+    if ident is not None:
+        return ident
+    from .auth import hash_password
+    db.add(User(email=DEFAULT_EMAIL, password_hash=hash_password("def")))
+    try:
+        await db.commit()
+    except IntegrityError:
+        # 并发请求/其他进程已创建
+        await db.rollback()
+    ident = await user_by_email(db, DEFAULT_EMAIL)
+    assert ident is not None
+    return ident
+
+def cache_stats() -> dict:
+    return {"tokens": tokens.stats(), "users": users.stats()}
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_SUBMITTED, JobEvent
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class JobStats:
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0  # fired while the previous run was still going
+    coalesced: int = 0  # missed fire times folded into one run
+    running: bool = False
+    last_started_at: datetime | None = None
+    last_duration_s: float = 0.0
+    max_duration_s: float = 0.0
+    last_lag_s: float = 0.0  # actual start minus scheduled (jittered) fire time
+    max_lag_s: float = 0.0
+
+_stats: dict[str, JobStats] = {}
+_tasks: dict[str, asyncio.Task] = {}
+
+def job_stats() -> dict[str, dict]:
+    return {name: asdict(s) for name, s in _stats.items()}
+
+def single_flight(name: str, fn):
+    """Wrap an async job so at most one run is in flight; overlapping fires are skipped and counted."""
+    st = _stats.setdefault(name, JobStats())
+
+    async def run():
+        if st.running:
+            st.skipped += 1
+            logger.warning("job %s still running; skipping this fire", name)
+            return None
+        st.running = True
+        st.last_started_at = datetime.now(timezone.utc)
+        _tasks[name] = asyncio.current_task()
+        t0 = time.monotonic()
+        try:
+            return await fn()
+        except asyncio.CancelledError:
+            logger.info("job %s cancelled", name)
+            raise
+        except Exception:
+            st.failures += 1
+            logger.exception("job %s failed", name)
+        finally:
+            st.runs += 1
+            st.running = False
+            st.last_duration_s = time.monotonic() - t0
+            st.max_duration_s = max(st.max_duration_s, st.last_duration_s)
+            _tasks.pop(name, None)
+
+    run.__name__ = run.__qualname__ = f"{name}_job"
+    return run
+
+def on_scheduler_event(event: JobEvent) -> None:
+    st = _stats.setdefault(event.job_id, JobStats())
+    if event.code == EVENT_JOB_MAX_INSTANCES:
+        st.skipped += 1  # APScheduler logs the skip itself
+    elif event.code == EVENT_JOB_SUBMITTED and event.scheduled_run_times:
+        st.coalesced += len(event.scheduled_run_times) - 1
+        st.last_lag_s = max(0.0, (datetime.now(timezone.utc) - event.scheduled_run_times[-1]).total_seconds())
+        st.max_lag_s = max(st.max_lag_s, st.last_lag_s)
+
+SCHEDULER_EVENTS = EVENT_JOB_MAX_INSTANCES | EVENT_JOB_SUBMITTED
+
+async def cancel_running_jobs() -> None:
+    """Cancel in-flight job tasks and wait for them to unwind (DB sessions roll back on the way out)."""
+    tasks = list(_tasks.values())
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
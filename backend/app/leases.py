@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from .config import settings
+from .db import AsyncSessionLocal
+from .models import Lease
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+def try_acquire(db: Session, name: str, ttl: float, owner: str = WORKER_ID) -> bool:
+    """Take or renew lease `name` if it is free, expired or already ours; commits."""
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=ttl)
+    renewed = db.execute(
+        update(Lease)
+        .where(Lease.name == name, or_(Lease.owner == owner, Lease.expires_at < now))
+        .values(owner=owner, expires_at=expires)
+    )
+    if renewed.rowcount:
+        db.commit()
+        return True
+    try:
+        db.execute(insert(Lease).values(name=name, owner=owner, acquired_at=now, expires_at=expires))
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False
+
+def release(db: Session, name: str, owner: str = WORKER_ID) -> None:
+    db.execute(delete(Lease).where(Lease.name == name, Lease.owner == owner))
+    db.commit()
+
+def _insert_ignore(db: Session, rows: list[dict]) -> None:
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        db.execute(dialect_insert(Lease).values(rows).on_conflict_do_nothing(index_elements=[Lease.name]))
+        return
+    for r in rows:
+        try:
+            with db.begin_nested():
+                db.execute(insert(Lease).values(**r))
+        except IntegrityError:
+            pass
+
+def claim(db: Session, names: list[str], ttl: float, owner: str, limit: int | None = None) -> list[str]:
+    """Claim up to `limit` of `names` that nobody holds (or whose holder stopped heart-beating); commits.
+
+    Returns the names now owned by `owner`; concurrent claimers may leave it fewer than `limit`.
+    """
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=ttl)
+    db.execute(delete(Lease).where(Lease.expires_at < now - timedelta(days=1)))
+    held: set[str] = set()
+    for i in range(0, len(names), 500):
+        held.update(db.execute(
+            select(Lease.name).where(Lease.name.in_(names[i:i + 500]), Lease.expires_at >= now)
+        ).scalars())
+    free = [n for n in names if n not in held][:limit]
+    owned: list[str] = []
+    for i in range(0, len(free), 500):
+        chunk = free[i:i + 500]
+        _insert_ignore(db, [{"name": n, "owner": owner, "acquired_at": now, "expires_at": expires} for n in chunk])
+        db.execute(
+            update(Lease)
+            .where(Lease.name.in_(chunk), Lease.expires_at < now)
+            .values(owner=owner, acquired_at=now, expires_at=expires)
+        )
+        owned += db.execute(select(Lease.name).where(Lease.name.in_(chunk), Lease.owner == owner)).scalars().all()
+    db.commit()
+    return owned
+
+def extend(db: Session, owner: str, until: datetime) -> int:
+    n = db.execute(update(Lease).where(Lease.owner == owner).values(expires_at=until)).rowcount
+    db.commit()
+    return n
+
+def release_owner(db: Session, owner: str) -> None:
+    db.execute(delete(Lease).where(Lease.owner == owner))
+    db.commit()
+
+async def _heartbeat(owner: str, ttl: float) -> None:
+    while True:
+        await asyncio.sleep(ttl / 3)
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(extend, owner, datetime.utcnow() + timedelta(seconds=ttl))
+        except Exception:
+            logger.exception("lease heartbeat failed for %s", owner)
+
+@asynccontextmanager
+async def claimed(
+    db: AsyncSession, prefix: str, keys: list[str], window_seconds: float, cycle: int | None = None, limit: int | None = None,
+):
+    """Claim up to `limit` of `keys` for one scheduling window and keep the claims alive while working.
+
+    Keys finished without error stay held until the window ends, so no other process repeats them;
+    on error they are released for another process to pick up within the same window.
+    """
+    ttl = settings.LEASE_TTL_SECONDS
+    if cycle is None:
+        cycle = int(time.time() // window_seconds)
+    owner = f"{WORKER_ID}:{uuid.uuid4().hex[:8]}"
+    names = {f"{prefix}:{cycle}:{k}": k for k in keys}
+    got = await db.run_sync(claim, list(names), ttl, owner, limit)
+    hb = asyncio.create_task(_heartbeat(owner, ttl))
+    ok = False
+    try:
+        yield [names[n] for n in got]
+        ok = True
+    finally:
+        hb.cancel()
+        async with AsyncSessionLocal() as s:
+            if ok:
+                window_end = datetime.utcfromtimestamp((cycle + 1) * window_seconds)
+                await s.run_sync(extend, owner, max(window_end, datetime.utcnow() + timedelta(seconds=ttl)))
+            else:
+                await s.run_sync(release_owner, owner)
+
+class LeaderElector:
+    """Background task that holds (or keeps trying to take) a named lease; `is_leader` reflects the last heartbeat."""
+
+    def __init__(self, name: str = "leader"):
+        self.name = name
+        self.is_leader = False
+
+    async def run(self) -> None:
+        ttl = settings.LEASE_TTL_SECONDS
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    leader = await db.run_sync(try_acquire, self.name, ttl)
+                if leader != self.is_leader:
+                    logger.info("%s %s lease %s", WORKER_ID, "acquired" if leader else "lost", self.name)
+                self.is_leader = leader
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.is_leader = False
+                logger.exception("leader heartbeat failed")
+            await asyncio.sleep(ttl / 3)
+
+    async def resign(self) -> None:
+        if self.is_leader:
+            self.is_leader = False
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(release, self.name)
+
+leader = LeaderElector()
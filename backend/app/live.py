@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .config import settings
+from .db import AsyncSessionLocal
+from .models import AlertEvent, DailyReport, Holding, StockSnapshot
+from .schemas import AlertOut, DailyReportOut, SnapshotOut
+
+logger = logging.getLogger(__name__)
+
+# 事件流 = 三张表按自增 id 追加的行；游标是各表已推送到的最大 id，编码成 SSE 的 event id
+KINDS = ("snapshot", "alert", "daily_report")
+_MODELS = {"snapshot": StockSnapshot, "alert": AlertEvent, "daily_report": DailyReport}
+_SCHEMAS = {"snapshot": SnapshotOut, "alert": AlertOut, "daily_report": DailyReportOut}
+
+Cursor = dict[str, int]
+
+def encode_cursor(c: Cursor) -> str:
+    return ".".join(str(c.get(k, 0)) for k in KINDS)
+
+def decode_cursor(raw: str | None) -> Cursor | None:
+    if not raw:
+        return None
+    try:
+        ids = [int(x) for x in raw.split(".")]
+    except ValueError:
+        return None
+    return dict(zip(KINDS, ids)) if len(ids) == len(KINDS) else None
+
+@dataclass
+class Event:
+    kind: str
+    row_id: int
+    pos: Cursor  # 推送该行之后的全局游标
+    cursor: str  # pos 的编码，即 SSE event id
+    symbol: str | None
+    user_id: int | None
+    data: str  # 只序列化一次，所有订阅者共享
+
+    def frame(self, cursor: str | None = None) -> str:
+        return f"id: {cursor or self.cursor}\nevent: {self.kind}\ndata: {self.data}\n\n"
+
+@dataclass(eq=False)
+class Subscriber:
+    symbols: frozenset[str] | None
+    user_id: int | None
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=settings.LIVE_QUEUE_SIZE))
+    lagged: bool = False  # 队列满后不再入队，由消费端回 DB 补齐
+
+    def wants(self, ev: Event) -> bool:
+        if ev.kind == "daily_report":
+            return ev.user_id == self.user_id
+        return self.symbols is None or ev.symbol in self.symbols
+
+class Broker:
+    """In-process fan-out of committed rows to live subscribers.
+
+    One tail task per process polls the three tables for rows past its cursor (woken immediately by
+    `notify()` after local commits, otherwise every LIVE_POLL_SECONDS so rows committed by other
+    processes arrive too) and publishes each row once; subscribers hold only a bounded queue.
+    The last LIVE_BUFFER_EVENTS events are kept so lagging or reconnecting clients catch up from memory.
+    """
+
+    def __init__(self):
+        self.subscribers: set[Subscriber] = set()
+        self.tail: Cursor | None = None
+        self.recent: deque[Event] = deque()
+        self.recent_from: Cursor | None = None  # recent 覆盖此游标之后的全部事件
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self.published = 0
+        self.lagged = 0
+
+    async def open(self, symbols: frozenset[str] | None, user_id: int | None) -> tuple[Subscriber, Cursor]:
+        """Register a subscriber; every row past the returned cursor will reach its queue (or mark it lagged)."""
+        sub = Subscriber(symbols, user_id)
+        self.subscribers.add(sub)
+        async with self._lock:
+            if self.tail is None:
+                async with AsyncSessionLocal() as db:
+                    self.tail = await current_cursor(db)
+                self.recent_from = dict(self.tail)
+            return sub, dict(self.tail)
+
+    def close(self, sub: Subscriber) -> None:
+        self.subscribers.discard(sub)
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def since(self, seen: Cursor) -> list[Event] | None:
+        """Buffered events past `seen`, or None if the buffer no longer reaches back that far."""
+        if self.recent_from is None or any(seen[k] < self.recent_from[k] for k in KINDS):
+            return None
+        return [ev for ev in self.recent if ev.row_id > seen[ev.kind]]
+
+    def publish(self, ev: Event) -> None:
+        self.published += 1
+        self.recent.append(ev)
+        if len(self.recent) > settings.LIVE_BUFFER_EVENTS:
+            self.recent_from = self.recent.popleft().pos
+        for sub in self.subscribers:
+            if sub.lagged or not sub.wants(ev):
+                continue
+            try:
+                sub.queue.put_nowait(ev)
+            except asyncio.QueueFull:
+                sub.lagged = True
+                self.lagged += 1
+
+    async def _poll(self) -> bool:
+        async with self._lock:
+            if not self.subscribers:
+                # 无人订阅时不查询；下个订阅者打开时从当时的末尾开始
+                self.tail = self.recent_from = None
+                self.recent.clear()
+                return True
+            async with AsyncSessionLocal() as db:
+                if self.tail is None:
+                    self.tail = await current_cursor(db)
+                    self.recent_from = dict(self.tail)
+                    return True
+                events, self.tail, complete = await read_since(db, self.tail, settings.LIVE_REPLAY_LIMIT)
+            for ev in events:
+                self.publish(ev)
+            return complete
+
+    async def run(self) -> None:
+        # 自增 id 的可见顺序在 SQLite（单写者）下与提交顺序一致；PostgreSQL 多写者并发提交时
+        # 较慢事务的行可能落在游标之后，客户端仍以 REST 接口为准
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.LIVE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                if not await self._poll():
+                    self._wake.set()  # 积压超过一页，立即继续
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("live tail failed")
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "lagging": sum(1 for s in self.subscribers if s.lagged),
+            "published": self.published,
+            "lagged": self.lagged,
+            "buffered": len(self.recent),
+            "tail": encode_cursor(self.tail) if self.tail else None,
+        }
+
+broker = Broker()
+
+async def current_cursor(db: AsyncSession) -> Cursor:
+    out = {}
+    for kind, model in _MODELS.items():
+        out[kind] = (await db.execute(select(func.max(model.id)))).scalar() or 0
+    return out
+
+def _json(v):
+    return v.isoformat() if isinstance(v, datetime) else v
+
+async def read_since(db: AsyncSession, cursor: Cursor, limit: int) -> tuple[list[Event], Cursor, bool]:
+    """Rows committed after `cursor`, oldest first, at most `limit` per table.
+
+    Returns (events, cursor after them, complete); complete is False when a table had more than `limit`.
+    """
+    cur = dict(cursor)
+    events = []
+    complete = True
+    # 按表、表内按 id 升序输出：游标单调，断线后从任一事件 id 续传都不会漏行
+    for kind, model in _MODELS.items():
+        if kind == "daily_report":
+            q = select(model, None)
+        else:
+            q = select(model, Holding.symbol).join(Holding, Holding.id == model.holding_id)
+        got = (await db.execute(q.where(model.id > cur[kind]).order_by(model.id).limit(limit + 1))).all()
+        if len(got) > limit:
+            got, complete = got[:limit], False
+        schema = _SCHEMAS[kind]
+        for obj, symbol in got:
+            cur[kind] = obj.id
+            payload = {k: _json(v) for k, v in schema.model_validate(obj).model_dump().items()}
+            if symbol is not None:
+                payload["symbol"] = symbol
+            events.append(Event(
+                kind=kind, row_id=obj.id, pos=dict(cur), cursor=encode_cursor(cur), symbol=symbol,
+                user_id=getattr(obj, "user_id", None), data=json.dumps(payload, ensure_ascii=False),
+            ))
+    return events, cur, complete
@@ -0,0 +1,260 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+import httpx
+from .config import settings
+from .http_clients import get_client
+from .metrics import upstream_call
+
+logger = logging.getLogger(__name__)
+
+# 数值越小越先调度
+PRIORITY_CRITICAL = 0
+PRIORITY_DAILY = 5
+PRIORITY_ROUTINE = 10
+
+class RateBudget:
+    """Thread-safe token bucket refilled continuously at `per_minute` units per minute; <= 0 means unlimited."""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = float(per_minute)
+        self.tokens = self.per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.per_minute, self.tokens + (now - self.updated) * self.per_minute / 60.0)
+        self.updated = now
+
+    def try_take(self, n: float) -> float:
+        """Take `n` units and return 0, or return the seconds to wait before retrying."""
+        if self.per_minute <= 0:
+            return 0.0
+        n = min(n, self.per_minute)
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= n:
+                self.tokens -= n
+                return 0.0
+            return (n - self.tokens) * 60.0 / self.per_minute
+
+    def adjust(self, n: float) -> None:
+        """Charge (or refund, if negative) the difference between an estimate and actual usage."""
+        if self.per_minute <= 0:
+            return
+        with self._lock:
+            self.tokens = min(self.per_minute, self.tokens - n)
+
+    async def take(self, n: float) -> None:
+        while (wait := self.try_take(n)) > 0:
+            await asyncio.sleep(wait)
+
+class PrioritySlots:
+    """In-flight cap; waiters are admitted lowest priority value first, FIFO within a level."""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for *_, f in self._waiters if not f.done())
+
+    async def acquire(self, priority: int) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        while self._waiters and self.active < self.limit:
+            *_, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                self.active += 1
+                fut.set_result(None)
+
+class RetryableLLMError(Exception):
+    def __init__(self, msg: str, retry_after: float | None = None):
+        super().__init__(msg)
+        self.retry_after = retry_after
+
+# 进程级的速率预算与统计；调度器实例按 event loop 区分（asyncio 原语绑定 loop）
+_rpm = RateBudget(settings.LLM_RPM)
+_tpm = RateBudget(settings.LLM_TPM)
+stats = {"requests": 0, "retries": 0, "rate_limited": 0, "failures": 0, "batched_prompts": 0, "batched_symbols": 0}
+_queue_wait_ms: deque[float] = deque(maxlen=1000)
+_request_ms: deque[float] = deque(maxlen=1000)
+_schedulers: dict[asyncio.AbstractEventLoop, "LlmScheduler"] = {}
+
+def _percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(len(s) * q))]
+
+def scheduler_stats() -> dict:
+    return {
+        **stats,
+        "queue_depth": sum(s.slots.waiting + len(s._pending_batch) for s in _schedulers.values()),
+        "in_flight": sum(s.slots.active for s in _schedulers.values()),
+        "queue_wait_ms_p50": _percentile(_queue_wait_ms, 0.5),
+        "queue_wait_ms_p95": _percentile(_queue_wait_ms, 0.95),
+        "request_ms_p50": _percentile(_request_ms, 0.5),
+        "request_ms_p95": _percentile(_request_ms, 0.95),
+    }
+
+def _retry_after_seconds(r: httpx.Response) -> float | None:
+    v = r.headers.get("Retry-After")
+    if not v:
+        return None
+    try:
+        return max(0.0, float(v))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(v).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _backoff(attempt: int) -> float:
+    # full jitter
+    cap = min(settings.LLM_BACKOFF_MAX_SECONDS, settings.LLM_BACKOFF_BASE_SECONDS * (2 ** attempt))
+    return random.uniform(0, cap)
+
+def _estimate_tokens(prompt: str) -> int:
+    return len(prompt) // 2 + settings.LLM_MAX_OUTPUT_TOKENS
+
+class LlmScheduler:
+    def __init__(self):
+        self.slots = PrioritySlots(settings.LLM_CONCURRENCY)
+        self._pending_batch: list[tuple[str, list[str], asyncio.Future]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+
+    async def complete(self, prompt: str, priority: int = PRIORITY_ROUTINE) -> str:
+        """One chat completion, admitted by priority and budgets, retried with jittered backoff."""
+        url = settings.LLM_BASE_URL.rstrip("/") + "/chat/completions"
+        headers = {"Authorization": f"Bearer {settings.LLM_API_KEY}"}
+        payload = {
+            "model": settings.LLM_MODEL,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.2,
+        }
+        estimate = _estimate_tokens(prompt)
+        enqueued = time.monotonic()
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            await self.slots.acquire(priority)
+            try:
+                await _rpm.take(1)
+                await _tpm.take(estimate)
+                if attempt == 0:
+                    _queue_wait_ms.append((time.monotonic() - enqueued) * 1000)
+                stats["requests"] += 1
+                t0 = time.monotonic()
+                with upstream_call("llm"):
+                    r = await get_client(url).post(url, headers=headers, json=payload)
+                    _request_ms.append((time.monotonic() - t0) * 1000)
+                    if r.status_code == 429 or r.status_code >= 500:
+                        if r.status_code == 429:
+                            stats["rate_limited"] += 1
+                        raise RetryableLLMError(f"HTTP {r.status_code}", _retry_after_seconds(r))
+                    r.raise_for_status()
+                data = r.json()
+                used = (data.get("usage") or {}).get("total_tokens")
+                if used:
+                    _tpm.adjust(used - estimate)
+                return data["choices"][0]["message"]["content"]
+            except (RetryableLLMError, httpx.TransportError) as e:
+                if attempt >= settings.LLM_MAX_RETRIES:
+                    stats["failures"] += 1
+                    raise
+                delay = getattr(e, "retry_after", None)
+                delay = _backoff(attempt) if delay is None else delay
+                stats["retries"] += 1
+                logger.info("LLM request retry %d in %.1fs: %s", attempt + 1, delay, e)
+            except Exception:
+                stats["failures"] += 1
+                raise
+            finally:
+                self.slots.release()
+            await asyncio.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    async def summarize(self, symbol: str, bullets: list[str], priority: int = PRIORITY_ROUTINE) -> str:
+        from .sentiment import build_summary_prompt
+        if (
+            settings.LLM_BATCH_SIZE > 1
+            and priority >= PRIORITY_ROUTINE
+            and len(bullets) <= settings.LLM_BATCH_MAX_BULLETS
+        ):
+            return await self._summarize_batched(symbol, bullets)
+        return await self.complete(build_summary_prompt(symbol, bullets), priority)
+
+    async def _summarize_batched(self, symbol: str, bullets: list[str]) -> str:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending_batch.append((symbol, bullets, fut))
+        if len(self._pending_batch) >= settings.LLM_BATCH_SIZE:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(settings.LLM_BATCH_WINDOW_MS / 1000.0, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending_batch = self._pending_batch, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: list[tuple[str, list[str], asyncio.Future]]) -> None:
+        from .sentiment import build_summary_prompt, build_batch_prompt, parse_batch_summaries
+        results: dict[str, str] = {}
+        if len(batch) > 1:
+            try:
+                text = await self.complete(build_batch_prompt([(s, b) for s, b, _ in batch]), PRIORITY_ROUTINE)
+                results = parse_batch_summaries(text)
+                stats["batched_prompts"] += 1
+                stats["batched_symbols"] += len(results)
+            except Exception:
+                logger.exception("batched LLM summary failed; falling back to single prompts")
+
+        async def finish(symbol: str, bullets: list[str], fut: asyncio.Future) -> None:
+            try:
+                text = results.get(symbol.upper())
+                if text is None:
+                    text = await self.complete(build_summary_prompt(symbol, bullets), PRIORITY_ROUTINE)
+                if not fut.done():
+                    fut.set_result(text)
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+
+        await asyncio.gather(*[finish(s, b, f) for s, b, f in batch])
+
+def get_llm_scheduler() -> LlmScheduler:
+    loop = asyncio.get_running_loop()
+    sched = _schedulers.get(loop)
+    if sched is None:
+        sched = _schedulers[loop] = LlmScheduler()
+    return sched
+
+def drop_llm_scheduler() -> None:
+    """Forget the scheduler of the running loop (call before the loop closes)."""
+    _schedulers.pop(asyncio.get_running_loop(), None)
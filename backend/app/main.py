@@ -1,15 +1,28 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from apscheduler.schedulers.background import BackgroundScheduler
+from fastapi.responses import PlainTextResponse
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from sqlalchemy.orm import Session
 import asyncio
 from .config import settings
-from .db import Base, engine, SessionLocal
+from .db import AsyncSessionLocal, SessionLocal, async_engine, init_db
+from .http_clients import open_clients, close_clients
+from .identity import cache_stats, default_user
+from .leases import WORKER_ID, leader
+from .live import broker
+from .jobs import SCHEDULER_EVENTS, cancel_running_jobs, job_stats, on_scheduler_event, single_flight
+from .llm_scheduler import scheduler_stats
+from . import metrics
+from . import summary_cache
+from .notify import run_outbox_worker
+from .price_history import price_store
+from .rollups import prune_raw
 from .routes import auth as auth_routes
 from .routes import portfolio as portfolio_routes
 from .routes import reports as reports_routes
 from .routes import rules as rules_routes
 from .routes import daily as daily_routes
+from .routes import live as live_routes
 from .agent import run_agent_once
 from .daily_agent import run_daily_reports
 
@@ -23,40 +36,141 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-Base.metadata.create_all(bind=engine)
+init_db()
 
 app.include_router(auth_routes.router)
 app.include_router(portfolio_routes.router)
 app.include_router(reports_routes.router)
 app.include_router(rules_routes.router)
 app.include_router(daily_routes.router)
+app.include_router(live_routes.router)
 
-scheduler = BackgroundScheduler()
+scheduler = AsyncIOScheduler()
 
-def _job():
-    db: Session = SessionLocal()
-    try:
-        asyncio.run(run_agent_once(db))
-    finally:
-        db.close()
+async def _agent_cycle() -> int:
+    async with AsyncSessionLocal() as db:
+        return await run_agent_once(db)
 
-def _daily_job():
+async def _daily_reports() -> int:
+    async with AsyncSessionLocal() as db:
+        return await run_daily_reports(db)
+
+def _prune() -> dict[str, int]:
     db: Session = SessionLocal()
     try:
-        asyncio.run(run_daily_reports(db))
+        return prune_raw(db)
     finally:
         db.close()
 
+async def _retention() -> dict[str, int]:
+    return await asyncio.to_thread(_prune)
+
+def _is_leader() -> bool:
+    return settings.AGENT_COORDINATION == "none" or leader.is_leader
+
+def _leader_only(fn):
+    # 多进程部署时只有持有 leader 租约的进程执行
+    async def run():
+        if not _is_leader():
+            return None
+        return await fn()
+    return run
+
 @app.on_event("startup")
-def start_scheduler():
-    scheduler.add_job(_job, "interval", minutes=settings.AGENT_CRON_MINUTES, id="agent")
-    scheduler.add_job(_daily_job, "cron", hour=22, minute=0, id="daily")
+async def start_scheduler():
+    # 任务直接作为应用 event loop 上的 task 运行；max_instances=1 + single_flight 防止重叠
+    jitter = settings.JOB_JITTER_SECONDS or None
+    common = {"max_instances": 1, "coalesce": True, "misfire_grace_time": 60, "jitter": jitter}
+    agent = _agent_cycle if settings.AGENT_COORDINATION == "claim" else _leader_only(_agent_cycle)
+    scheduler.add_job(single_flight("agent", agent), "interval", minutes=settings.AGENT_CRON_MINUTES, id="agent", **common)
+    scheduler.add_job(single_flight("daily", _leader_only(_daily_reports)), "cron", hour=22, minute=0, id="daily", **common)
+    scheduler.add_job(
+        single_flight("retention", _leader_only(_retention)),
+        "interval", minutes=settings.RETENTION_INTERVAL_MINUTES, id="retention", **common,
+    )
+    scheduler.add_listener(on_scheduler_event, SCHEDULER_EVENTS)
     scheduler.start()
 
+_background_tasks: set[asyncio.Task] = set()
+
+@app.on_event("startup")
+async def start_http_clients():
+    await open_clients()
+
+@app.on_event("startup")
+async def resolve_default_user():
+    async with AsyncSessionLocal() as db:
+        await default_user(db)
+
+@app.on_event("startup")
+async def start_background_tasks():
+    if settings.AGENT_COORDINATION != "none":
+        _background_tasks.add(asyncio.create_task(leader.run()))
+    _background_tasks.add(asyncio.create_task(run_outbox_worker(_is_leader)))
+    _background_tasks.add(asyncio.create_task(broker.run()))
+
 @app.on_event("shutdown")
-def stop_scheduler():
+async def stop_scheduler():
     scheduler.shutdown(wait=False)
+    await cancel_running_jobs()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    _background_tasks.clear()
+    await leader.resign()
+
+@app.on_event("shutdown")
+async def stop_http_clients():
+    await close_clients()
+
+@app.on_event("shutdown")
+async def stop_db():
+    await async_engine.dispose()
 
 @app.get("/health")
 def health():
     return {"ok": True}
+
+@app.get("/health/llm")
+def health_llm():
+    return scheduler_stats()
+
+@app.get("/health/identity")
+def health_identity():
+    return cache_stats()
+
+@app.get("/health/live")
+def health_live():
+    return broker.stats()
+
+@app.get("/health/jobs")
+def health_jobs():
+    return {"worker": WORKER_ID, "leader": _is_leader(), "jobs": job_stats()}
+
+metrics.register_stats("guardian_llm", scheduler_stats)
+metrics.register_stats("guardian_summary_cache", lambda: summary_cache.stats)
+metrics.register_stats("guardian_identity_cache", cache_stats, label="cache")
+metrics.register_stats("guardian_live", broker.stats)
+metrics.register_stats("guardian_price_history", price_store.stats)
+metrics.register_stats("guardian_job", job_stats, label="job")
+metrics.register_stats("guardian_leader", lambda: {"is_leader": _is_leader()})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus text format: stage/upstream latency histograms, error/cache/row counters and the /health stats."""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/debug/profile")
+def profile_status():
+    return metrics.profiler.status()
+
+@app.post("/debug/profile")
+def arm_profile(cycles: int = Query(1, ge=0, le=100)):
+    """cProfile the next `cycles` agent cycles in this process (0 disarms); needs PROFILE_DIR."""
+    if not settings.PROFILE_DIR:
+        raise HTTPException(404, "profiling disabled; set PROFILE_DIR")
+    metrics.profiler.arm(cycles)
+    return metrics.profiler.status()
@@ -1,5 +1,13 @@
-import httpx
+import asyncio
+import logging
+import random
+import time
 from datetime import datetime, timezone
+from .config import settings
+from .http_clients import get_client
+from .metrics import CACHE_REQUESTS, upstream_call
+
+logger = logging.getLogger(__name__)
 
 class MarketQuote:
     def __init__(self, symbol: str, price: float, change_pct_1d: float, volume: float | None):
@@ -9,31 +17,138 @@ class MarketQuote:
         self.volume = volume
         self.ts = datetime.now(timezone.utc)
 
-async def fetch_quote_stooq(symbol: str) -> MarketQuote:
-    s = symbol.lower() + ".us"
-    url = f"https://stooq.com/q/l/?s={s}&i=d"
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(url)
+# symbol -> (monotonic expiry, quote)
+_quote_cache: dict[str, tuple[float, MarketQuote]] = {}
+# symbol -> (session date, last close, previous session close)
+_sessions: dict[str, tuple[str, float, float | None]] = {}
+
+def _change_from_prev_close(symbol: str, session: str, close: float, fallback_ref: float | None = None) -> float:
+    """1-day change vs. the cached previous session close.
+
+    Until a previous close has been observed for `symbol`, `fallback_ref` (e.g. the session open) is used.
+    """
+    last = _sessions.get(symbol)
+    if last is None:
+        prev = None
+    elif session > last[0]:
+        prev = last[1]
+    else:
+        prev = last[2]
+    _sessions[symbol] = (session, close, prev)
+    ref = prev or fallback_ref
+    if not ref:
+        return 0.0
+    return round((close / ref - 1.0) * 100.0, 4)
+
+def _float_or_none(v: str) -> float | None:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+async def fetch_quotes_stooq(symbols: list[str]) -> dict[str, MarketQuote]:
+    s = "+".join(sym.lower() + ".us" for sym in symbols)
+    url = f"{settings.STOOQ_BASE_URL.rstrip('/')}/q/l/?s={s}&f=sd2t2ohlcv&h&e=csv"
+    with upstream_call("stooq"):
+        r = await get_client(url).get(url)
+        r.raise_for_status()
+    out: dict[str, MarketQuote] = {}
+    for line in r.text.strip().splitlines()[1:]:
+        cols = line.split(",")
+        if len(cols) < 8:
+            continue
+        close = _float_or_none(cols[6])
+        if close is None:  # "N/D" for unknown symbols
+            continue
+        symbol = cols[0].upper().removesuffix(".US")
+        change = _change_from_prev_close(symbol, cols[1], close, _float_or_none(cols[3]))
+        out[symbol] = MarketQuote(symbol=symbol, price=close, change_pct_1d=change, volume=_float_or_none(cols[7]))
+    return out
+
+async def fetch_quotes_polygon(symbols: list[str]) -> dict[str, MarketQuote]:
+    if not settings.POLYGON_API_KEY:
+        raise RuntimeError("POLYGON_API_KEY not set")
+    url = settings.POLYGON_BASE_URL.rstrip("/") + "/v2/snapshot/locale/us/markets/stocks/tickers"
+    params = {"tickers": ",".join(sym.upper() for sym in symbols), "apiKey": settings.POLYGON_API_KEY}
+    with upstream_call("polygon_quotes"):
+        r = await get_client(url).get(url, params=params)
         r.raise_for_status()
-        lines = r.text.strip().splitlines()
-        if len(lines) < 2:
-            raise ValueError("No data")
-        cols = lines[1].split(",")
-        close = float(cols[6])
-        volume = float(cols[7]) if cols[7] else None
-        return MarketQuote(symbol=symbol.upper(), price=close, change_pct_1d=0.0, volume=volume)
-
-async def fetch_quote_mock(symbol: str) -> MarketQuote:
-    import random
-    price = round(50 + random.random() * 200, 2)
-    change = round((random.random() - 0.5) * 6, 2)
-    vol = float(int(1e6 + random.random() * 2e6))
-    return MarketQuote(symbol=symbol.upper(), price=price, change_pct_1d=change, volume=vol)
+    out: dict[str, MarketQuote] = {}
+    for t in r.json().get("tickers", []):
+        symbol = (t.get("ticker") or "").upper()
+        day = t.get("day") or {}
+        prev_day = t.get("prevDay") or {}
+        price = (t.get("lastTrade") or {}).get("p") or day.get("c") or prev_day.get("c")
+        if not symbol or not price:
+            continue
+        session = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        if prev_day.get("c"):
+            _sessions[symbol] = (session, float(price), float(prev_day["c"]))
+        change = _change_from_prev_close(symbol, session, float(price))
+        out[symbol] = MarketQuote(symbol=symbol, price=float(price), change_pct_1d=change, volume=day.get("v"))
+    return out
+
+async def fetch_quotes_mock(symbols: list[str]) -> dict[str, MarketQuote]:
+    if settings.MARKET_MOCK_LATENCY_MS > 0:
+        await asyncio.sleep(settings.MARKET_MOCK_LATENCY_MS / 1000.0)
+    out = {}
+    for sym in symbols:
+        price = round(50 + random.random() * 200, 2)
+        change = round((random.random() - 0.5) * 6, 2)
+        vol = float(int(1e6 + random.random() * 2e6))
+        out[sym.upper()] = MarketQuote(symbol=sym.upper(), price=price, change_pct_1d=change, volume=vol)
+    return out
+
+# MARKET_DATA_PROVIDER -> (batch fetcher, max symbols per request)
+PROVIDERS = {
+    "stooq": (fetch_quotes_stooq, 50),
+    "polygon": (fetch_quotes_polygon, 250),
+    "mock": (fetch_quotes_mock, 500),
+}
+
+async def fetch_quotes(symbols: list[str]) -> dict[str, MarketQuote]:
+    """Quotes for many symbols, served from the TTL cache where fresh and batched per provider otherwise.
+
+    Symbols the provider could not quote are missing from the result.
+    """
+    if settings.MARKET_DATA_PROVIDER not in PROVIDERS:
+        raise ValueError(f"Unknown MARKET_DATA_PROVIDER: {settings.MARKET_DATA_PROVIDER}")
+    fetch, batch_size = PROVIDERS[settings.MARKET_DATA_PROVIDER]
+    now = time.monotonic()
+    out: dict[str, MarketQuote] = {}
+    missing: list[str] = []
+    for sym in dict.fromkeys(s.upper() for s in symbols):
+        hit = _quote_cache.get(sym)
+        if hit and hit[0] > now:
+            out[sym] = hit[1]
+        else:
+            missing.append(sym)
+    CACHE_REQUESTS.inc(len(out), cache="quotes", result="hit")
+    CACHE_REQUESTS.inc(len(missing), cache="quotes", result="miss")
+    if not missing:
+        return out
+
+    sem = asyncio.Semaphore(max(1, settings.MARKET_CONCURRENCY))
+
+    async def run(batch: list[str]) -> dict[str, MarketQuote]:
+        async with sem:
+            try:
+                return await fetch(batch)
+            except Exception:
+                logger.exception("quote batch failed (%d symbols)", len(batch))
+                return {}
+
+    batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+    expires = time.monotonic() + settings.QUOTE_CACHE_TTL_SECONDS
+    for res in await asyncio.gather(*[run(b) for b in batches]):
+        for sym, q in res.items():
+            _quote_cache[sym] = (expires, q)
+            out[sym] = q
+    return out
 
 async def fetch_snapshot(symbol: str) -> tuple[float, float, float | None]:
-    from .config import settings
-    if settings.MARKET_DATA_PROVIDER == "mock":
-        q = await fetch_quote_mock(symbol)
-    else:
-        q = await fetch_quote_stooq(symbol)
+    quotes = await fetch_quotes([symbol])
+    q = quotes.get(symbol.upper())
+    if q is None:
+        raise ValueError(f"No quote for {symbol}")
     return q.price, q.change_pct_1d, q.volume
@@ -0,0 +1,248 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# 进程内指标，按 Prometheus 文本格式导出（/metrics）；多进程部署时每个进程各自被抓取
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_registry: list["_Metric"] = []
+_stats_sources: list[tuple[str, str | None, Callable[[], dict]]] = []
+_lock = threading.Lock()
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(v: float) -> str:
+    return repr(float(v)) if v != float("inf") else "+Inf"
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def lines(self) -> Iterator[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, n: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0.0) + n
+
+    def lines(self) -> Iterator[str]:
+        for key, v in sorted(self.values.items()):
+            yield f"{self.name}{_labels(self.labels, key)} {_num(v)}"
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        self.values: dict[tuple, list] = {}  # key -> [每个桶的计数..., sum, count]
+
+    def observe(self, v: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect_left(self.buckets, v)
+        with _lock:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                row[i] += 1
+            row[-2] += v
+            row[-1] += 1
+
+    def lines(self) -> Iterator[str]:
+        for key, row in sorted(self.values.items()):
+            acc = 0
+            for le, n in zip(self.buckets, row):
+                acc += n
+                le_label = 'le="%s"' % _num(le)
+                yield f"{self.name}_bucket{_labels(self.labels, key, le_label)} {acc}"
+            inf_label = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.labels, key, inf_label)} {row[-1]}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {_num(row[-2])}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {row[-1]}"
+
+STAGE_SECONDS = Histogram("guardian_stage_seconds", "Wall time of pipeline stages.", ("stage",))
+STAGE_ERRORS = Counter("guardian_stage_errors_total", "Exceptions raised or swallowed in pipeline stages.", ("stage",))
+UPSTREAM_SECONDS = Histogram("guardian_upstream_request_seconds", "Latency of upstream API calls.", ("upstream",))
+UPSTREAM_ERRORS = Counter("guardian_upstream_errors_total", "Failed upstream API calls.", ("upstream",))
+CACHE_REQUESTS = Counter("guardian_cache_requests_total", "Cache lookups by result.", ("cache", "result"))
+ROWS_WRITTEN = Counter("guardian_rows_written_total", "Rows written, by table.", ("table",))
+AGENT_CYCLES = Counter("guardian_agent_cycles_total", "Completed agent cycles.")
+ALERTS_FIRED = Counter("guardian_alerts_fired_total", "Alerts fired after cooldown and hysteresis.")
+
+def register_stats(prefix: str, fn: Callable[[], dict], label: str | None = None) -> None:
+    """Export the numeric values of `fn()` as gauges `<prefix>_<key>`; with `label`, fn returns
+    {label value: {key: value}} (e.g. per job)."""
+    _stats_sources.append((prefix, label, fn))
+
+def _stats_lines() -> Iterator[str]:
+    for prefix, label, fn in _stats_sources:
+        try:
+            data = fn()
+        except Exception:
+            logger.exception("metrics source %s failed", prefix)
+            continue
+        rows = data.items() if label else [(None, data)]
+        series: dict[str, list[str]] = {}
+        for lv, stats in rows:
+            for k, v in stats.items():
+                if isinstance(v, bool):
+                    v = int(v)
+                if not isinstance(v, (int, float)):
+                    continue
+                name = re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{k}")
+                series.setdefault(name, []).append(f"{name}{_labels((label,), (lv,)) if label else ''} {_num(v)}")
+        for name, lines in series.items():
+            yield f"# TYPE {name} gauge"
+            yield from lines
+
+def render() -> str:
+    out = []
+    with _lock:
+        for m in _registry:
+            out.append(f"# HELP {m.name} {m.help}")
+            out.append(f"# TYPE {m.name} {m.kind}")
+            out.extend(m.lines())
+    out.extend(_stats_lines())
+    return "\n".join(out) + "\n"
+
+# 当前 trace（一轮 agent / 一次日报）内按名字累计的耗时，子 task 共享同一个 dict
+_trace: ContextVar[dict | None] = ContextVar("metrics_trace", default=None)
+
+def _record(key: str, dt: float) -> None:
+    tr = _trace.get()
+    if tr is None:
+        return
+    t = tr.get(key)
+    if t is None:
+        tr[key] = [1, dt, dt]
+    else:
+        t[0] += 1
+        t[1] += dt
+        t[2] = max(t[2], dt)
+
+@contextmanager
+def span(stage: str):
+    """Time a pipeline stage (guardian_stage_seconds); exceptions are counted and re-raised."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        STAGE_SECONDS.observe(dt, stage=stage)
+        _record(stage, dt)
+
+@contextmanager
+def upstream_call(upstream: str):
+    """Time one upstream request (guardian_upstream_request_seconds); failures are counted and re-raised."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.inc(upstream=upstream)
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        UPSTREAM_SECONDS.observe(dt, upstream=upstream)
+        _record("upstream:" + upstream, dt)
+
+@contextmanager
+def trace(name: str):
+    """Collect the spans run inside (including child tasks) and log them as one structured line."""
+    spans: dict = {}
+    token = _trace.set(spans)
+    t0 = time.perf_counter()
+    try:
+        with span(name):
+            yield spans
+    finally:
+        _trace.reset(token)
+        # 并发的 span（如逐 symbol 的新闻请求）累计耗时可超过墙钟时间；max 为单次最长
+        summary = {k: {"n": n, "s": round(s, 4), "max": round(m, 4)} for k, (n, s, m) in spans.items() if k != name}
+        logger.info("%s took %.3fs %s", name, time.perf_counter() - t0, json.dumps(summary, sort_keys=True))
+
+class CycleProfiler:
+    """cProfile the next N agent cycles into PROFILE_DIR (armed at runtime via POST /debug/profile)."""
+
+    def __init__(self):
+        self.armed = 0
+        self.dumps: deque[str] = deque(maxlen=20)
+
+    def arm(self, cycles: int) -> None:
+        self.armed = max(0, cycles)
+
+    def status(self) -> dict:
+        return {"enabled": bool(settings.PROFILE_DIR), "armed": self.armed, "dumps": list(self.dumps)}
+
+    @contextmanager
+    def profile(self, name: str):
+        if not settings.PROFILE_DIR or self.armed <= 0:
+            yield
+            return
+        self.armed -= 1
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:  # 同一线程已有 profiler 在运行
+            logger.warning("profiler busy; %s not profiled", name)
+            yield
+            return
+        try:
+            yield
+        finally:
+            prof.disable()
+            self._dump(prof, name)
+
+    def _dump(self, prof: cProfile.Profile, name: str) -> None:
+        # 只覆盖 event loop 线程（含 run_sync 里的同步 DB 阶段），不含 praw 线程池
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = os.path.join(settings.PROFILE_DIR, f"{name}-{stamp}-{os.getpid()}.prof")
+        prof.dump_stats(path)
+        with open(path.removesuffix(".prof") + ".txt", "w") as f:
+            pstats.Stats(prof, stream=f).sort_stats("cumulative").print_stats(60)
+        self.dumps.append(path)
+        logger.info("profile written to %s", path)
+
+profiler = CycleProfiler()
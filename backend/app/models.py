@@ -1,4 +1,4 @@
-from sqlalchemy import String, Integer, Float, DateTime, ForeignKey, Text, UniqueConstraint, Boolean
+from sqlalchemy import BigInteger, String, Integer, Float, DateTime, ForeignKey, Text, UniqueConstraint, Boolean, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 from .db import Base
@@ -28,6 +28,7 @@ class Holding(Base):
 
 class StockSnapshot(Base):
     __tablename__ = "snapshots"
+    __table_args__ = (Index("ix_snapshots_holding_ts", "holding_id", "ts"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     holding_id: Mapped[int] = mapped_column(Integer, ForeignKey("holdings.id"), index=True)
     ts: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
@@ -39,8 +40,40 @@ class StockSnapshot(Base):
     summary: Mapped[str | None] = mapped_column(Text, nullable=True)
     holding: Mapped["Holding"] = relationship("Holding", back_populates="snapshots")
 
+class SnapshotRollup(Base):
+    """Hourly / daily aggregate of a holding's snapshots; averages are sum / n."""
+    __tablename__ = "snapshot_rollups"
+    __table_args__ = (UniqueConstraint("holding_id", "bucket", "bucket_start", name="uq_rollup_bucket"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    holding_id: Mapped[int] = mapped_column(Integer, ForeignKey("holdings.id"), index=True)
+    bucket: Mapped[str] = mapped_column(String(8))  # hour / day
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, index=True)
+    first_ts: Mapped[datetime] = mapped_column(DateTime)
+    last_ts: Mapped[datetime] = mapped_column(DateTime)
+    open: Mapped[float] = mapped_column(Float)
+    high: Mapped[float] = mapped_column(Float)
+    low: Mapped[float] = mapped_column(Float)
+    close: Mapped[float] = mapped_column(Float)
+    n: Mapped[int] = mapped_column(Integer, default=0)
+    risk_min: Mapped[float] = mapped_column(Float)
+    risk_max: Mapped[float] = mapped_column(Float)
+    risk_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    sentiment_min: Mapped[float] = mapped_column(Float)
+    sentiment_max: Mapped[float] = mapped_column(Float)
+    sentiment_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    alerts: Mapped[int] = mapped_column(Integer, default=0)
+
+    @property
+    def risk_avg(self) -> float:
+        return self.risk_sum / self.n if self.n else 0.0
+
+    @property
+    def sentiment_avg(self) -> float:
+        return self.sentiment_sum / self.n if self.n else 0.0
+
 class AlertEvent(Base):
     __tablename__ = "alerts"
+    __table_args__ = (Index("ix_alerts_holding_ts", "holding_id", "ts"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     holding_id: Mapped[int] = mapped_column(Integer, ForeignKey("holdings.id"), index=True)
     ts: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
@@ -49,19 +82,58 @@ class AlertEvent(Base):
     detail: Mapped[str] = mapped_column(Text)
     holding: Mapped["Holding"] = relationship("Holding", back_populates="alerts")
 
+class AlertState(Base):
+    """Per-holding, per-condition firing state used for cooldown and hysteresis."""
+    __tablename__ = "alert_states"
+    __table_args__ = (UniqueConstraint("holding_id", "kind", name="uq_alert_state"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    holding_id: Mapped[int] = mapped_column(Integer, ForeignKey("holdings.id"), index=True)
+    kind: Mapped[str] = mapped_column(String(16))  # risk / sentiment / hot / change
+    active: Mapped[bool] = mapped_column(Boolean, default=False)
+    last_fired_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+class NotificationOutbox(Base):
+    __tablename__ = "notification_outbox"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    channel: Mapped[str] = mapped_column(String(16), default="telegram")
+    text: Mapped[str] = mapped_column(Text)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
 class ContentItem(Base):
     __tablename__ = "content_items"
+    __table_args__ = (
+        Index("uq_content_holding_key", "holding_id", "dedupe_key", unique=True),
+        Index("ix_content_holding_ts", "holding_id", "ts"),
+        Index("ix_content_holding_cluster_rank", "holding_id", "cluster_rank"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     holding_id: Mapped[int] = mapped_column(Integer, ForeignKey("holdings.id"), index=True)
     ts: Mapped[datetime] = mapped_column(DateTime, index=True)
     source: Mapped[str] = mapped_column(String(32))
     title: Mapped[str] = mapped_column(String(400))
     url: Mapped[str | None] = mapped_column(String(800), nullable=True)
-    dedupe_key: Mapped[str] = mapped_column(String(64), index=True)
+    dedupe_key: Mapped[str] = mapped_column(String(64))
     sentiment_score: Mapped[float] = mapped_column(Float, default=50.0)
-    hot_score: Mapped[float] = mapped_column(Float, default=0.0)
+    hot_score: Mapped[float] = mapped_column(Float, default=0.0)  # at ingestion time
+    rank_key: Mapped[float | None] = mapped_column(Float, nullable=True)  # scoring.rank_key，排序不随时间失效
+    # 近似重复聚类：cluster_id 指向簇首条目（簇首指向自身）；cluster_rank/size/ts 只在簇首上有值
+    cluster_id: Mapped[int | None] = mapped_column(Integer, nullable=True, index=True)
+    cluster_rank: Mapped[float | None] = mapped_column(Float, nullable=True)
+    cluster_size: Mapped[int] = mapped_column(Integer, default=1)
+    cluster_ts: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # 簇内最新一条的 ts
     holding: Mapped["Holding"] = relationship("Holding")
 
+class ContentDupBand(Base):
+    """MinHash-LSH band keys of cluster heads (see neardup.py), for sub-linear near-duplicate lookup."""
+    __tablename__ = "content_dup_bands"
+    holding_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    band_key: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    item_id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+
 class TriggerRule(Base):
     __tablename__ = "trigger_rules"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -81,3 +153,21 @@ class DailyReport(Base):
     content: Mapped[str] = mapped_column(Text)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     user: Mapped["User"] = relationship("User")
+
+class SummaryCache(Base):
+    __tablename__ = "summary_cache"
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    symbol: Mapped[str] = mapped_column(String(16), index=True)
+    model: Mapped[str] = mapped_column(String(64))
+    summary: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    hits: Mapped[int] = mapped_column(Integer, default=0)
+
+class Lease(Base):
+    """Time-bounded ownership of a named resource (leader role or a unit of work) shared across processes."""
+    __tablename__ = "leases"
+    name: Mapped[str] = mapped_column(String(128), primary_key=True)
+    owner: Mapped[str] = mapped_column(String(96), index=True)
+    acquired_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
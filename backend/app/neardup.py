@@ -0,0 +1,142 @@
+import hashlib
+import math
+import re
+from datetime import datetime
+from sqlalchemy import delete, exists, func, insert, select, update
+from sqlalchemy.orm import Session, aliased
+from .config import settings
+from .models import ContentItem, ContentDupBand
+
+# MinHash 签名 BANDS x ROWS；改动会使已存的 band key 失效
+BANDS = 8
+ROWS = 4
+_PRIME = (1 << 61) - 1
+_MASK63 = (1 << 63) - 1
+
+def _seeded(i: int) -> int:
+    return int.from_bytes(hashlib.blake2b(f"minhash:{i}".encode(), digest_size=8).digest(), "big")
+
+_PERMS = [(_seeded(2 * i) % (_PRIME - 1) + 1, _seeded(2 * i + 1) % _PRIME) for i in range(BANDS * ROWS)]
+
+_DECORATION = re.compile(r"^\[r/[^\]]+\]\s*\(\d+/\d+\)\s*")
+_NON_WORD = re.compile(r"[^\w\s]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or over says the this to was were will with".split()
+)
+
+def strip_decoration(title: str) -> str:
+    """Drop the "[r/sub] (score/comments) " prefix ingest_reddit adds; it changes on every fetch."""
+    return _DECORATION.sub("", title)
+
+def title_tokens(title: str) -> frozenset[str]:
+    words = _NON_WORD.sub(" ", strip_decoration(title).lower()).split()
+    return frozenset(w for w in words if w not in _STOPWORDS)
+
+def jaccard(a: frozenset[str], b: frozenset[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def band_keys(tokens: frozenset[str]) -> list[int]:
+    """MinHash-LSH band keys: titles with Jaccard similarity J share at least one key with
+    probability 1 - (1 - J**ROWS) ** BANDS (≈0.99 at J=0.8, ≈0.06 at J=0.3)."""
+    if not tokens:
+        return []
+    hashes = [int.from_bytes(hashlib.blake2b(t.encode(), digest_size=8).digest(), "big") for t in tokens]
+    sig = [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS]
+    keys = []
+    for band in range(BANDS):
+        raw = repr((band, sig[band * ROWS:(band + 1) * ROWS])).encode()
+        keys.append(int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big") & _MASK63)
+    return keys
+
+def find_heads(db: Session, holding_id: int, bands: set[int]) -> dict[int, list[tuple[int, frozenset[str], float]]]:
+    """band key -> [(head item id, title tokens, sentiment)] for existing cluster heads of one holding."""
+    out: dict[int, list[tuple[int, frozenset[str], float]]] = {}
+    keys = list(bands)
+    for i in range(0, len(keys), 500):
+        rows = db.execute(
+            select(ContentDupBand.band_key, ContentItem.id, ContentItem.title, ContentItem.sentiment_score)
+            .join(ContentItem, ContentItem.id == ContentDupBand.item_id)
+            .where(ContentDupBand.holding_id == holding_id, ContentDupBand.band_key.in_(keys[i:i + 500]))
+        )
+        for band, item_id, title, sentiment in rows:
+            out.setdefault(band, []).append((item_id, title_tokens(title), sentiment))
+    return out
+
+def best_match(tokens: frozenset[str], bands: list[int], candidates: dict[int, list]) -> tuple | None:
+    best, best_j = None, settings.CONTENT_DUP_JACCARD
+    for band in bands:
+        for cand in candidates.get(band, ()):
+            j = jaccard(tokens, cand[1])
+            if j >= best_j:
+                best, best_j = cand, j
+    return best
+
+def add_bands(db: Session, holding_id: int, head_bands: dict[int, list[int]]) -> None:
+    rows = [
+        {"holding_id": holding_id, "band_key": band, "item_id": item_id}
+        for item_id, bands in head_bands.items() for band in set(bands)
+    ]
+    for i in range(0, len(rows), 500):
+        db.execute(insert(ContentDupBand), rows[i:i + 500])
+
+def refresh_clusters(db: Session, head_ids: set[int]) -> None:
+    """Recompute cluster_rank / cluster_size / cluster_ts of the given heads from their members.
+
+    Current hotness is exp(rank_key - f(now)), so the summed hotness of a cluster is exp(logsumexp - f(now)):
+    cluster_rank = logsumexp(member rank keys) stays decay-invariant like rank_key itself.
+    """
+    ids = list(head_ids)
+    for i in range(0, len(ids), 500):
+        members: dict[int, list[float]] = {}
+        latest: dict[int, datetime] = {}
+        for cid, rk, ts in db.execute(
+            select(ContentItem.cluster_id, ContentItem.rank_key, ContentItem.ts).where(ContentItem.cluster_id.in_(ids[i:i + 500]))
+        ):
+            members.setdefault(cid, []).append(rk if rk is not None else -math.inf)
+            latest[cid] = max(latest.get(cid, ts), ts)
+        updates = []
+        for cid, rks in members.items():
+            top = max(rks)
+            rank = top + math.log(sum(math.exp(r - top) for r in rks)) if top > -math.inf else None
+            updates.append({"id": cid, "cluster_rank": rank, "cluster_size": len(rks), "cluster_ts": latest[cid]})
+        if updates:
+            db.execute(update(ContentItem), updates)
+
+def prune_clusters(db: Session) -> int:
+    """After retention deletes: drop band rows of deleted heads, re-head clusters whose head is gone and
+    refresh every cluster that lost members. Returns the members moved to a new head.
+
+    The hottest surviving member of an orphaned cluster becomes its head (and gets band rows); the
+    others are repointed to it, so the cluster keeps its size and sentiment instead of splitting up.
+    """
+    head = aliased(ContentItem)
+    db.execute(delete(ContentDupBand).where(~exists().where(ContentItem.id == ContentDupBand.item_id)))
+    orphans = db.execute(
+        select(ContentItem.id, ContentItem.holding_id, ContentItem.title, ContentItem.rank_key, ContentItem.cluster_id)
+        .where(ContentItem.cluster_id.is_not(None), ~exists().where(head.id == ContentItem.cluster_id))
+    ).all()
+    clusters: dict[int, list] = {}
+    for r in orphans:
+        clusters.setdefault(r.cluster_id, []).append(r)
+    new_head = {
+        cid: max(rs, key=lambda r: (r.rank_key if r.rank_key is not None else -math.inf, r.id))
+        for cid, rs in clusters.items()
+    }
+    if orphans:
+        db.execute(update(ContentItem), [{"id": r.id, "cluster_id": new_head[r.cluster_id].id} for r in orphans])
+        for h in new_head.values():
+            add_bands(db, h.holding_id, {h.id: band_keys(title_tokens(h.title))})
+    # 簇首仍在但成员被删：cluster_size 与实际成员数不符
+    counts = (
+        select(ContentItem.cluster_id, func.count().label("n"))
+        .where(ContentItem.cluster_id.is_not(None)).group_by(ContentItem.cluster_id).subquery()
+    )
+    stale = db.execute(
+        select(head.id).join(counts, counts.c.cluster_id == head.id)
+        .where(head.cluster_id == head.id, head.cluster_size != counts.c.n)
+    ).scalars().all()
+    refresh_clusters(db, {h.id for h in new_head.values()} | set(stale))
+    db.commit()
+    return len(orphans)
@@ -1,10 +1,129 @@
-import httpx
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.orm import Session
 from .config import settings
+from .db import AsyncSessionLocal
+from .http_clients import get_client
+from .metrics import ROWS_WRITTEN, upstream_call
+from .models import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MAX_CHARS = 4000  # API limit is 4096
+
+def telegram_enabled() -> bool:
+    return bool(settings.TELEGRAM_BOT_TOKEN and settings.TELEGRAM_CHAT_ID)
+
+class TelegramRateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited for {retry_after}s")
+        self.retry_after = retry_after
 
 async def notify_telegram(text: str) -> None:
-    if not (settings.TELEGRAM_BOT_TOKEN and settings.TELEGRAM_CHAT_ID):
+    if not telegram_enabled():
         return
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
+    url = f"{settings.TELEGRAM_API_URL.rstrip('/')}/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {"chat_id": settings.TELEGRAM_CHAT_ID, "text": text}
-    async with httpx.AsyncClient(timeout=10) as client:
-        await client.post(url, json=payload)
+    with upstream_call("telegram"):
+        r = await get_client(url).post(url, json=payload)
+        if r.status_code == 429:
+            try:
+                retry_after = float(r.json().get("parameters", {}).get("retry_after", 5))
+            except ValueError:
+                retry_after = 5.0
+            raise TelegramRateLimited(retry_after)
+        r.raise_for_status()
+
+def enqueue_notification(db: Session, text: str) -> None:
+    """Queue a message in the outbox; it is sent once the caller's transaction commits."""
+    if telegram_enabled():
+        db.add(NotificationOutbox(text=text))
+
+def _digests(rows: list[NotificationOutbox]) -> list[tuple[list[int], str]]:
+    """Fold queued rows into as few messages as fit the Telegram size limit."""
+    out: list[tuple[list[int], str]] = []
+    ids: list[int] = []
+    parts: list[str] = []
+    size = 0
+    for r in rows:
+        text = r.text[:TELEGRAM_MAX_CHARS]
+        if parts and size + len(text) + 2 > TELEGRAM_MAX_CHARS:
+            out.append((ids, "\n\n".join(parts)))
+            ids, parts, size = [], [], 0
+        ids.append(r.id)
+        parts.append(text)
+        size += len(text) + 2
+    if parts:
+        out.append((ids, "\n\n".join(parts)))
+    return out
+
+async def _claim_due(limit: int) -> list[tuple[list[int], str]]:
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(NotificationOutbox)
+            .where(NotificationOutbox.sent_at.is_(None), NotificationOutbox.next_attempt_at <= datetime.utcnow())
+            .order_by(NotificationOutbox.id)
+            .limit(limit)
+        )).scalars().all()
+        return _digests(rows)
+
+async def _mark(ids: list[int], error: str | None, delay: float = 0.0, count_attempt: bool = True) -> None:
+    async with AsyncSessionLocal() as db:
+        now = datetime.utcnow()
+        for r in (await db.execute(select(NotificationOutbox).where(NotificationOutbox.id.in_(ids)))).scalars():
+            if error is None:
+                r.sent_at = now
+                continue
+            if count_attempt:
+                r.attempts += 1
+            r.last_error = error[:500]
+            if r.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                r.sent_at = now  # 放弃，保留 last_error 以便排查
+            else:
+                r.next_attempt_at = now + timedelta(seconds=delay or min(600, 2 ** r.attempts * 5))
+        await db.commit()
+
+_next_send_at = 0.0
+
+async def drain_outbox() -> int:
+    """Send everything due as digest messages, paced by TELEGRAM_MIN_INTERVAL_SECONDS. Returns rows delivered."""
+    global _next_send_at
+    if not telegram_enabled():
+        return 0
+    sent = 0
+    for ids, text in await _claim_due(settings.OUTBOX_BATCH):
+        wait = _next_send_at - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            await notify_telegram(text)
+        except TelegramRateLimited as e:
+            _next_send_at = time.monotonic() + e.retry_after
+            await _mark(ids, str(e), e.retry_after, False)
+            break
+        except Exception as e:
+            logger.warning("telegram send failed: %s", e)
+            await _mark(ids, repr(e))
+            continue
+        finally:
+            _next_send_at = max(_next_send_at, time.monotonic() + settings.TELEGRAM_MIN_INTERVAL_SECONDS)
+        await _mark(ids, None)
+        sent += len(ids)
+        ROWS_WRITTEN.inc(len(ids), table="outbox_sent")
+    return sent
+
+async def run_outbox_worker(enabled: Callable[[], bool] = lambda: True) -> None:
+    """Background loop draining the outbox until cancelled; idle while `enabled()` is false (not the leader)."""
+    while True:
+        try:
+            if enabled():
+                await drain_outbox()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("outbox drain failed")
+        await asyncio.sleep(settings.OUTBOX_POLL_SECONDS)
@@ -1,17 +1,18 @@
-import httpx
 from .config import settings
+from .http_clients import get_client
+from .metrics import upstream_call
 
 async def fetch_ticker_news(symbol: str, limit: int = 20) -> list[dict]:
     if not settings.POLYGON_API_KEY:
         return []
-    url = f"https://api.polygon.io/v2/reference/news"
+    url = settings.POLYGON_BASE_URL.rstrip("/") + "/v2/reference/news"
     params = {
         "ticker": symbol.upper(),
         "limit": limit,
         "apiKey": settings.POLYGON_API_KEY,
     }
-    async with httpx.AsyncClient(timeout=20) as client:
-        r = await client.get(url, params=params)
+    with upstream_call("polygon_news"):
+        r = await get_client(url).get(url, params=params)
         r.raise_for_status()
-        data = r.json()
-        return data.get("results", [])
+    data = r.json()
+    return data.get("results", [])
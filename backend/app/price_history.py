@@ -0,0 +1,226 @@
+import logging
+import math
+import os
+import re
+import threading
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import groupby
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from .config import settings
+from .metrics import ROWS_WRITTEN
+from .models import Holding, StockSnapshot
+
+logger = logging.getLogger(__name__)
+
+# 每条记录定长；cum_r2 / sessions 为前缀和，任意窗口的已实现波动率只需首尾两条记录
+RECORD = np.dtype([
+    ("ts", "<i8"),  # epoch seconds (UTC)
+    ("price", "<f8"),
+    ("volume", "<f8"),
+    ("cum_r2", "<f8"),  # running sum of squared intraday log returns
+    ("sessions", "<i8"),  # running session count
+    ("gap_pct", "<f8"),  # move across the quiet spell before this point, else 0
+])
+
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+_UNSAFE = re.compile(r"[^A-Z0-9._-]")
+
+@dataclass
+class PriceFeatures:
+    n: int  # points in the window
+    return_pct: float  # price change over the window
+    realized_vol_pct: float  # per-session volatility from intraday returns
+    max_gap_pct: float  # largest absolute gap in the window
+    last_gap_pct: float  # most recent gap in the window (signed), 0 if none
+    gaps: int
+
+def epoch_seconds(ts: datetime) -> int:
+    # naive 时间按 UTC 处理，与库中一致
+    if ts.tzinfo is not None:
+        ts = ts.replace(tzinfo=None) - ts.utcoffset()
+    return (ts - _EPOCH) // _SECOND
+
+def _next_record(last: tuple | None, ts: int, price: float, volume: float | None) -> tuple | None:
+    """The record to append after `last` (None: first point), or None if the point adds nothing."""
+    if price is None or price <= 0:
+        return None
+    if last is None:
+        return (ts, price, volume or 0.0, 0.0, 1, 0.0)
+    if ts <= last[0] or price == last[1]:
+        return None  # 重复报价（缓存命中、休市）不占空间
+    r = math.log(price / last[1])
+    if ts - last[0] >= settings.PRICE_GAP_HOURS * 3600:
+        return (ts, price, volume or 0.0, last[3], last[4] + 1, math.expm1(r) * 100.0)
+    return (ts, price, volume or 0.0, last[3] + r * r, last[4], 0.0)
+
+def window_stats(a: np.ndarray, at, window_s: float) -> dict[str, np.ndarray]:
+    """Features of the records `a` over the `window_s` seconds up to each time in `at` (vectorised over `at`).
+
+    Only the records spanned by the requested windows are read, so a single query costs O(window).
+    """
+    at = np.atleast_1d(np.asarray(at, dtype=np.int64))
+    ts = a["ts"]
+    end = np.searchsorted(ts, at, side="right") - 1
+    start = np.searchsorted(ts, at - int(window_s), side="left")
+    n = np.maximum(end - start + 1, 0)
+    out = {k: np.zeros(at.size) for k in ("return_pct", "realized_vol_pct", "max_gap_pct", "last_gap_pct")}
+    out["n"] = n
+    out["gaps"] = np.zeros(at.size, dtype=np.int64)
+    ok = n > 0
+    if not ok.any():
+        return out
+    s, e = start[ok], end[ok]
+    off = max(int(s.min()) - 1, 0)
+    w = a[off:int(e.max()) + 1]  # 视图，不复制
+    ref, si, ei = np.maximum(s - 1, 0) - off, s - off, e - off  # 收益以窗口前最后一个价格为基准
+    price, cum_r2, sessions, gap = w["price"], w["cum_r2"], w["sessions"], w["gap_pct"]
+    out["return_pct"][ok] = (price[ei] / price[ref] - 1.0) * 100.0
+    nsess = sessions[ei] - sessions[si] + 1
+    out["realized_vol_pct"][ok] = np.sqrt(np.maximum(cum_r2[ei] - cum_r2[si], 0.0) / nsess) * 100.0
+    # 缺口稀疏：只在缺口位置上按窗口聚合；窗口首条自身的缺口发生在窗口之前，不计
+    gp = np.flatnonzero(gap)
+    if gp.size:
+        g0 = np.searchsorted(gp, si + 1, side="left")
+        g1 = np.searchsorted(gp, ei, side="right")
+        out["gaps"][ok] = g1 - g0
+        has = g1 > g0
+        if has.any():
+            absg = np.append(np.abs(gap[gp]), 0.0)  # 哨兵，使 g1 == 缺口数时仍是合法下标
+            mx = np.maximum.reduceat(absg, np.stack([g0[has], g1[has]], axis=1).ravel())[::2]
+            idx = np.flatnonzero(ok)[has]
+            out["max_gap_pct"][idx] = mx
+            out["last_gap_pct"][idx] = gap[gp[g1[has] - 1]]
+    return out
+
+class PriceStore:
+    """Price history per symbol in `<root>/<SYMBOL>.bin`, appended each cycle and read through memory maps.
+
+    Slices returned by `series` are views of the mapped file; nothing is copied until arithmetic runs on them.
+    """
+
+    def __init__(self, root: str | None):
+        self.root = root
+        self._lock = threading.Lock()
+        self._maps: dict[str, np.ndarray] = {}
+        self.appended = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    def _path(self, symbol: str) -> str:
+        return os.path.join(self.root, _UNSAFE.sub("_", symbol.upper()) + ".bin")
+
+    def series(self, symbol: str, since: datetime | None = None, until: datetime | None = None) -> np.ndarray:
+        """Records of `symbol` (optionally between `since` and `until`) as a read-only view."""
+        empty = np.zeros(0, dtype=RECORD)
+        if not self.root:
+            return empty
+        path = self._path(symbol)
+        try:
+            n = os.path.getsize(path) // RECORD.itemsize
+        except OSError:
+            return empty
+        a = self._maps.get(symbol)
+        if a is None or a.size != n:
+            if n == 0:
+                return empty
+            # 普通 ndarray 视图：仍然共享映射内存，但切片不再走 memmap 子类的开销
+            a = self._maps[symbol] = np.memmap(path, dtype=RECORD, mode="r", shape=(n,)).view(np.ndarray)
+        if since is not None:
+            a = a[np.searchsorted(a["ts"], epoch_seconds(since), side="left"):]
+        if until is not None:
+            a = a[:np.searchsorted(a["ts"], epoch_seconds(until), side="right")]
+        return a
+
+    def append(self, symbol: str, points: Iterable[tuple[int, float, float | None]]) -> int:
+        """Append (epoch seconds, price, volume) points in time order; repeats and stale points are skipped."""
+        a = self.series(symbol)
+        last = a[-1].tolist() if a.size else None
+        recs = []
+        for ts, price, volume in points:
+            rec = _next_record(last, ts, price, volume)
+            if rec is not None:
+                recs.append(rec)
+                last = rec
+        if not recs:
+            return 0
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(symbol)
+        # 每个 symbol 每轮只有一个进程写（leader，或认领了它的进程）；O_APPEND 单次 write 追加整条记录
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            tail = os.fstat(fd).st_size % RECORD.itemsize
+            if tail:  # 上次写到一半崩溃留下的残缺记录
+                os.ftruncate(fd, os.fstat(fd).st_size - tail)
+            os.write(fd, np.array(recs, dtype=RECORD).tobytes())
+        finally:
+            os.close(fd)
+        self.appended += len(recs)
+        return len(recs)
+
+    def features(self, symbol: str, at: datetime | None = None) -> PriceFeatures | None:
+        """Window features as of `at` (default now); None with fewer than PRICE_MIN_POINTS points."""
+        a = self.series(symbol)
+        if not a.size:
+            return None
+        st = window_stats(a, epoch_seconds(at or datetime.utcnow()), settings.PRICE_WINDOW_DAYS * 86400)
+        if st["n"][0] < settings.PRICE_MIN_POINTS:
+            return None
+        return PriceFeatures(
+            n=int(st["n"][0]), return_pct=float(st["return_pct"][0]), realized_vol_pct=float(st["realized_vol_pct"][0]),
+            max_gap_pct=float(st["max_gap_pct"][0]), last_gap_pct=float(st["last_gap_pct"][0]), gaps=int(st["gaps"][0]),
+        )
+
+    def features_at(self, symbol: str, at: np.ndarray) -> dict[str, np.ndarray]:
+        """`features` for many epoch-second times at once (offline replay); `valid` marks enough points."""
+        st = window_stats(self.series(symbol), at, settings.PRICE_WINDOW_DAYS * 86400)
+        st["valid"] = st["n"] >= settings.PRICE_MIN_POINTS
+        return st
+
+    def record_quotes(self, quotes: Iterable) -> dict[str, PriceFeatures]:
+        """Append this cycle's MarketQuotes and return the features of every symbol that has enough history."""
+        if not self.root:
+            return {}
+        out: dict[str, PriceFeatures] = {}
+        written = 0
+        with self._lock:
+            for q in quotes:
+                try:
+                    written += self.append(q.symbol, [(epoch_seconds(q.ts), q.price, q.volume)])
+                    f = self.features(q.symbol)
+                except OSError:
+                    logger.exception("price history for %s failed", q.symbol)
+                    continue
+                if f is not None:
+                    out[q.symbol] = f
+        ROWS_WRITTEN.inc(written, table="price_history")
+        return out
+
+    def seed(self, db: Session) -> int:
+        """First start with an empty store: fill it from the stored snapshot prices."""
+        if not self.root or (os.path.isdir(self.root) and any(f.endswith(".bin") for f in os.listdir(self.root))):
+            return 0
+        rows = db.execute(
+            select(Holding.symbol, StockSnapshot.ts, StockSnapshot.price, StockSnapshot.volume)
+            .join(Holding, Holding.id == StockSnapshot.holding_id)
+            .order_by(Holding.symbol, StockSnapshot.ts)
+        )
+        written = 0
+        with self._lock:
+            # 同一 symbol 的多个持仓在同一轮写入相同价格，时间戳不前进的点被跳过
+            for symbol, group in groupby(rows, key=lambda r: r.symbol.upper()):
+                written += self.append(symbol, ((epoch_seconds(r.ts), r.price, r.volume) for r in group))
+        if written:
+            logger.info("price history seeded with %d points from snapshots", written)
+        return written
+
+    def stats(self) -> dict:
+        return {"symbols_mapped": len(self._maps), "records_appended": self.appended}
+
+price_store = PriceStore(settings.PRICE_HISTORY_DIR)
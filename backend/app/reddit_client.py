@@ -1,35 +1,83 @@
+import asyncio
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from .config import settings
+from .metrics import upstream_call
 from datetime import datetime, timezone
 
+# praw 是同步库：放到独立线程池执行，避免阻塞 event loop；客户端进程内复用
+_executor = ThreadPoolExecutor(max_workers=max(1, settings.REDDIT_CONCURRENCY), thread_name_prefix="reddit")
+_reddit = None
+_reddit_lock = threading.Lock()
+
+_TOKEN = re.compile(r"(\$?)\b([A-Za-z][A-Za-z.]{0,5})\b")
+
 def _client():
+    global _reddit
+    if _reddit is not None:
+        return _reddit
     import praw
     if not (settings.REDDIT_CLIENT_ID and settings.REDDIT_CLIENT_SECRET):
         raise RuntimeError("REDDIT_CLIENT_ID/REDDIT_CLIENT_SECRET not set")
-    return praw.Reddit(
-        client_id=settings.REDDIT_CLIENT_ID,
-        client_secret=settings.REDDIT_CLIENT_SECRET,
-        user_agent=settings.REDDIT_USER_AGENT,
-    )
+    with _reddit_lock:
+        if _reddit is None:
+            _reddit = praw.Reddit(
+                client_id=settings.REDDIT_CLIENT_ID,
+                client_secret=settings.REDDIT_CLIENT_SECRET,
+                user_agent=settings.REDDIT_USER_AGENT,
+                oauth_url=settings.REDDIT_OAUTH_URL,
+                reddit_url=settings.REDDIT_URL,
+            )
+    return _reddit
 
-def fetch_reddit_mentions(symbol: str, limit: int = 30) -> list[dict]:
+def _post_to_item(s) -> dict:
+    created = float(getattr(s, "created_utc", 0) or 0)
+    return {
+        "source": "reddit",
+        "subreddit": s.subreddit.display_name,
+        "title": s.title,
+        "url": f"https://www.reddit.com{s.permalink}",
+        "score": int(getattr(s, "score", 0) or 0),
+        "num_comments": int(getattr(s, "num_comments", 0) or 0),
+        "created_utc": created,
+        "ts": datetime.fromtimestamp(created, tz=timezone.utc) if created else datetime.now(timezone.utc),
+    }
+
+def fetch_new_posts(limit: int) -> list[dict]:
+    """One listing over all REDDIT_SUBREDDITS (newest first); blocking."""
     try:
         reddit = _client()
     except RuntimeError:
         return []
-    subs = settings.REDDIT_SUBREDDITS
-    q = f'"{symbol.upper()}"'
-    items: list[dict] = []
-    for s in reddit.subreddit(subs).search(q, sort="new", limit=limit):
-        items.append({
-            "source": "reddit",
-            "subreddit": s.subreddit.display_name,
-            "title": s.title,
-            "url": f"https://www.reddit.com{s.permalink}",
-            "score": int(getattr(s, "score", 0) or 0),
-            "num_comments": int(getattr(s, "num_comments", 0) or 0),
-            "created_utc": float(getattr(s, "created_utc", 0) or 0),
-        })
-    for it in items:
-        ts = datetime.fromtimestamp(it["created_utc"], tz=timezone.utc) if it["created_utc"] else datetime.now(timezone.utc)
-        it["ts"] = ts
-    return items
+    return [_post_to_item(s) for s in reddit.subreddit(settings.REDDIT_SUBREDDITS).new(limit=limit)]
+
+def match_symbols(title: str, symbols: set[str]) -> set[str]:
+    """Tickers from `symbols` mentioned in `title`: "$aapl" in any case, or the bare upper-case ticker.
+
+    Single-letter tickers only match as cashtags to avoid hits on words like "A" or "I".
+    """
+    found = set()
+    for cash, word in _TOKEN.findall(title):
+        sym = word.upper()
+        if sym not in symbols:
+            continue
+        if cash or (word.isupper() and len(sym) > 1):
+            found.add(sym)
+    return found
+
+def route_posts(posts: list[dict], symbols: list[str], limit_per_symbol: int) -> dict[str, list[dict]]:
+    wanted = {s.upper() for s in symbols}
+    out: dict[str, list[dict]] = {s: [] for s in wanted}
+    for post in posts:
+        for sym in match_symbols(post["title"], wanted):
+            if len(out[sym]) < limit_per_symbol:
+                out[sym].append(post)
+    return out
+
+async def fetch_reddit_mentions_bulk(symbols: list[str], limit_per_symbol: int = 30) -> dict[str, list[dict]]:
+    """Fetch the newest posts once for the whole cycle and route them to every mentioned ticker."""
+    loop = asyncio.get_running_loop()
+    with upstream_call("reddit"):
+        posts = await loop.run_in_executor(_executor, fetch_new_posts, settings.REDDIT_SCAN_LIMIT)
+    return route_posts(posts, symbols, limit_per_symbol)
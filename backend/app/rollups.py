@@ -0,0 +1,193 @@
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import case, delete, insert, select
+from sqlalchemy.orm import Session
+from .config import settings
+from .models import AlertEvent, ContentItem, SnapshotRollup, StockSnapshot
+from .neardup import prune_clusters
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = ("hour", "day")
+
+# (holding_id, ts, price, risk_score, sentiment_score)
+Point = tuple[int, datetime, float, float, float]
+
+def bucket_start(ts: datetime, bucket: str) -> datetime:
+    if bucket == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _merge(a: dict, b: dict) -> dict:
+    """Combine two partial aggregates of the same bucket."""
+    first, last = (a, b) if a["first_ts"] <= b["first_ts"] else (b, a)
+    closing = b if b["last_ts"] >= a["last_ts"] else a
+    return {
+        **a,
+        "first_ts": first["first_ts"], "open": first["open"],
+        "last_ts": closing["last_ts"], "close": closing["close"],
+        "high": max(a["high"], b["high"]), "low": min(a["low"], b["low"]),
+        "n": a["n"] + b["n"],
+        "risk_min": min(a["risk_min"], b["risk_min"]), "risk_max": max(a["risk_max"], b["risk_max"]),
+        "risk_sum": a["risk_sum"] + b["risk_sum"],
+        "sentiment_min": min(a["sentiment_min"], b["sentiment_min"]),
+        "sentiment_max": max(a["sentiment_max"], b["sentiment_max"]),
+        "sentiment_sum": a["sentiment_sum"] + b["sentiment_sum"],
+        "alerts": a["alerts"] + b["alerts"],
+    }
+
+def _aggregate(points: list[Point], alerts: Counter) -> list[dict]:
+    """One row per (holding, bucket, bucket_start); `alerts` counts are consumed as they are attached."""
+    merged: dict[tuple, dict] = {}
+    for hid, ts, price, risk, sentiment in points:
+        for b in BUCKETS:
+            key = (hid, b, bucket_start(ts, b))
+            row = {
+                "holding_id": hid, "bucket": b, "bucket_start": key[2],
+                "first_ts": ts, "last_ts": ts, "open": price, "high": price, "low": price, "close": price,
+                "n": 1, "risk_min": risk, "risk_max": risk, "risk_sum": risk,
+                "sentiment_min": sentiment, "sentiment_max": sentiment, "sentiment_sum": sentiment,
+                "alerts": alerts.pop(key, 0),
+            }
+            merged[key] = _merge(merged[key], row) if key in merged else row
+    return list(merged.values())
+
+def _upsert_statement(db: Session, rows: list[dict]):
+    """INSERT .. ON CONFLICT that folds `rows` into existing buckets, or None if the dialect has none."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    t = SnapshotRollup.__table__
+    stmt = dialect_insert(t).values(rows)
+    ex = stmt.excluded
+    earlier = ex.first_ts < t.c.first_ts
+    later = ex.last_ts >= t.c.last_ts
+    return stmt.on_conflict_do_update(
+        index_elements=[t.c.holding_id, t.c.bucket, t.c.bucket_start],
+        set_={
+            "first_ts": case((earlier, ex.first_ts), else_=t.c.first_ts),
+            "open": case((earlier, ex.open), else_=t.c.open),
+            "last_ts": case((later, ex.last_ts), else_=t.c.last_ts),
+            "close": case((later, ex.close), else_=t.c.close),
+            "high": case((ex.high > t.c.high, ex.high), else_=t.c.high),
+            "low": case((ex.low < t.c.low, ex.low), else_=t.c.low),
+            "n": t.c.n + ex.n,
+            "risk_min": case((ex.risk_min < t.c.risk_min, ex.risk_min), else_=t.c.risk_min),
+            "risk_max": case((ex.risk_max > t.c.risk_max, ex.risk_max), else_=t.c.risk_max),
+            "risk_sum": t.c.risk_sum + ex.risk_sum,
+            "sentiment_min": case((ex.sentiment_min < t.c.sentiment_min, ex.sentiment_min), else_=t.c.sentiment_min),
+            "sentiment_max": case((ex.sentiment_max > t.c.sentiment_max, ex.sentiment_max), else_=t.c.sentiment_max),
+            "sentiment_sum": t.c.sentiment_sum + ex.sentiment_sum,
+            "alerts": t.c.alerts + ex.alerts,
+        },
+    )
+
+def _write(db: Session, rows: list[dict]) -> None:
+    for i in range(0, len(rows), 500):
+        chunk = rows[i:i + 500]
+        stmt = _upsert_statement(db, chunk)
+        if stmt is not None:
+            db.execute(stmt)
+            continue
+        for r in chunk:
+            old = db.execute(
+                select(SnapshotRollup).where(
+                    SnapshotRollup.holding_id == r["holding_id"],
+                    SnapshotRollup.bucket == r["bucket"],
+                    SnapshotRollup.bucket_start == r["bucket_start"],
+                )
+            ).scalar_one_or_none()
+            if old is None:
+                db.execute(insert(SnapshotRollup), [r])
+                continue
+            current = {c: getattr(old, c) for c in r}
+            for k, v in _merge(current, r).items():
+                setattr(old, k, v)
+        db.flush()
+
+def record_snapshots(db: Session, points: list[Point], alert_holding_ids: set[int] = frozenset()) -> None:
+    """Fold freshly written snapshots (and their alerts) into the hourly and daily rollups; caller commits."""
+    if not points:
+        return
+    alerts = Counter(
+        (hid, b, bucket_start(ts, b)) for hid, ts, *_ in points if hid in alert_holding_ids for b in BUCKETS
+    )
+    _write(db, _aggregate(points, alerts))
+
+def backfill_rollups(db: Session, chunk: int = 20000) -> int:
+    """Build rollups from raw snapshots once, when the rollup table is still empty. Returns snapshots folded."""
+    if db.execute(select(SnapshotRollup.id).limit(1)).first() is not None:
+        return 0
+    if db.execute(select(StockSnapshot.id).limit(1)).first() is None:
+        return 0
+    alerts = Counter(
+        (hid, b, bucket_start(ts, b))
+        for hid, ts in db.execute(select(AlertEvent.holding_id, AlertEvent.ts))
+        for b in BUCKETS
+    )
+    done = 0
+    last_id = 0
+    while True:
+        points = db.execute(
+            select(StockSnapshot.id, StockSnapshot.holding_id, StockSnapshot.ts, StockSnapshot.price,
+                   StockSnapshot.risk_score, StockSnapshot.sentiment_score)
+            .where(StockSnapshot.id > last_id)
+            .order_by(StockSnapshot.id)
+            .limit(chunk)
+        ).all()
+        if not points:
+            break
+        last_id = points[-1][0]
+        _write(db, _aggregate([tuple(p[1:]) for p in points], alerts))
+        db.commit()
+        done += len(points)
+    logger.info("backfilled rollups from %d snapshots", done)
+    return done
+
+def rollup_series(db: Session, holding_id: int, bucket: str, since: datetime, until: datetime | None = None) -> list[SnapshotRollup]:
+    q = select(SnapshotRollup).where(
+        SnapshotRollup.holding_id == holding_id,
+        SnapshotRollup.bucket == bucket,
+        SnapshotRollup.bucket_start >= bucket_start(since, bucket),
+    )
+    if until is not None:
+        q = q.where(SnapshotRollup.bucket_start <= until)
+    return list(db.execute(q.order_by(SnapshotRollup.bucket_start)).scalars())
+
+def _delete_before(db: Session, model, ts_col, cutoff: datetime, *where) -> int:
+    # 小批量删除，每批单独提交，避免长事务锁表
+    total = 0
+    batch = max(1, settings.RETENTION_BATCH)
+    while True:
+        ids = db.execute(select(model.id).where(ts_col < cutoff, *where).limit(batch)).scalars().all()
+        if not ids:
+            return total
+        db.execute(delete(model).where(model.id.in_(ids)))
+        db.commit()
+        total += len(ids)
+
+def prune_raw(db: Session) -> dict[str, int]:
+    """Delete raw snapshots, content and hourly rollups older than their retention horizons."""
+    now = datetime.utcnow()
+    out = {
+        "snapshots": _delete_before(
+            db, StockSnapshot, StockSnapshot.ts, now - timedelta(days=settings.SNAPSHOT_RETENTION_DAYS),
+        ),
+        "content_items": _delete_before(
+            db, ContentItem, ContentItem.ts,
+            datetime.now(timezone.utc) - timedelta(days=settings.CONTENT_RETENTION_DAYS),
+        ),
+        "hourly_rollups": _delete_before(
+            db, SnapshotRollup, SnapshotRollup.bucket_start,
+            now - timedelta(days=settings.HOURLY_ROLLUP_RETENTION_DAYS), SnapshotRollup.bucket == "hour",
+        ),
+    }
+    if out["content_items"]:
+        out["promoted_cluster_members"] = prune_clusters(db)
+    logger.info("retention pruned %s", out)
+    return out
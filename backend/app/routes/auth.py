@@ -1,31 +1,36 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
-from ..db import get_db
+from ..db import get_async_db
 from ..models import User
 from ..schemas import UserCreate, UserOut, Token
 from ..auth import hash_password, verify_password, create_access_token, get_current_user
+from ..identity import Identity
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
+async def _user_by_email(db: AsyncSession, email: str) -> User | None:
+    return (await db.execute(select(User).where(User.email == email))).scalars().first()
+
 @router.post("/register", response_model=UserOut)
-def register(payload: UserCreate, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == payload.email).first():
+async def register(payload: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    if await _user_by_email(db, payload.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     u = User(email=payload.email, password_hash=hash_password(payload.password))
     db.add(u)
-    db.commit()
-    db.refresh(u)
+    await db.commit()
+    await db.refresh(u)
     return u
 
 @router.post("/login", response_model=Token)
-def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    u = db.query(User).filter(User.email == form.username).first()
+async def login(form: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    u = await _user_by_email(db, form.username)
     if not u or not verify_password(form.password, u.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     token = create_access_token(u.email)
     return Token(access_token=token)
 
 @router.get("/me", response_model=UserOut)
-def me(user: User = Depends(get_current_user)):
+def me(user: Identity = Depends(get_current_user)):
     return user
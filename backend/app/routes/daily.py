@@ -1,25 +1,22 @@
-from fastapi import APIRouter
-from sqlalchemy.orm import Session
-from ..db import get_db, SessionLocal
+from fastapi import APIRouter, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..db import get_async_db
 from ..models import DailyReport, User
 from ..schemas import DailyReportOut
 
 router = APIRouter(prefix="/api/daily", tags=["daily"])
 
 @router.get("/reports", response_model=list[DailyReportOut])
-def list_reports():
-    db = SessionLocal()
-    try:
-        # 获取第一个用户的日报
-        user = db.query(User).first()
-        if not user:
-            return []
-        return (
-            db.query(DailyReport)
-            .filter(DailyReport.user_id == user.id)
-            .order_by(DailyReport.date_yyyymmdd.desc())
-            .limit(30)
-            .all()
-        )
-    finally:
-        db.close()
+async def list_reports(db: AsyncSession = Depends(get_async_db)):
+    # 获取第一个用户的日报
+    user_id = (await db.execute(select(User.id).order_by(User.id).limit(1))).scalar()
+    if user_id is None:
+        return []
+    rows = await db.execute(
+        select(DailyReport)
+        .where(DailyReport.user_id == user_id)
+        .order_by(DailyReport.date_yyyymmdd.desc())
+        .limit(30)
+    )
+    return rows.scalars().all()
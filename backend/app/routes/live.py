@@ -0,0 +1,107 @@
+import asyncio
+from fastapi import APIRouter, Header, Query
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy import select
+from ..config import settings
+from ..db import AsyncSessionLocal
+from ..live import Subscriber, broker, decode_cursor, encode_cursor, read_since
+from ..models import User
+
+router = APIRouter(prefix="/api/live", tags=["live"])
+
+_db_replays = asyncio.Semaphore(settings.LIVE_REPLAY_CONCURRENCY)
+
+def _merge(seen: dict[str, int], pos: dict[str, int]) -> dict[str, int]:
+    # 逐表取较大值：事件自带的全局位置可能落后于续传时已按表补发的游标
+    return {k: max(v, pos[k]) for k, v in seen.items()}
+
+def _frame(ev, seen: dict[str, int]) -> tuple[str, dict[str, int]]:
+    cur = _merge(seen, ev.pos)
+    return (ev.frame() if cur == ev.pos else ev.frame(encode_cursor(cur))), cur
+
+async def _catch_up(sub: Subscriber, seen: dict[str, int]) -> tuple[str, dict[str, int]]:
+    """Frames for rows past `seen` and the cursor after them: from the broker's buffer when it reaches
+    back far enough, otherwise from the DB (a few at a time, so mass reconnects cannot drain the pool)."""
+    events = broker.since(seen)
+    if events is not None:
+        complete = True
+        cur = _merge(seen, broker.tail or seen)
+    else:
+        async with _db_replays:
+            async with AsyncSessionLocal() as db:
+                events, cur, complete = await read_since(db, seen, settings.LIVE_REPLAY_LIMIT)
+    out, at = [], seen
+    for ev in events:
+        if sub.wants(ev):
+            frame, at = _frame(ev, at)
+            out.append(frame)
+    out = "".join(out)
+    if not complete:
+        # 落后太多：让客户端走 REST 重新拉取，从当前末尾继续推送
+        cur = _merge(cur, broker.tail or cur)
+        out += f"id: {encode_cursor(cur)}\nevent: reset\ndata: {{}}\n\n"
+    return out, cur
+
+def _drain(sub: Subscriber, seen: dict[str, int], first=None) -> tuple[str, dict[str, int]]:
+    # 已入队的事件合并成一次写出
+    out = []
+    ev = first
+    while True:
+        if ev is not None and ev.row_id > seen[ev.kind]:  # 续传时已补发的跳过
+            frame, seen = _frame(ev, seen)
+            out.append(frame)
+        if sub.queue.empty():
+            return "".join(out), seen
+        ev = sub.queue.get_nowait()
+
+async def _stream(sub: Subscriber, seen: dict[str, int], resume: bool):
+    try:
+        yield f"retry: {int(settings.LIVE_RETRY_MS)}\n\n"
+        if resume:
+            chunk, seen = await _catch_up(sub, seen)
+            if chunk:
+                yield chunk
+        while True:
+            if sub.lagged:
+                # 队列满后丢弃了后续事件：先发完已入队的，再从缓冲区/DB 补齐
+                chunk, seen = _drain(sub, seen)
+                sub.lagged = False
+                more, seen = await _catch_up(sub, seen)
+                if chunk + more:
+                    yield chunk + more
+            try:
+                ev = await asyncio.wait_for(sub.queue.get(), settings.LIVE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            chunk, seen = _drain(sub, seen, ev)
+            if chunk:
+                yield chunk
+    finally:
+        broker.close(sub)
+
+@router.get("/stream")
+async def stream(
+    symbol: list[str] | None = Query(None),
+    last_event_id: str | None = Query(None),
+    last_event_id_header: str | None = Header(None, alias="Last-Event-ID"),
+):
+    """Server-Sent Events of new snapshots, alerts and daily reports as the agent commits them.
+
+    Event ids are resumable cursors: EventSource sends the last one back in Last-Event-ID on reconnect
+    (or pass ?last_event_id=) and the missed rows are replayed from the DB before live events continue.
+    The stream holds no DB connection while idle.
+    """
+    # 日报推送给第一个用户（与 /api/daily/reports 一致）
+    async with AsyncSessionLocal() as db:
+        user_id = (await db.execute(select(User.id).order_by(User.id).limit(1))).scalar()
+    symbols = frozenset(s.upper() for s in symbol) if symbol else None
+    sub, tail = await broker.open(symbols, user_id)
+    seen = decode_cursor(last_event_id_header or last_event_id)
+    return StreamingResponse(
+        _stream(sub, seen or tail, seen is not None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(broker.close, sub),  # 生成器未启动就断开时也要注销
+    )
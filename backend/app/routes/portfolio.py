@@ -1,71 +1,59 @@
-from fastapi import APIRouter, HTTPException
-from sqlalchemy.orm import Session
-from ..db import get_db, SessionLocal
-from ..models import Holding, User
-from ..schemas import HoldingCreate, HoldingOut
-from ..auth import hash_password
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..db import get_async_db
+from ..identity import default_user
+from ..models import Holding
+from ..schemas import HoldingCreate, HoldingOut, QuoteOut
+from ..market import fetch_quotes
 
 router = APIRouter(prefix="/api/portfolio", tags=["portfolio"])
 
-def get_or_create_default_user():
-    """获取或创建默认用户（无需登录）"""
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.email == "default@user.com").first()
-        if not user:
-            user = User(email="default@user.com", password_hash=hash_password("def"))
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-        return user
-    finally:
-        db.close()
-
 @router.get("/holdings", response_model=list[HoldingOut])
-def list_holdings():
-    db = SessionLocal()
-    try:
-        user = get_or_create_default_user()
-        return db.query(Holding).filter(Holding.user_id == user.id).order_by(Holding.created_at.desc()).all()
-    finally:
-        db.close()
+async def list_holdings(db: AsyncSession = Depends(get_async_db)):
+    user = await default_user(db)
+    rows = await db.execute(select(Holding).where(Holding.user_id == user.id).order_by(Holding.created_at.desc()))
+    return rows.scalars().all()
+
+@router.get("/quotes", response_model=list[QuoteOut])
+async def list_quotes(db: AsyncSession = Depends(get_async_db)):
+    user = await default_user(db)
+    symbols = list((await db.execute(select(Holding.symbol).where(Holding.user_id == user.id))).scalars())
+    # 与 agent 共用 TTL 缓存，缓存有效期内不会访问上游
+    quotes = await fetch_quotes(symbols)
+    return [quotes[s.upper()] for s in symbols if s.upper() in quotes]
 
 @router.post("/holdings", response_model=HoldingOut)
-def add_holding(payload: HoldingCreate):
-    db = SessionLocal()
-    try:
-        user = get_or_create_default_user()
-        symbol = payload.symbol.strip().upper()
-        if not symbol.isalnum():
-            raise HTTPException(status_code=400, detail="Invalid symbol")
-        existing = db.query(Holding).filter(Holding.user_id == user.id, Holding.symbol == symbol).first()
-        if existing:
-            raise HTTPException(status_code=400, detail="Already added")
-        h = Holding(
-            user_id=user.id,
-            symbol=symbol,
-            name=payload.name,
-            shares=payload.shares,
-            cost_basis=payload.cost_basis,
-            risk_pref=payload.risk_pref,
-        )
-        db.add(h)
-        db.commit()
-        db.refresh(h)
-        return h
-    finally:
-        db.close()
+async def add_holding(payload: HoldingCreate, db: AsyncSession = Depends(get_async_db)):
+    user = await default_user(db)
+    symbol = payload.symbol.strip().upper()
+    if not symbol.isalnum():
+        raise HTTPException(status_code=400, detail="Invalid symbol")
+    existing = (await db.execute(
+        select(Holding.id).where(Holding.user_id == user.id, Holding.symbol == symbol)
+    )).first()
+    if existing:
+        raise HTTPException(status_code=400, detail="Already added")
+    h = Holding(
+        user_id=user.id,
+        symbol=symbol,
+        name=payload.name,
+        shares=payload.shares,
+        cost_basis=payload.cost_basis,
+        risk_pref=payload.risk_pref,
+    )
+    db.add(h)
+    await db.commit()
+    await db.refresh(h)
+    return h
 
 @router.delete("/holdings/{holding_id}")
-def delete_holding(holding_id: int):
-    db = SessionLocal()
-    try:
-        user = get_or_create_default_user()
-        h = db.query(Holding).filter(Holding.id == holding_id, Holding.user_id == user.id).first()
-        if not h:
-            raise HTTPException(status_code=404, detail="Not found")
-        db.delete(h)
-        db.commit()
-        return {"ok": True}
-    finally:
-        db.close()
+async def delete_holding(holding_id: int, db: AsyncSession = Depends(get_async_db)):
+    user = await default_user(db)
+    h = (await db.execute(select(Holding).where(Holding.id == holding_id, Holding.user_id == user.id))).scalars().first()
+    if not h:
+        raise HTTPException(status_code=404, detail="Not found")
+    # 级联删除 snapshots / alerts 需要加载关系，放到同步上下文执行
+    await db.run_sync(lambda s: s.delete(h))
+    await db.commit()
+    return {"ok": True}
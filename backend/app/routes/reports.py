@@ -1,32 +1,139 @@
-from fastapi import APIRouter, HTTPException
-from sqlalchemy.orm import Session
-from ..db import get_db, SessionLocal
+import base64
+import hashlib
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..db import get_async_db
 from ..models import Holding, StockSnapshot, AlertEvent
-from ..schemas import SnapshotOut, AlertOut
+from ..rollups import rollup_series
+from ..schemas import SnapshotOut, AlertOut, RollupOut
 
 router = APIRouter(prefix="/api/reports", tags=["reports"])
 
-@router.get("/stock/{symbol}/snapshots", response_model=list[SnapshotOut])
-def snapshots(symbol: str):
-    db = SessionLocal()
+def _encode_cursor(ts: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{ts.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
     try:
-        sym = symbol.upper()
-        # 获取第一个用户的第一个持仓（简化版，无需登录）
-        h = db.query(Holding).filter(Holding.symbol == sym).first()
-        if not h:
-            return []
-        return db.query(StockSnapshot).filter(StockSnapshot.holding_id == h.id).order_by(StockSnapshot.ts.desc()).limit(200).all()
-    finally:
-        db.close()
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _naive_utc(ts: datetime | None) -> datetime | None:
+    if ts is None or ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        return etag in {t.strip() for t in inm.split(",")} or inm.strip() == "*"
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(ims).replace(tzinfo=None)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+async def _holding_id(db: AsyncSession, symbol: str) -> int | None:
+    # 获取第一个用户的第一个持仓（简化版，无需登录）
+    return (await db.execute(select(Holding.id).where(Holding.symbol == symbol.upper()).limit(1))).scalar()
+
+async def _series(
+    db: AsyncSession, request: Request, model, schema, symbol: str, since, until, cursor, limit: int, fields: str | None,
+):
+    """Newest-first page of `model` rows for a holding, keyset-paged on (ts, id), with ETag/Last-Modified.
+
+    The validators are taken from the holding's newest row, so polls with nothing new are answered
+    with 304 before any page is read. The next page's cursor is sent in the X-Next-Cursor header.
+    """
+    allowed = list(schema.model_fields)
+    wanted = allowed if not fields else [f for f in allowed if f in {x.strip() for x in fields.split(",")}]
+    if not wanted:
+        raise HTTPException(status_code=400, detail=f"fields must be a subset of: {', '.join(allowed)}")
+    hid = await _holding_id(db, symbol)
+    if hid is None:
+        return []
+    newest = (await db.execute(
+        select(model.id, model.ts).where(model.holding_id == hid).order_by(model.ts.desc(), model.id.desc()).limit(1)
+    )).first()
+    if newest is None:
+        return []
+    variant = hashlib.sha1(str(sorted(request.query_params.multi_items())).encode()).hexdigest()[:12]
+    etag = f'W/"{hid}-{newest.id}-{variant}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(newest.ts.replace(tzinfo=timezone.utc), usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if _not_modified(request, etag, newest.ts):
+        return Response(status_code=304, headers=headers)
+
+    since, until = _naive_utc(since), _naive_utc(until)
+    cols = [getattr(model, f) for f in wanted]
+    q = select(model.id, model.ts, *cols).where(model.holding_id == hid)
+    if since is not None:
+        q = q.where(model.ts >= since)
+    if until is not None:
+        q = q.where(model.ts < until)
+    if cursor:
+        c_ts, c_id = _decode_cursor(cursor)
+        q = q.where(or_(model.ts < c_ts, and_(model.ts == c_ts, model.id < c_id)))
+    rows = (await db.execute(q.order_by(model.ts.desc(), model.id.desc()).limit(limit + 1))).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = _encode_cursor(rows[-1][1], rows[-1][0])
+    body = [
+        {f: (v.isoformat() if isinstance(v, datetime) else v) for f, v in zip(wanted, row[2:])}
+        for row in rows
+    ]
+    return JSONResponse(body, headers=headers)
+
+@router.get("/stock/{symbol}/snapshots", response_model=list[SnapshotOut])
+async def snapshots(
+    symbol: str,
+    request: Request,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    cursor: str | None = None,
+    limit: int = Query(200, ge=1, le=1000),
+    fields: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await _series(db, request, StockSnapshot, SnapshotOut, symbol, since, until, cursor, limit, fields)
+
+@router.get("/stock/{symbol}/history", response_model=list[RollupOut])
+async def history(
+    symbol: str,
+    days: int = Query(30, ge=1, le=3650),
+    bucket: Literal["auto", "hour", "day"] = "auto",
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Long-range series served from the hourly/daily rollups instead of raw snapshots."""
+    hid = await _holding_id(db, symbol)
+    if hid is None:
+        return []
+    if bucket == "auto":
+        bucket = "hour" if days <= 7 else "day"
+    return await db.run_sync(rollup_series, hid, bucket, datetime.utcnow() - timedelta(days=days))
 
 @router.get("/stock/{symbol}/alerts", response_model=list[AlertOut])
-def alerts(symbol: str):
-    db = SessionLocal()
-    try:
-        sym = symbol.upper()
-        h = db.query(Holding).filter(Holding.symbol == sym).first()
-        if not h:
-            return []
-        return db.query(AlertEvent).filter(AlertEvent.holding_id == h.id).order_by(AlertEvent.ts.desc()).limit(200).all()
-    finally:
-        db.close()
+async def alerts(
+    symbol: str,
+    request: Request,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    cursor: str | None = None,
+    limit: int = Query(200, ge=1, le=1000),
+    fields: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await _series(db, request, AlertEvent, AlertOut, symbol, since, until, cursor, limit, fields)
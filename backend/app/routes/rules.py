@@ -1,38 +1,31 @@
-from fastapi import APIRouter, HTTPException
-from sqlalchemy.orm import Session
-from ..db import get_db, SessionLocal
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..db import get_async_db
 from ..models import Holding
 from ..schemas import TriggerRuleOut, TriggerRuleUpdate
-from ..rules import get_or_create_rule
+from ..rules import get_or_create_rule, rule_table
 
 router = APIRouter(prefix="/api/rules", tags=["rules"])
 
+async def _holding(db: AsyncSession, symbol: str) -> Holding:
+    h = (await db.execute(select(Holding).where(Holding.symbol == symbol.upper()).limit(1))).scalars().first()
+    if not h:
+        raise HTTPException(status_code=404, detail="Holding not found")
+    return h
+
 @router.get("/stock/{symbol}", response_model=TriggerRuleOut)
-def get_rule(symbol: str):
-    db = SessionLocal()
-    try:
-        sym = symbol.upper()
-        h = db.query(Holding).filter(Holding.symbol == sym).first()
-        if not h:
-            raise HTTPException(status_code=404, detail="Holding not found")
-        rule = get_or_create_rule(db, h)
-        return rule
-    finally:
-        db.close()
+async def get_rule(symbol: str, db: AsyncSession = Depends(get_async_db)):
+    h = await _holding(db, symbol)
+    return await db.run_sync(get_or_create_rule, h)
 
 @router.patch("/stock/{symbol}", response_model=TriggerRuleOut)
-def update_rule(symbol: str, payload: TriggerRuleUpdate):
-    db = SessionLocal()
-    try:
-        sym = symbol.upper()
-        h = db.query(Holding).filter(Holding.symbol == sym).first()
-        if not h:
-            raise HTTPException(status_code=404, detail="Holding not found")
-        rule = get_or_create_rule(db, h)
-        for k, v in payload.model_dump(exclude_unset=True).items():
-            setattr(rule, k, v)
-        db.commit()
-        db.refresh(rule)
-        return rule
-    finally:
-        db.close()
+async def update_rule(symbol: str, payload: TriggerRuleUpdate, db: AsyncSession = Depends(get_async_db)):
+    h = await _holding(db, symbol)
+    rule = await db.run_sync(get_or_create_rule, h)
+    for k, v in payload.model_dump(exclude_unset=True).items():
+        setattr(rule, k, v)
+    await db.commit()
+    await db.refresh(rule)
+    rule_table.invalidate(h.id)
+    return rule
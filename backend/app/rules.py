@@ -1,4 +1,11 @@
+import threading
+import time
+from dataclasses import dataclass
+import numpy as np
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from .config import settings
 from .models import Holding, TriggerRule
 
 def get_or_create_rule(db: Session, holding: Holding) -> TriggerRule:
@@ -23,3 +30,151 @@ def should_trigger(rule: TriggerRule, risk: float, sentiment: float, hot: float,
     if abs(change_pct_1d) >= rule.change_abs_ge:
         return True, f"|change|>= {rule.change_abs_ge}%"
     return False, ""
+
+# 与 TriggerRule 列默认值一致
+RULE_DEFAULTS = {"enabled": True, "risk_ge": 8.0, "sentiment_le": 25.0, "hot_ge": 70.0, "change_abs_ge": 6.0}
+
+class RuleTable:
+    """In-memory copy of every TriggerRule as NumPy columns, sorted by holding_id.
+
+    Rows are reloaded lazily: `invalidate(holding_id)` marks one rule stale (e.g. after a PATCH),
+    `invalidate()` or RULES_RELOAD_SECONDS forces a full reload (picks up edits made by other processes).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded_at: float | None = None
+        self._stale: set[int] = set()
+        self._set_columns([])
+
+    _COLUMNS = ("holding_ids", "enabled", "risk_ge", "sentiment_le", "hot_ge", "change_abs_ge")
+    _DTYPES = (np.int64, bool, np.float64, np.float64, np.float64, np.float64)
+
+    def _columns_from(self, rows: list[tuple]) -> list[np.ndarray]:
+        return [np.array([r[i] for r in rows], dtype=dt) for i, dt in enumerate(self._DTYPES)]
+
+    def _set_columns(self, rows: list[tuple]) -> None:
+        cols = self._columns_from(rows)
+        order = np.argsort(cols[0], kind="stable")
+        for name, col in zip(self._COLUMNS, cols):
+            setattr(self, name, col[order])
+
+    def _upsert_rows(self, rows: list[tuple]) -> None:
+        """Overwrite known holdings in place; append and re-sort only for new ones."""
+        if not rows:
+            return
+        cols = self._columns_from(rows)
+        pos = np.searchsorted(self.holding_ids, cols[0])
+        known = np.zeros(len(rows), dtype=bool)
+        in_range = pos < self.holding_ids.size
+        known[in_range] = self.holding_ids[pos[in_range]] == cols[0][in_range]
+        for name, col in zip(self._COLUMNS[1:], cols[1:]):
+            getattr(self, name)[pos[known]] = col[known]
+        if (~known).any():
+            merged = [np.concatenate([getattr(self, name), col[~known]]) for name, col in zip(self._COLUMNS, cols)]
+            order = np.argsort(merged[0], kind="stable")
+            for name, col in zip(self._COLUMNS, merged):
+                setattr(self, name, col[order])
+
+    @staticmethod
+    def _query(db: Session, holding_ids=None) -> list[tuple]:
+        q = select(
+            TriggerRule.holding_id, TriggerRule.enabled, TriggerRule.risk_ge,
+            TriggerRule.sentiment_le, TriggerRule.hot_ge, TriggerRule.change_abs_ge,
+        )
+        if holding_ids is not None:
+            q = q.where(TriggerRule.holding_id.in_(list(holding_ids)))
+        return [tuple(r) for r in db.execute(q)]
+
+    def invalidate(self, holding_id: int | None = None) -> None:
+        with self._lock:
+            if holding_id is None:
+                self._loaded_at = None
+            else:
+                self._stale.add(holding_id)
+
+    def _sync(self, db: Session, holding_ids: np.ndarray) -> None:
+        """Load/refresh as needed and create default rules for holdings that have none (one INSERT)."""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > settings.RULES_RELOAD_SECONDS:
+            self._set_columns(self._query(db))
+            self._loaded_at = time.monotonic()
+            self._stale.clear()
+        missing = set(np.setdiff1d(holding_ids, self.holding_ids).tolist())
+        if missing:
+            try:
+                db.execute(insert(TriggerRule), [{"holding_id": hid, **RULE_DEFAULTS} for hid in sorted(missing)])
+                db.commit()
+            except IntegrityError:
+                # 其他进程刚为其中部分持仓建了规则，只补剩下的
+                db.rollback()
+                have = set(db.execute(select(TriggerRule.holding_id).where(TriggerRule.holding_id.in_(missing))).scalars())
+                if missing - have:
+                    db.execute(insert(TriggerRule), [{"holding_id": hid, **RULE_DEFAULTS} for hid in sorted(missing - have)])
+                    db.commit()
+        refresh = missing | self._stale
+        if refresh:
+            self._upsert_rows(self._query(db, refresh))
+            self._stale.clear()
+
+    def conditions(
+        self, db: Session, holding_ids, risk, sentiment, hot, change_pct_1d, margins=(0.0, 0.0, 0.0, 0.0),
+    ) -> "RuleConditions":
+        """Every threshold of every holding in one vectorised pass.
+
+        `margins` widens each threshold into a hysteresis band for `RuleConditions.cleared`.
+        """
+        holding_ids = np.asarray(holding_ids, dtype=np.int64)
+        if holding_ids.size == 0:
+            empty = np.zeros((4, 0))
+            return RuleConditions(empty, empty.astype(bool), empty.astype(bool))
+        with self._lock:
+            self._sync(db, holding_ids)
+            idx = np.searchsorted(self.holding_ids, holding_ids)
+            thresholds = np.stack([self.risk_ge[idx], self.sentiment_le[idx], self.hot_ge[idx], self.change_abs_ge[idx]])
+            enabled = self.enabled[idx]
+        risk = np.asarray(risk, dtype=np.float64)
+        sentiment = np.asarray(sentiment, dtype=np.float64)
+        hot = np.asarray(hot, dtype=np.float64)
+        change = np.abs(np.asarray(change_pct_1d, dtype=np.float64))
+        active = np.stack([
+            risk >= thresholds[0],
+            sentiment <= thresholds[1],
+            hot >= thresholds[2],
+            change >= thresholds[3],
+        ]) & enabled
+        cleared = np.stack([
+            risk < thresholds[0] - margins[0],
+            sentiment > thresholds[1] + margins[1],
+            hot < thresholds[2] - margins[2],
+            change < thresholds[3] - margins[3],
+        ]) | ~enabled
+        return RuleConditions(thresholds, active, cleared)
+
+    def evaluate(
+        self, db: Session, holding_ids, risk, sentiment, hot, change_pct_1d,
+    ) -> list[str]:
+        """Vectorised `should_trigger` over all holdings; returns the trigger reason per holding ("" = none)."""
+        return self.conditions(db, holding_ids, risk, sentiment, hot, change_pct_1d).reasons()
+
+REASON_KINDS = ("risk", "sentiment", "hot", "change")
+_REASON_FORMATS = ("risk>= {}", "sentiment<= {}", "hot>= {}", "|change|>= {}%")
+
+@dataclass
+class RuleConditions:
+    thresholds: np.ndarray  # (4, n) in REASON_KINDS order
+    active: np.ndarray  # (4, n) condition holds and the rule is enabled
+    cleared: np.ndarray  # (4, n) condition is outside its hysteresis band, or the rule is disabled
+
+    def reason(self, kind: int, i: int) -> str:
+        return _REASON_FORMATS[kind].format(float(self.thresholds[kind][i]))
+
+    def reasons(self) -> list[str]:
+        """First active condition per holding, in should_trigger's precedence."""
+        fired = self.active.any(axis=0)
+        first = self.active.argmax(axis=0)
+        out = [""] * fired.size
+        for i in np.flatnonzero(fired).tolist():
+            out[i] = self.reason(int(first[i]), i)
+        return out
+
+rule_table = RuleTable()
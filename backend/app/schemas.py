@@ -34,6 +34,15 @@ class HoldingOut(BaseModel):
     class Config:
         from_attributes = True
 
+class QuoteOut(BaseModel):
+    symbol: str
+    price: float
+    change_pct_1d: float
+    volume: float | None
+    ts: datetime
+    class Config:
+        from_attributes = True
+
 class SnapshotOut(BaseModel):
     id: int
     ts: datetime
@@ -46,6 +55,24 @@ class SnapshotOut(BaseModel):
     class Config:
         from_attributes = True
 
+class RollupOut(BaseModel):
+    bucket: str
+    bucket_start: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    n: int
+    risk_min: float
+    risk_max: float
+    risk_avg: float
+    sentiment_min: float
+    sentiment_max: float
+    sentiment_avg: float
+    alerts: int
+    class Config:
+        from_attributes = True
+
 class AlertOut(BaseModel):
     id: int
     ts: datetime
@@ -11,13 +11,33 @@ def time_decay_hours(ts: datetime, now: datetime, half_life_hours: float = 24.0)
     return 0.5 ** (age_h / half_life_hours)
 
 def hot_score_news(publisher_weight: float, ts: datetime, now: datetime) -> float:
-    return 100.0 * publisher_weight * time_decay_hours(ts, now, half_life_hours=18.0)
+    return news_base(publisher_weight) * time_decay_hours(ts, now, half_life_hours=18.0)
 
 def hot_score_reddit(score: int, num_comments: int, ts: datetime, now: datetime) -> float:
-    base = math.log(1.0 + max(0, score) + 2.0 * max(0, num_comments))
-    return 25.0 * base * time_decay_hours(ts, now, half_life_hours=10.0)
+    return reddit_base(score, num_comments) * time_decay_hours(ts, now, half_life_hours=10.0)
 
 def ensure_utc(dt: datetime) -> datetime:
     if dt.tzinfo is None:
         return dt.replace(tzinfo=timezone.utc)
     return dt.astimezone(timezone.utc)
+
+# rank_key = ln(base) + t * ln2 / half_life（t 为距 RANK_EPOCH 的小时数）。
+# 任意时刻 now 的热度 base * 0.5 ** (age / half_life) 都等于 exp(rank_key - now 项)，
+# 两者单调对应，所以按 rank_key 排序在任何时刻都与“当前热度”排序一致，无需重算。
+RANK_EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+def _rank_hours(ts: datetime, half_life_hours: float) -> float:
+    return (ensure_utc(ts) - RANK_EPOCH).total_seconds() / 3600.0 * math.log(2.0) / half_life_hours
+
+def rank_key(base: float, ts: datetime, half_life_hours: float) -> float:
+    return math.log(max(base, 1e-6)) + _rank_hours(ts, half_life_hours)
+
+def hot_at(key: float, now: datetime, half_life_hours: float) -> float:
+    """Hot score at `now` of an item with ranking key `key`."""
+    return math.exp(min(key - _rank_hours(now, half_life_hours), 700.0))
+
+def news_base(publisher_weight: float) -> float:
+    return 100.0 * publisher_weight
+
+def reddit_base(score: int, num_comments: int) -> float:
+    return 25.0 * math.log(1.0 + max(0, score) + 2.0 * max(0, num_comments))
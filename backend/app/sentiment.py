@@ -1,9 +1,15 @@
+import json
+from collections import OrderedDict
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 from .config import settings
-import httpx
+from .metrics import CACHE_REQUESTS, span
+from .llm_scheduler import PRIORITY_ROUTINE, get_llm_scheduler
 
 analyzer = SentimentIntensityAnalyzer()
 
+# dedupe_key -> 0-100 score; re-ingesting the same title never re-runs VADER
+_title_memo: OrderedDict[str, float] = OrderedDict()
+
 def vader_score_0_100(texts: list[str]) -> float:
     if not texts:
         return 50.0
@@ -13,23 +19,51 @@ def vader_score_0_100(texts: list[str]) -> float:
     avg = s / len(texts)
     return float(max(0.0, min(100.0, (avg + 1) * 50)))
 
-async def llm_summarize(symbol: str, bullets: list[str]) -> str | None:
-    if not (settings.LLM_BASE_URL and settings.LLM_API_KEY):
-        return None
-    prompt = (
+def title_sentiment(dedupe_key: str, title: str) -> float:
+    score = _title_memo.get(dedupe_key)
+    if score is not None:
+        _title_memo.move_to_end(dedupe_key)
+        CACHE_REQUESTS.inc(cache="sentiment_memo", result="hit")
+        return score
+    CACHE_REQUESTS.inc(cache="sentiment_memo", result="miss")
+    with span("vader"):
+        score = vader_score_0_100([title])
+    _title_memo[dedupe_key] = score
+    if len(_title_memo) > settings.SENTIMENT_MEMO_SIZE:
+        _title_memo.popitem(last=False)
+    return score
+
+def llm_enabled() -> bool:
+    return bool(settings.LLM_BASE_URL and settings.LLM_API_KEY)
+
+def build_summary_prompt(symbol: str, bullets: list[str]) -> str:
+    return (
         f"用中文总结 {symbol} 的最新情况，面向散户投资者。"
         "输入要点: " + " ".join([f"- {b}" for b in bullets[:30]]) +
         " 输出格式: - 3个核心要点 - 1个风险提示 - 1个关注重点 保持简洁。"
     )
-    url = settings.LLM_BASE_URL.rstrip("/") + "/chat/completions"
-    headers = {"Authorization": f"Bearer {settings.LLM_API_KEY}"}
-    payload = {
-        "model": settings.LLM_MODEL,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.2,
-    }
-    async with httpx.AsyncClient(timeout=25) as client:
-        r = await client.post(url, headers=headers, json=payload)
-        r.raise_for_status()
-        data = r.json()
-        return data["choices"][0]["message"]["content"]
+
+def build_batch_prompt(items: list[tuple[str, list[str]]]) -> str:
+    parts = [f"[{sym.upper()}] " + " ".join([f"- {b}" for b in bullets[:30]]) for sym, bullets in items]
+    return (
+        "用中文分别总结以下每只股票的最新情况，面向散户投资者。"
+        "每只股票输出格式: - 3个核心要点 - 1个风险提示 - 1个关注重点 保持简洁。"
+        "只返回一个 JSON 对象，键为股票代码，值为该股票的总结文本。输入: " + " ".join(parts)
+    )
+
+def parse_batch_summaries(text: str) -> dict[str, str]:
+    body = text.strip()
+    if body.startswith("```"):
+        body = body.strip("`").removeprefix("json").strip()
+    try:
+        data = json.loads(body[body.index("{"):body.rindex("}") + 1])
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {str(k).upper(): str(v) for k, v in data.items() if v}
+
+async def llm_summarize(symbol: str, bullets: list[str], priority: int = PRIORITY_ROUTINE) -> str | None:
+    if not llm_enabled():
+        return None
+    return await get_llm_scheduler().summarize(symbol, bullets, priority)
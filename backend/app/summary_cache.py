@@ -0,0 +1,72 @@
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+from .config import settings
+from .metrics import CACHE_REQUESTS
+from .models import SummaryCache
+from .scoring import sha256_key
+
+_HOT_SUFFIX = re.compile(r" \(hot:\d+\)$")
+
+# 进程内命中率统计
+stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+def hit_rate() -> float:
+    total = stats["hits"] + stats["misses"]
+    return stats["hits"] / total if total else 0.0
+
+def summary_key(symbol: str, bullets: list[str], model: str | None = None) -> str:
+    """Content address of a summary: symbol + model + the bullet set (hot scores drift every cycle, so they are ignored)."""
+    titles = sorted(_HOT_SUFFIX.sub("", b) for b in bullets)
+    return sha256_key(symbol.upper(), model or settings.LLM_MODEL, sha256_key(*titles))
+
+def get_cached_summaries(db: Session, keys: list[str]) -> dict[str, str]:
+    if not keys:
+        return {}
+    min_created = datetime.utcnow() - timedelta(hours=settings.SUMMARY_CACHE_MAX_AGE_HOURS)
+    rows = db.execute(
+        select(SummaryCache.key, SummaryCache.summary)
+        .where(SummaryCache.key.in_(keys), SummaryCache.created_at >= min_created)
+    ).all()
+    found = {k: v for k, v in rows}
+    if found:
+        db.execute(
+            update(SummaryCache)
+            .where(SummaryCache.key.in_(list(found)))
+            .values(last_used_at=datetime.utcnow(), hits=SummaryCache.hits + 1)
+        )
+        db.commit()
+    stats["hits"] += len(found)
+    stats["misses"] += len(keys) - len(found)
+    CACHE_REQUESTS.inc(len(found), cache="summaries", result="hit")
+    CACHE_REQUESTS.inc(len(keys) - len(found), cache="summaries", result="miss")
+    return found
+
+def store_summaries(db: Session, entries: dict[str, tuple[str, str]]) -> None:
+    """Persist {key: (symbol, summary)} for the current LLM model."""
+    if not entries:
+        return
+    now = datetime.utcnow()
+    db.execute(delete(SummaryCache).where(SummaryCache.key.in_(list(entries))))
+    db.add_all([
+        SummaryCache(key=k, symbol=sym.upper(), model=settings.LLM_MODEL, summary=text, created_at=now, last_used_at=now)
+        for k, (sym, text) in entries.items()
+    ])
+    db.commit()
+    stats["stores"] += len(entries)
+
+def evict_summaries(db: Session) -> int:
+    """Drop entries past SUMMARY_CACHE_MAX_AGE_HOURS, then the least recently used beyond SUMMARY_CACHE_MAX_ENTRIES."""
+    min_created = datetime.utcnow() - timedelta(hours=settings.SUMMARY_CACHE_MAX_AGE_HOURS)
+    n = db.execute(delete(SummaryCache).where(SummaryCache.created_at < min_created)).rowcount or 0
+    keep = (
+        select(SummaryCache.key)
+        .order_by(SummaryCache.last_used_at.desc())
+        .limit(settings.SUMMARY_CACHE_MAX_ENTRIES)
+        .scalar_subquery()
+    )
+    n += db.execute(delete(SummaryCache).where(SummaryCache.key.not_in(keep))).rowcount or 0
+    db.commit()
+    stats["evictions"] += n
+    return n
@@ -0,0 +1,98 @@
+"""Agent cycle wall time: sequential vs concurrent, mock market provider.
+
+Quotes arrive in one batched call per cycle, so the per-symbol latency that AGENT_CONCURRENCY overlaps
+is the news fetch: it goes to the local Polygon stand-in (bench.standins) with `--latency-ms` per request.
+
+    cd backend && python -m bench.agent_cycle --sizes 10 100 1000 --latency-ms 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+def _setup_env(latency_ms: int) -> str:
+    from bench.standins import StandIns, parse_upstreams
+    db_path = os.path.join(tempfile.mkdtemp(prefix="guardian-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["PRICE_HISTORY_DIR"] = os.path.join(os.path.dirname(db_path), "prices")
+    os.environ["MARKET_DATA_PROVIDER"] = "mock"
+    os.environ["MARKET_MOCK_LATENCY_MS"] = str(latency_ms)
+    for k in ("LLM_BASE_URL", "LLM_API_KEY", "POLYGON_API_KEY", "REDDIT_CLIENT_ID", "TELEGRAM_BOT_TOKEN"):
+        os.environ.pop(k, None)
+    # 只接 Polygon 新闻：行情仍走 mock，其余上游保持关闭
+    standins = StandIns([], parse_upstreams([f"polygon={latency_ms}"]))
+    standins.start()
+    env = standins.env()
+    os.environ.update(POLYGON_BASE_URL=env["POLYGON_BASE_URL"], POLYGON_API_KEY=env["POLYGON_API_KEY"])
+    return db_path
+
+def _seed(n_holdings: int) -> None:
+    from app.db import Base, engine, SessionLocal, init_db
+    from app.models import User, Holding
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+    db = SessionLocal()
+    try:
+        # 每个用户最多 10 个持仓，symbol 在用户内唯一
+        rnd = random.Random(42)
+        universe = [f"S{i:04d}" for i in range(max(50, n_holdings))]
+        made = 0
+        u = 0
+        while made < n_holdings:
+            user = User(email=f"bench{u}@example.com", password_hash="x")
+            db.add(user)
+            db.flush()
+            for sym in rnd.sample(universe, min(10, n_holdings - made)):
+                db.add(Holding(user_id=user.id, symbol=sym, risk_pref="neutral"))
+                made += 1
+            u += 1
+        db.commit()
+    finally:
+        db.close()
+
+def _run_cycle() -> float:
+    from app.db import AsyncSessionLocal, async_engine
+    from app.agent import run_agent_once
+    from app import market
+    market._quote_cache.clear()
+
+    async def run() -> float:
+        try:
+            async with AsyncSessionLocal() as db:
+                t0 = time.perf_counter()
+                await run_agent_once(db)
+                return time.perf_counter() - t0
+        finally:
+            await async_engine.dispose()  # pooled connections are bound to this loop
+
+    return asyncio.run(run())
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    ap.add_argument("--latency-ms", type=int, default=20)
+    ap.add_argument("--concurrency", type=int, default=None)
+    ap.add_argument("--news-concurrency", type=int, default=None, help="concurrent run's news cap (default: --concurrency)")
+    args = ap.parse_args()
+
+    _setup_env(args.latency_ms)
+    from app.config import settings
+    concurrent = args.concurrency or settings.AGENT_CONCURRENCY
+    news = args.news_concurrency or concurrent
+
+    print(f"mock quote + news latency={args.latency_ms}ms, concurrent AGENT_CONCURRENCY={concurrent} NEWS_CONCURRENCY={news}")
+    print(f"{'holdings':>9} {'sequential s':>13} {'concurrent s':>13} {'speedup':>8}")
+    for n in args.sizes:
+        _seed(n)
+        settings.AGENT_CONCURRENCY, settings.NEWS_CONCURRENCY = concurrent, news
+        _run_cycle()  # 预热：首轮入库全部新闻，之后两轮各自只多出几条新内容
+        settings.AGENT_CONCURRENCY = settings.NEWS_CONCURRENCY = 1
+        seq = _run_cycle()
+        settings.AGENT_CONCURRENCY, settings.NEWS_CONCURRENCY = concurrent, news
+        con = _run_cycle()
+        print(f"{n:>9} {seq:>13.2f} {con:>13.2f} {seq / con:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
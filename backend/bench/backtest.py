@@ -0,0 +1,150 @@
+"""Backtest sweep speed, and the vectorised replay checked against a scalar one.
+
+The scalar replay walks every snapshot in order with agent.compute_risk and the alerts_to_fire state
+machine, i.e. what replaying history through the live code path would cost per parameter set. Both
+see the same hot, sentiment and price-history series, so their alert counts must match exactly. The
+recomputed sentiment itself is checked against a direct weighted average over each sampled window.
+
+    cd backend && python -m bench.backtest --holdings 40 --days 30 --sets 500
+    cd backend && python -m bench.backtest --database-url sqlite:////tmp/bench.db --days 30
+"""
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def scalar_replay(h, p) -> tuple[int, list[int]]:
+    from app.agent import compute_risk
+    from app.backtest import THRESHOLDS
+    from app.price_history import PriceFeatures
+
+    sentiment = h.sentiment_for(p.sentiment_hours, p.hot_weighted).tolist()
+    hot = h.hot().tolist()
+    rvol, gap = h.realized_vol.tolist(), h.max_gap.tolist()
+    cooldown = int(p.cooldown_minutes * 60)
+    states: dict[tuple[int, int], list] = {}  # (holding, kind) -> [active, last_fired]
+    alerts, by_kind = 0, [0, 0, 0, 0]
+    for i, (s, t, chg) in enumerate(zip(h.seg.tolist(), h.ts.tolist(), h.change.tolist())):
+        features = PriceFeatures(n=0, return_pct=0.0, realized_vol_pct=rvol[i], max_gap_pct=gap[i], last_gap_pct=0.0, gaps=0)
+        values = (compute_risk(chg, sentiment[i], h.risk_pref[s], p.risk, features), sentiment[i], hot[i], abs(chg))
+        enabled = bool(h.enabled[s])
+        fired = False
+        for k in range(4):
+            th = getattr(p, THRESHOLDS[k])
+            th = float(h.thresholds[k][s]) if th is None else th
+            m = p.hysteresis[k]
+            if k == 1:
+                active, cleared = values[k] <= th, values[k] > th + m
+            else:
+                active, cleared = values[k] >= th, values[k] < th - m
+            active, cleared = active and enabled, cleared or not enabled
+            st = states.get((s, k))
+            if st and st[0] and cleared:
+                st[0] = False
+            if not active:
+                continue
+            if st is None:
+                states[s, k] = [True, t]
+            elif st[0]:
+                continue
+            else:
+                st[0] = True
+                if t - st[1] < cooldown:
+                    continue
+                st[1] = t
+            by_kind[k] += 1
+            fired = True
+        alerts += fired
+    return alerts, by_kind
+
+def check_sentiment(h, hours: float, hot_weighted: bool, samples: int, rnd: random.Random) -> int:
+    """Snapshots whose replayed sentiment differs from the direct average over their window."""
+    import numpy as np
+
+    got = h.sentiment_for(hours, hot_weighted)
+    head = h.c_head
+    seg, ts, rank, sent = h.c_seg[head], h.c_ts[head], h.c_rank[head], h.c_sentiment[head]
+    bad = 0
+    for i in rnd.sample(range(h.seg.size), min(samples, h.seg.size)):
+        m = (seg == h.seg[i]) & (ts >= h.ts[i] - max(int(hours * 3600), 1)) & (ts <= h.ts[i])
+        if not m.any():
+            want = 50.0
+        else:
+            w = np.exp(rank[m] - rank[m].max()) if hot_weighted else np.ones(int(m.sum()))
+            want = min(max(float((w * sent[m]).sum() / w.sum()), 0.0), 100.0)
+        bad += abs(got[i] - want) > 1e-6
+    return bad
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--database-url", help="replay an existing database instead of generating one")
+    ap.add_argument("--holdings", type=int, default=40)
+    ap.add_argument("--days", type=float, default=30.0)
+    ap.add_argument("--sets", type=int, default=500, help="random parameter sets in the sweep")
+    ap.add_argument("--check", type=int, default=3, help="parameter sets also replayed by the scalar loop")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    if not args.database_url:
+        tmp = tempfile.mkdtemp(prefix="guardian-bench-")
+        os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}", PRICE_HISTORY_DIR=os.path.join(tmp, "prices"))
+    else:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    from app import backtest as bt
+    from app.db import SessionLocal, init_db
+    if not args.database_url:
+        from bench.datagen import SNAPSHOT_EVERY, Shape, generate
+        init_db()
+        t0 = time.perf_counter()
+        generate(Shape(
+            users=max(1, args.holdings // 10), holdings_per_user=10, symbols=max(10, args.holdings),
+            snapshots_per_holding=int(timedelta(days=args.days) / SNAPSHOT_EVERY), content_per_holding=200,
+        ), args.seed)
+        from app.price_history import price_store
+        with SessionLocal() as db:
+            price_store.seed(db)  # 价格历史特征参与 risk
+        print(f"generated in {time.perf_counter() - t0:.1f}s")
+
+    t0 = time.perf_counter()
+    db = SessionLocal()
+    try:
+        h = bt.load_history(db, datetime.utcnow() - timedelta(days=args.days + 1))
+    finally:
+        db.close()
+    print(f"{h.holding_ids.size} holdings, {h.seg.size} snapshots, {h.c_seg.size} content items; load {time.perf_counter() - t0:.2f}s")
+
+    rnd = random.Random(args.seed)
+    params = [bt.Params()] + [
+        bt.grid(
+            risk_ge=[rnd.choice([5.0, 6.0, 7.0, 8.0])], sentiment_le=[rnd.choice([20.0, 25.0, 30.0, 35.0])],
+            hot_ge=[rnd.choice([50.0, 70.0, 90.0])], change_abs_ge=[rnd.choice([1.0, 1.5, 2.0, 3.0])],
+            cooldown_minutes=[rnd.choice([0.0, 60.0, 240.0])], vol_div=[rnd.choice([1.0, 1.5, 2.0])],
+            sentiment_hours=[rnd.choice([None, 24.0, 48.0])],
+        )[0]
+        for _ in range(args.sets - 1)
+    ]
+    t0 = time.perf_counter()
+    results = bt.sweep(h, params)
+    dt = time.perf_counter() - t0
+    print(f"vectorised: {len(params)} sets in {dt:.2f}s ({dt / len(params) * 1000:.1f} ms/set, shared series cached)")
+
+    for hours, hw in itertools.product([24.0, 48.0, args.days * 24], [False, True]):
+        bad = check_sentiment(h, hours, hw, 500, rnd)
+        print(f"{'ok' if not bad else 'MISMATCH'}: sentiment over {hours:g}h{' hot-weighted' if hw else ''}, {bad} of 500 sampled snapshots differ")
+
+    scalar = 0.0
+    for p, r in zip(params[:args.check], results):
+        t0 = time.perf_counter()
+        alerts, by_kind = scalar_replay(h, p)
+        scalar += time.perf_counter() - t0
+        ok = alerts == r.alerts and by_kind == list(r.by_kind.values())
+        print(f"{'ok' if ok else 'MISMATCH'}: scalar {alerts} {by_kind} vectorised {r.alerts} {list(r.by_kind.values())}  [{p.label()}]")
+    if args.check:
+        per = scalar / min(args.check, len(params))
+        print(f"scalar: {per:.2f}s/set, ~{per * len(params):.0f}s for the sweep")
+
+if __name__ == "__main__":
+    main()
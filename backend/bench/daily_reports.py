@@ -0,0 +1,145 @@
+"""Daily report pass: legacy per-user N+1 loop vs set-based run_daily_reports.
+
+    cd backend && python -m bench.daily_reports --users 5000 --holdings-per-user 3 --snapshots-per-holding 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def _setup_env(llm_url: str | None) -> None:
+    db_path = os.path.join(tempfile.mkdtemp(prefix="guardian-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    for k in ("LLM_BASE_URL", "LLM_API_KEY", "TELEGRAM_BOT_TOKEN"):
+        os.environ.pop(k, None)
+    if llm_url:
+        os.environ.update(LLM_BASE_URL=llm_url, LLM_API_KEY="fake", LLM_RPM="0", LLM_TPM="0")
+
+def _seed(users: int, holdings_per_user: int, snaps_per_holding: int) -> None:
+    from sqlalchemy import insert
+    from app.db import SessionLocal, init_db
+    from app.models import User, Holding, StockSnapshot
+    init_db()
+    rnd = random.Random(3)
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        db.execute(insert(User), [{"id": u + 1, "email": f"u{u}@example.com", "password_hash": "x"} for u in range(users)])
+        holdings = []
+        for u in range(users):
+            for j in range(holdings_per_user):
+                holdings.append({"id": len(holdings) + 1, "user_id": u + 1, "symbol": f"S{(u * 7 + j) % 500:03d}", "risk_pref": "neutral"})
+        db.execute(insert(Holding), holdings)
+        snaps = []
+        for h in holdings:
+            for k in range(snaps_per_holding):
+                snaps.append({
+                    "holding_id": h["id"], "ts": now - timedelta(minutes=15 * k + rnd.random() * 5),
+                    "price": 50 + rnd.random() * 200, "change_pct_1d": 0.0,
+                    "sentiment_score": rnd.random() * 100, "risk_score": rnd.random() * 10,
+                })
+        db.execute(insert(StockSnapshot), snaps)
+        db.commit()
+    finally:
+        db.close()
+
+async def _legacy_run_daily_reports(db) -> int:
+    """Baseline implementation: existence, holdings and latest-snapshot queries per user/holding, serial awaits."""
+    from app.models import User, Holding, StockSnapshot, DailyReport
+    from app.daily_agent import _today_yyyymmdd
+    from app.sentiment import llm_summarize
+    from app.notify import notify_telegram
+    users = db.query(User).all()
+    day = _today_yyyymmdd()
+    created = 0
+    for u in users:
+        if db.query(DailyReport).filter(DailyReport.user_id == u.id, DailyReport.date_yyyymmdd == day).first():
+            continue
+        blocks = []
+        for h in db.query(Holding).filter(Holding.user_id == u.id).all():
+            since = datetime.utcnow() - timedelta(hours=24)
+            snap = (
+                db.query(StockSnapshot)
+                .filter(StockSnapshot.holding_id == h.id, StockSnapshot.ts >= since)
+                .order_by(StockSnapshot.ts.desc())
+                .first()
+            )
+            if snap:
+                blocks.append(f"{h.symbol}: price ${snap.price:.2f}, risk {snap.risk_score:.1f}/10, sentiment {snap.sentiment_score:.0f}/100")
+        if not blocks:
+            content = "No snapshots today. Agent may not have run yet."
+        else:
+            summary = await llm_summarize("PORTFOLIO", blocks)
+            content = summary or ("Daily Brief: " + " ".join(["- " + b for b in blocks]))
+        db.add(DailyReport(user_id=u.id, date_yyyymmdd=day, content=content))
+        db.commit()
+        created += 1
+        await notify_telegram(f"[Daily Report {day}] {u.email} {content[:3500]}")
+    return created
+
+def _timed(fn) -> tuple[int, float, int]:
+    from sqlalchemy import delete, event
+    from app.db import SessionLocal, async_engine, engine
+    from app.models import DailyReport
+    from app.http_clients import close_clients
+    queries = [0]
+
+    def count(*_):
+        queries[0] += 1
+
+    db = SessionLocal()
+    try:
+        db.execute(delete(DailyReport))
+        db.commit()
+        event.listen(engine, "before_cursor_execute", count)
+        event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+
+        async def run():
+            try:
+                return await fn(db)
+            finally:
+                await close_clients()
+                await async_engine.dispose()
+
+        t0 = time.perf_counter()
+        n = asyncio.run(run())
+        elapsed = time.perf_counter() - t0
+        event.remove(engine, "before_cursor_execute", count)
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count)
+        return n, elapsed, queries[0]
+    finally:
+        db.close()
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=5000)
+    ap.add_argument("--holdings-per-user", type=int, default=3)
+    ap.add_argument("--snapshots-per-holding", type=int, default=8)
+    ap.add_argument("--llm-latency-ms", type=float, default=None, help="use the fake LLM server with this latency")
+    args = ap.parse_args()
+
+    fake = None
+    if args.llm_latency_ms is not None:
+        from bench.fake_llm import FakeLLM
+        fake = FakeLLM(args.llm_latency_ms)
+    _setup_env(fake.start() if fake else None)
+    _seed(args.users, args.holdings_per_user, args.snapshots_per_holding)
+    from app.daily_agent import run_daily_reports
+    from app.db import AsyncSessionLocal
+
+    async def set_based(_db) -> int:
+        async with AsyncSessionLocal() as db:
+            return await run_daily_reports(db)
+
+    print(f"{'mode':>10} {'reports':>8} {'queries':>8} {'seconds':>8}")
+    for name, fn in (("legacy", _legacy_run_daily_reports), ("set-based", set_based)):
+        n, elapsed, q = _timed(fn)
+        print(f"{name:>10} {n:>8} {q:>8} {elapsed:>8.2f}")
+    if fake:
+        fake.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Deterministic synthetic data: users, holdings, snapshot history, alerts and content items.
+
+User 1 is the shared default user, so the no-login endpoints (/api/portfolio, /api/reports) see its
+holdings. Holdings are drawn from a common ticker universe, so several users hold the same symbols as
+in production and the agent fetches each symbol once per cycle.
+
+    cd backend && python -m bench.datagen --database-url sqlite:////tmp/bench.db --users 100 --symbols 200
+"""
+import argparse
+import itertools
+import os
+import random
+import string
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from bench.standins import headline
+
+@dataclass
+class Shape:
+    users: int = 10
+    holdings_per_user: int = 5
+    symbols: int = 30  # ticker universe the holdings are drawn from
+    snapshots_per_holding: int = 96  # one every SNAPSHOT_EVERY, newest now
+    content_per_holding: int = 50
+    alert_rate: float = 0.02  # fraction of snapshots that also raised an alert
+
+SNAPSHOT_EVERY = timedelta(minutes=15)
+CHUNK = 5000
+
+def tickers(n: int, seed: int = 1) -> list[str]:
+    """`n` distinct letter-only tickers (reddit mentions only match letters)."""
+    pool = ["".join(p) for k in (3, 4) for p in itertools.product(string.ascii_uppercase, repeat=k)]
+    return random.Random(seed).sample(pool, n)
+
+def _insert(db, model, rows: list[dict]) -> None:
+    from sqlalchemy import insert
+    for i in range(0, len(rows), CHUNK):
+        db.execute(insert(model), rows[i:i + CHUNK])
+
+def generate(shape: Shape, seed: int = 1) -> dict:
+    """Fill an empty database (init_db must have run). Returns row counts and the ticker universe."""
+    from app.db import SessionLocal, _backfill_clusters, engine
+    from app.identity import DEFAULT_EMAIL
+    from app.models import AlertEvent, ContentItem, Holding, StockSnapshot, User
+    from app.rollups import backfill_rollups
+    from app.scoring import hot_score_news, news_base, rank_key, sha256_key
+    from app.config import settings
+
+    rnd = random.Random(seed)
+    universe = tickers(shape.symbols, seed)
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    db = SessionLocal()
+    try:
+        _insert(db, User, [
+            {"id": u + 1, "email": DEFAULT_EMAIL if u == 0 else f"bench{u}@example.com", "password_hash": "x"}
+            for u in range(shape.users)
+        ])
+        holdings = []
+        for u in range(shape.users):
+            for sym in rnd.sample(universe, min(shape.holdings_per_user, len(universe))):
+                holdings.append({
+                    "id": len(holdings) + 1, "user_id": u + 1, "symbol": sym,
+                    "risk_pref": rnd.choice(["conservative", "neutral", "neutral", "aggressive"]),
+                })
+        _insert(db, Holding, holdings)
+
+        # 1) 快照：每个持仓一条随机游走，部分附带告警
+        snaps, alerts = [], []
+        for h in holdings:
+            price = rnd.uniform(20, 400)
+            for k in range(shape.snapshots_per_holding, 0, -1):
+                ts = now - SNAPSHOT_EVERY * (k - 1)
+                step = rnd.gauss(0, 0.01)
+                price *= 1 + step
+                risk = round(min(10.0, abs(rnd.gauss(3, 2))), 2)
+                snaps.append({
+                    "holding_id": h["id"], "ts": ts, "price": round(price, 2), "change_pct_1d": round(step * 100, 3),
+                    "volume": float(rnd.randint(100_000, 5_000_000)), "sentiment_score": round(rnd.uniform(20, 80), 1),
+                    "risk_score": risk, "summary": None,
+                })
+                if rnd.random() < shape.alert_rate:
+                    alerts.append({
+                        "holding_id": h["id"], "ts": ts, "level": "warn", "title": f"{h['symbol']} risk alert",
+                        "detail": f"risk {risk:.1f}/10",
+                    })
+            if len(snaps) >= CHUNK:
+                _insert(db, StockSnapshot, snaps)
+                snaps = []
+        _insert(db, StockSnapshot, snaps)
+        _insert(db, AlertEvent, alerts)
+
+        # 2) 内容：与 stand-in 新闻同一标题分布（负编号，不与之后抓到的重复）
+        items = []
+        n_content = 0
+        for h in holdings:
+            for i in range(-shape.content_per_holding, 0):
+                title = headline(seed, h["symbol"], i)
+                ts = (now - timedelta(minutes=7 * -i)).replace(tzinfo=timezone.utc)
+                w = rnd.choice([0.75, 0.8, 1.0])
+                url = f"https://news.example.com/{h['symbol'].lower()}/{i}"
+                items.append({
+                    "holding_id": h["id"], "ts": ts, "source": "polygon_news", "title": title, "url": url,
+                    "dedupe_key": sha256_key("polygon_news", title[:220], url),
+                    "sentiment_score": round(rnd.uniform(20, 80), 1),
+                    "hot_score": hot_score_news(w, ts, ts), "rank_key": rank_key(news_base(w), ts, settings.RANK_HALF_LIFE_HOURS),
+                })
+            if len(items) >= CHUNK:
+                _insert(db, ContentItem, items)
+                n_content += len(items)
+                items = []
+        _insert(db, ContentItem, items)
+        n_content += len(items)
+        db.commit()
+        backfill_rollups(db)
+        db.commit()
+    finally:
+        db.close()
+    # 各条目自成一簇并写入 LSH band（与旧库升级同一路径）
+    with engine.begin() as conn:
+        _backfill_clusters(conn)
+    return {
+        "users": shape.users, "holdings": len(holdings), "symbols": sorted({h["symbol"] for h in holdings}),
+        "snapshots": len(holdings) * shape.snapshots_per_holding, "alerts": len(alerts), "content": n_content,
+    }
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    for f, v in asdict(Shape()).items():
+        ap.add_argument("--" + f.replace("_", "-"), type=type(v), default=v)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--database-url", required=True, help="an empty database; tables are created")
+    args = ap.parse_args()
+    os.environ["DATABASE_URL"] = args.database_url
+    from app.db import init_db
+    init_db()
+    t0 = time.perf_counter()
+    out = generate(Shape(**{f: getattr(args, f) for f in asdict(Shape())}), args.seed)
+    out.pop("symbols")
+    print(f"{out} in {time.perf_counter() - t0:.1f}s")
+
+if __name__ == "__main__":
+    main()
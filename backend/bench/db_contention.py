@@ -0,0 +1,172 @@
+"""Dashboard read latency while an agent cycle is writing, per SQLite journal setting.
+
+Each mode gets a fresh database, a uvicorn server and a separate writer process that runs
+agent cycles (mock market data) back to back. Readers poll the snapshot and holdings APIs.
+
+    cd backend && python -m bench.db_contention --holdings 2000 --readers 16 --seconds 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = {
+    # 旧配置：rollback journal、FULL 同步（sqlite3 默认 5s 忙等待）
+    "legacy": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_BUSY_TIMEOUT_MS": "5000"},
+    "tuned": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL", "SQLITE_BUSY_TIMEOUT_MS": "5000"},
+}
+
+def _env(db_path: str, mode: str) -> dict:
+    env = dict(os.environ)
+    for k in ("LLM_BASE_URL", "LLM_API_KEY", "POLYGON_API_KEY", "REDDIT_CLIENT_ID", "TELEGRAM_BOT_TOKEN"):
+        env.pop(k, None)
+    env.update(MODES[mode])
+    env.update(
+        DATABASE_URL=f"sqlite:///{db_path}",
+        PRICE_HISTORY_DIR=os.path.join(os.path.dirname(db_path), "prices"),
+        MARKET_DATA_PROVIDER="mock",
+        MARKET_MOCK_LATENCY_MS="0",
+        QUOTE_CACHE_TTL_SECONDS="0",
+        AGENT_CRON_MINUTES="100000",  # the server must not run its own cycles
+    )
+    return env
+
+def _seed(holdings: int, snaps_per_holding: int) -> None:
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert
+    from app.db import SessionLocal, init_db
+    from app.models import User, Holding, StockSnapshot
+    init_db()
+    rnd = random.Random(7)
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        users = (holdings + 9) // 10
+        db.execute(insert(User), [{"id": u + 1, "email": f"u{u}@example.com", "password_hash": "x"} for u in range(users)])
+        db.execute(insert(Holding), [
+            {"id": i + 1, "user_id": i // 10 + 1, "symbol": f"S{i:04d}", "risk_pref": "neutral"} for i in range(holdings)
+        ])
+        db.execute(insert(StockSnapshot), [
+            {
+                "holding_id": i + 1, "ts": now - timedelta(minutes=15 * k), "price": 50 + rnd.random() * 200,
+                "change_pct_1d": 0.0, "sentiment_score": rnd.random() * 100, "risk_score": rnd.random() * 10,
+            }
+            for i in range(holdings) for k in range(snaps_per_holding)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+def _write(seconds: float) -> None:
+    from app.agent import run_agent_once
+    from app.db import AsyncSessionLocal, async_engine
+
+    async def run() -> None:
+        cycles = 0
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            async with AsyncSessionLocal() as db:
+                await run_agent_once(db)
+            cycles += 1
+        await async_engine.dispose()
+        print(cycles, flush=True)
+
+    asyncio.run(run())
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _pct(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(len(s) * q))]
+
+async def _read(base: str, holdings: int, readers: int, seconds: float) -> tuple[list[float], int]:
+    import httpx
+    lat: list[float] = []
+    errors = 0
+    end = time.monotonic() + seconds
+
+    async def reader(client: httpx.AsyncClient) -> None:
+        nonlocal errors
+        rnd = random.Random()
+        while time.monotonic() < end:
+            path = (
+                f"/api/reports/stock/S{rnd.randrange(holdings):04d}/snapshots"
+                if rnd.random() < 0.8 else "/api/portfolio/holdings"
+            )
+            t0 = time.perf_counter()
+            try:
+                r = await client.get(base + path)
+                if r.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            lat.append((time.perf_counter() - t0) * 1000)
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        await asyncio.gather(*[reader(client) for _ in range(readers)])
+    return lat, errors
+
+def _run_mode(mode: str, args) -> None:
+    import httpx
+    db_path = os.path.join(tempfile.mkdtemp(prefix="guardian-bench-"), "bench.db")
+    env = _env(db_path, mode)
+    me = [sys.executable, "-m", "bench.db_contention"]
+    subprocess.run(me + ["--role", "seed", "--holdings", str(args.holdings)], env=env, check=True)
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                if httpx.get(base + "/health").status_code == 200:
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        idle, idle_err = asyncio.run(_read(base, args.holdings, args.readers, args.seconds / 2))
+        writer = subprocess.Popen(
+            me + ["--role", "writer", "--seconds", str(args.seconds + 2)], env=env, stdout=subprocess.PIPE, text=True,
+        )
+        time.sleep(1.0)
+        busy, busy_err = asyncio.run(_read(base, args.holdings, args.readers, args.seconds))
+        cycles = writer.communicate()[0].strip() or "?"
+    finally:
+        server.terminate()
+        server.wait()
+    print(
+        f"{mode:>7} {_pct(idle, 0.5):>9.1f} {_pct(idle, 0.99):>9.1f} {_pct(busy, 0.5):>9.1f} "
+        f"{_pct(busy, 0.99):>9.1f} {len(busy):>7} {idle_err + busy_err:>7} {cycles:>7}"
+    )
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--role", choices=["bench", "seed", "writer"], default="bench")
+    ap.add_argument("--holdings", type=int, default=2000)
+    ap.add_argument("--readers", type=int, default=16)
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    args = ap.parse_args()
+    if args.role == "seed":
+        return _seed(args.holdings, 20)
+    if args.role == "writer":
+        return _write(args.seconds)
+
+    print(f"holdings={args.holdings} readers={args.readers} seconds={args.seconds}")
+    print(f"{'mode':>7} {'idle p50':>9} {'idle p99':>9} {'busy p50':>9} {'busy p99':>9} {'reads':>7} {'errors':>7} {'cycles':>7}")
+    for mode in args.modes:
+        _run_mode(mode, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Local OpenAI-compatible stand-in for /chat/completions with configurable latency and 429s.
+
+    cd backend && python -m bench.fake_llm --port 8901 --latency-ms 300 --rate-limit 0.1
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeLLM:
+    def __init__(self, latency_ms: float = 200, rate_limit: float = 0.0, retry_after: float = 0.2, seed: int = 1):
+        self.latency_ms = latency_ms
+        self.rate_limit = rate_limit  # fraction of requests answered with 429
+        self.retry_after = retry_after
+        self.rnd = random.Random(seed)
+        self.calls = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.server: ThreadingHTTPServer | None = None
+
+    @staticmethod
+    def reply(prompt: str) -> str:
+        symbols = re.findall(r"\[([A-Z0-9.]+)\]", prompt)
+        if "JSON" in prompt and symbols:
+            return json.dumps({s: f"{s} 摘要" for s in symbols}, ensure_ascii=False)
+        m = re.search(r"总结 (\S+) ", prompt)
+        return f"{m.group(1) if m else '?'} 摘要"
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with fake._lock:
+                    fake.calls += 1
+                    limited = fake.rnd.random() < fake.rate_limit
+                    if limited:
+                        fake.rejected += 1
+                    else:
+                        fake.in_flight += 1
+                        fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                if limited:
+                    self._send(429, {"error": {"message": "rate limited"}}, {"Retry-After": str(fake.retry_after)})
+                    return
+                try:
+                    time.sleep(fake.latency_ms / 1000.0)
+                    prompt = body["messages"][-1]["content"]
+                    content = fake.reply(prompt)
+                    self._send(200, {
+                        "choices": [{"message": {"role": "assistant", "content": content}}],
+                        "usage": {"total_tokens": len(prompt) // 2 + len(content)},
+                    })
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+            def _send(self, status: int, payload: dict, headers: dict | None = None):
+                out = json.dumps(payload, ensure_ascii=False).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(out)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self, port: int = 0) -> str:
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self.handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def stop(self) -> None:
+        if self.server:
+            self.server.shutdown()
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8901)
+    ap.add_argument("--latency-ms", type=float, default=200)
+    ap.add_argument("--rate-limit", type=float, default=0.0)
+    args = ap.parse_args()
+    fake = FakeLLM(args.latency_ms, args.rate_limit)
+    print("serving", fake.start(args.port))
+    threading.Event().wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Top-bullet query: stale hot_score ordering over a 48h window vs. the decay-invariant rank_key index.
+
+Seeds one holding with `--items` content rows spread over 30 days (hot_score as computed at ingestion,
+i.e. some hours after publication) and compares each query's latency and how many of its top 30 are in
+the true top 30 by hotness right now.
+
+    cd backend && python -m bench.hot_ranking --items 50000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=50000)
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='guardian-bench-'), 'bench.db')}"
+
+    from datetime import datetime, timedelta, timezone
+    from sqlalchemy import insert
+    from app.config import settings
+    from app.content_pipeline import build_top_bullets
+    from app.db import SessionLocal, async_engine, init_db
+    from app.models import ContentItem, Holding, User
+    from app.scoring import hot_at, rank_key, time_decay_hours
+
+    init_db()
+    rnd = random.Random(7)
+    now = datetime.now(timezone.utc)
+    hl = settings.RANK_HALF_LIFE_HOURS
+    rows = []
+    for i in range(args.items):
+        ts = now - timedelta(hours=rnd.random() * 24 * 30)
+        base = rnd.lognormvariate(3.5, 1.0)
+        ingested = min(now, ts + timedelta(hours=rnd.random() * 6))
+        rk = rank_key(base, ts, hl)
+        rows.append({
+            "id": i + 1, "holding_id": 1, "ts": ts, "source": "reddit", "title": f"item {i}", "dedupe_key": f"{i:064d}",
+            "sentiment_score": 50.0, "hot_score": base * time_decay_hours(ts, ingested, hl), "rank_key": rk,
+            # 每条自成一簇，与 upsert_content_batch 写入的单条簇一致
+            "cluster_id": i + 1, "cluster_rank": rk, "cluster_size": 1, "cluster_ts": ts,
+        })
+    db = SessionLocal()
+    try:
+        db.add(User(id=1, email="bench@example.com", password_hash="x"))
+        db.add(Holding(id=1, user_id=1, symbol="BENCH", risk_pref="neutral"))
+        db.commit()
+        for i in range(0, len(rows), 5000):
+            db.execute(insert(ContentItem), rows[i:i + 5000])
+        db.commit()
+        holding = db.get(Holding, 1)
+        truth = {r["title"] for r in sorted(rows, key=lambda r: -hot_at(r["rank_key"], now, hl))[:30]}
+
+        def legacy() -> list[str]:
+            since = now - timedelta(hours=48)
+            q = (
+                db.query(ContentItem.title)
+                .filter(ContentItem.holding_id == 1, ContentItem.ts >= since)
+                .order_by(ContentItem.hot_score.desc(), ContentItem.ts.desc())
+                .limit(30)
+            )
+            return [r.title for r in q]
+
+        def ranked() -> list[str]:
+            return [b.rsplit(" (hot:", 1)[0] for b in build_top_bullets(db, holding, limit=30)]
+
+        print(f"items={args.items} half-life={hl}h")
+        print(f"{'query':>8} {'ms/query':>9} {'top-30 correct':>15}")
+        for name, fn in (("legacy", legacy), ("rank_key", ranked)):
+            top = fn()
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                fn()
+            ms = (time.perf_counter() - t0) * 1000 / args.repeat
+            print(f"{name:>8} {ms:>9.2f} {len(truth & set(top)):>12}/30")
+    finally:
+        db.close()
+        asyncio.run(async_engine.dispose())
+
+if __name__ == "__main__":
+    main()
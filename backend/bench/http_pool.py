@@ -0,0 +1,77 @@
+"""Per-request latency with and without the shared HTTP pool, against a local stand-in server.
+
+    cd backend && python -m bench.http_pool --requests 500 --concurrency 8
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        body = b"Symbol,Date,Time,Open,High,Low,Close,Volume\nAAPL.US,2024-01-02,22:00:00,1,2,0.5,1.5,1000\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def _start_server() -> tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/q/l/"
+
+async def _unpooled(url: str) -> None:
+    import httpx
+    async with httpx.AsyncClient(timeout=15) as client:
+        (await client.get(url)).raise_for_status()
+
+async def _pooled(url: str) -> None:
+    from app.http_clients import get_client
+    (await get_client(url).get(url)).raise_for_status()
+
+async def _measure(fn, url: str, n: int, concurrency: int) -> list[float]:
+    sem = asyncio.Semaphore(concurrency)
+    lat: list[float] = []
+
+    async def one():
+        async with sem:
+            t0 = time.perf_counter()
+            await fn(url)
+            lat.append((time.perf_counter() - t0) * 1000)
+
+    await asyncio.gather(*[one() for _ in range(n)])
+    return lat
+
+async def _run(n: int, concurrency: int) -> None:
+    from app.http_clients import close_clients
+    server, url = _start_server()
+    try:
+        print(f"{'mode':>9} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'total s':>8}")
+        for name, fn in (("unpooled", _unpooled), ("pooled", _pooled)):
+            t0 = time.perf_counter()
+            lat = sorted(await _measure(fn, url, n, concurrency))
+            total = time.perf_counter() - t0
+            p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+            print(f"{name:>9} {statistics.mean(lat):>8.2f} {statistics.median(lat):>8.2f} {p99:>8.2f} {total:>8.2f}")
+        await close_clients()
+    finally:
+        server.shutdown()
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, default=8)
+    args = ap.parse_args()
+    asyncio.run(_run(args.requests, args.concurrency))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Requests per second on /api/portfolio/holdings and /api/auth/me with the identity cache off vs. on.
+
+The app is driven in-process through httpx's ASGI transport, so the numbers are server-side cost per
+request without socket or client-process noise. "uncached" sets the cache TTLs to 0, i.e. the previous
+behaviour: the default user (or the JWT subject) is looked up in the DB on every request and every
+token is decoded again. Modes alternate over several rounds; the median is reported.
+
+    cd backend && python -m bench.identity_cache --requests 2000 --rounds 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--holdings", type=int, default=20)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--rounds", type=int, default=5)
+    args = ap.parse_args()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='guardian-bench-'), 'bench.db')}"
+    os.environ.update(MARKET_DATA_PROVIDER="mock", AGENT_COORDINATION="none")
+
+    import httpx
+    from sqlalchemy import insert
+    from app import identity
+    from app.auth import create_access_token, hash_password
+    from app.db import SessionLocal, async_engine
+    from app.main import app
+    from app.models import Holding, User
+
+    db = SessionLocal()
+    db.execute(insert(User), [
+        {"id": 1, "email": identity.DEFAULT_EMAIL, "password_hash": hash_password("def")},
+        {"id": 2, "email": "bench@example.com", "password_hash": hash_password("pw")},
+    ])
+    db.execute(insert(Holding), [{"user_id": 1, "symbol": f"S{i:03d}", "risk_pref": "neutral"} for i in range(args.holdings)])
+    db.commit()
+    db.close()
+    auth = {"Authorization": f"Bearer {create_access_token('bench@example.com')}"}
+    ttl = identity.users.ttl
+
+    async def load(client: httpx.AsyncClient, path: str, headers: dict) -> float:
+        left = args.requests
+
+        async def worker() -> None:
+            nonlocal left
+            while left > 0:
+                left -= 1
+                r = await client.get(path, headers=headers)
+                assert r.status_code == 200, r.text
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+        return args.requests / (time.perf_counter() - t0)
+
+    async def run() -> dict:
+        results = {(m, p): [] for m in ("uncached", "cached") for p in ("holdings", "me")}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for _ in range(args.rounds):
+                for mode in ("uncached", "cached"):
+                    identity.users.ttl = identity.tokens.ttl = 0 if mode == "uncached" else ttl
+                    identity.users.clear()
+                    identity.tokens.clear()
+                    results[mode, "holdings"].append(await load(client, "/api/portfolio/holdings", {}))
+                    results[mode, "me"].append(await load(client, "/api/auth/me", auth))
+        await async_engine.dispose()
+        return results
+
+    results = asyncio.run(run())
+    print(f"holdings={args.holdings} requests={args.requests} concurrency={args.concurrency} rounds={args.rounds}")
+    print(f"{'mode':>9} {'holdings req/s':>15} {'me req/s':>10}")
+    for mode in ("uncached", "cached"):
+        print(f"{mode:>9} {statistics.median(results[mode, 'holdings']):>15.0f} {statistics.median(results[mode, 'me']):>10.0f}")
+    print(f"cache: {identity.cache_stats()}")
+
+if __name__ == "__main__":
+    main()
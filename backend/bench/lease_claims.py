@@ -0,0 +1,116 @@
+"""Multi-process agent cycles sharing one SQLite database: each symbol must be processed exactly once per cycle.
+
+Every worker process runs the same cycles at the same time; with AGENT_COORDINATION=claim they split the
+symbols through the lease table, with "none" every worker processes everything.
+
+    cd backend && python -m bench.lease_claims --workers 4 --holdings 400 --cycles 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+def _env(db_path: str, coordination: str) -> dict:
+    env = dict(os.environ)
+    for k in ("LLM_BASE_URL", "LLM_API_KEY", "POLYGON_API_KEY", "REDDIT_CLIENT_ID", "TELEGRAM_BOT_TOKEN"):
+        env.pop(k, None)
+    env.update(
+        DATABASE_URL=f"sqlite:///{db_path}",
+        PRICE_HISTORY_DIR=os.path.join(os.path.dirname(db_path), "prices"),
+        MARKET_DATA_PROVIDER="mock",
+        MARKET_MOCK_LATENCY_MS="50",
+        AGENT_COORDINATION=coordination,
+    )
+    return env
+
+def _seed(holdings: int) -> None:
+    from sqlalchemy import insert
+    from app.db import SessionLocal, init_db
+    from app.models import User, Holding
+    init_db()
+    db = SessionLocal()
+    try:
+        users = (holdings + 9) // 10
+        db.execute(insert(User), [{"id": u + 1, "email": f"u{u}@example.com", "password_hash": "x"} for u in range(users)])
+        db.execute(insert(Holding), [
+            {"id": i + 1, "user_id": i // 10 + 1, "symbol": f"S{i:04d}", "risk_pref": "neutral"} for i in range(holdings)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+def _worker(cycles: list[int], start_at: list[float]) -> None:
+    from app.agent import run_agent_once
+    from app.db import AsyncSessionLocal, async_engine
+
+    async def run() -> None:
+        try:
+            for cycle, at in zip(cycles, start_at):
+                await asyncio.sleep(max(0.0, at - time.time()))
+                async with AsyncSessionLocal() as db:
+                    await run_agent_once(db, cycle=cycle)
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(run())
+
+def _run(coordination: str, args) -> None:
+    db_path = os.path.join(tempfile.mkdtemp(prefix="guardian-bench-"), "bench.db")
+    env = _env(db_path, coordination)
+    me = [sys.executable, "-m", "bench.lease_claims"]
+    subprocess.run(me + ["--role", "seed", "--holdings", str(args.holdings)], env=env, check=True)
+
+    window = 15 * 60
+    base = int(time.time() // window)
+    cycles = [base + k for k in range(args.cycles)]
+    start = time.time() + 2.0
+    start_at = [start + k * args.period for k in range(args.cycles)]
+    spec = json.dumps({"cycles": cycles, "start_at": start_at})
+    t0 = time.perf_counter()
+    procs = [subprocess.Popen(me + ["--role", "worker", "--spec", spec], env=env) for _ in range(args.workers)]
+    for p in procs:
+        p.wait()
+    elapsed = time.perf_counter() - t0
+
+    import sqlite3
+    con = sqlite3.connect(db_path)
+    per_holding = Counter(dict(con.execute("SELECT holding_id, COUNT(*) FROM snapshots GROUP BY holding_id").fetchall()))
+    owners = Counter(
+        owner.rsplit(":", 1)[0]
+        for (owner,) in con.execute("SELECT owner FROM leases WHERE name LIKE 'agent:%'").fetchall()
+    )
+    con.close()
+    exact = all(per_holding.get(h, 0) == args.cycles for h in range(1, args.holdings + 1))
+    total = sum(per_holding.values())
+    print(
+        f"{coordination:>6} {args.workers:>7} {total:>10} {args.holdings * args.cycles:>9} "
+        f"{'yes' if exact else 'NO':>11} {elapsed:>8.1f}  {sorted(owners.values(), reverse=True)}"
+    )
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--role", choices=["bench", "seed", "worker"], default="bench")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--holdings", type=int, default=400)
+    ap.add_argument("--cycles", type=int, default=3)
+    ap.add_argument("--period", type=float, default=8.0, help="seconds between cycle starts")
+    ap.add_argument("--modes", nargs="+", default=["none", "claim"], choices=["none", "claim"])
+    ap.add_argument("--spec")
+    args = ap.parse_args()
+    if args.role == "seed":
+        return _seed(args.holdings)
+    if args.role == "worker":
+        spec = json.loads(args.spec)
+        return _worker(spec["cycles"], spec["start_at"])
+
+    print(f"{'mode':>6} {'workers':>7} {'snapshots':>10} {'expected':>9} {'exactly-once':>11} {'seconds':>8}  claims per worker")
+    for mode in args.modes:
+        _run(mode, args)
+
+if __name__ == "__main__":
+    main()
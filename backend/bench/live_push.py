@@ -0,0 +1,191 @@
+"""SSE fan-out: many idle subscribers on /api/live/stream while a separate process runs agent cycles.
+
+Checks that every subscriber receives every new snapshot exactly once, measures commit-to-delivery
+latency, and that a subscriber reconnecting with Last-Event-ID gets the rows it missed.
+
+    cd backend && python -m bench.live_push --subscribers 1000 --holdings 200 --cycles 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+def _env(db_path: str) -> dict:
+    env = dict(os.environ)
+    for k in ("LLM_BASE_URL", "LLM_API_KEY", "POLYGON_API_KEY", "REDDIT_CLIENT_ID", "TELEGRAM_BOT_TOKEN"):
+        env.pop(k, None)
+    env.update(
+        DATABASE_URL=f"sqlite:///{db_path}",
+        PRICE_HISTORY_DIR=os.path.join(os.path.dirname(db_path), "prices"),
+        MARKET_DATA_PROVIDER="mock",
+        QUOTE_CACHE_TTL_SECONDS="0",
+        AGENT_CRON_MINUTES="100000",  # the server must not run its own cycles
+        AGENT_COORDINATION="none",
+    )
+    return env
+
+def _seed(holdings: int) -> None:
+    from sqlalchemy import insert
+    from app.db import SessionLocal, init_db
+    from app.models import User, Holding
+    init_db()
+    db = SessionLocal()
+    try:
+        db.execute(insert(User), [{"id": 1, "email": "bench@example.com", "password_hash": "x"}])
+        db.execute(insert(Holding), [
+            {"id": i + 1, "user_id": 1, "symbol": f"S{i:04d}", "risk_pref": "neutral"} for i in range(holdings)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+def _write(cycles: int, gap: float) -> None:
+    from app.agent import run_agent_once
+    from app.db import AsyncSessionLocal, async_engine
+
+    async def run() -> None:
+        try:
+            for _ in range(cycles):
+                await asyncio.sleep(gap)
+                async with AsyncSessionLocal() as db:
+                    await run_agent_once(db)
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(run())
+
+async def _subscribe(client, url: str, got: list, lat: list, ready: asyncio.Event, stop: asyncio.Event, last_id=None):
+    headers = {"Last-Event-ID": last_id} if last_id else {}
+    async with client.stream("GET", url, headers=headers) as r:
+        ready.set()
+        event, data, eid = None, None, None
+        async for line in r.aiter_lines():
+            if stop.is_set():
+                return eid
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data = line[6:]
+            elif line.startswith("id: "):
+                eid = line[4:]
+            elif line == "" and event:
+                if event == "snapshot":
+                    row = json.loads(data)
+                    got.append(row["id"])
+                    ts = datetime.fromisoformat(row["ts"]).replace(tzinfo=timezone.utc)
+                    lat.append((datetime.now(timezone.utc) - ts).total_seconds() * 1000)
+                event = None
+    return eid
+
+async def _clients(base: str, args, env) -> None:
+    import httpx
+    me = [sys.executable, "-m", "bench.live_push"]
+    limits = httpx.Limits(max_connections=args.subscribers + 10, max_keepalive_connections=0)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(None, connect=30), limits=limits) as client:
+        stop = asyncio.Event()
+        gots = [[] for _ in range(args.subscribers)]
+        lat: list[float] = []
+        readies = [asyncio.Event() for _ in range(args.subscribers)]
+        t0 = time.perf_counter()
+        tasks = [
+            asyncio.create_task(_subscribe(client, base + "/api/live/stream", gots[i], lat, readies[i], stop))
+            for i in range(args.subscribers)
+        ]
+        await asyncio.gather(*[r.wait() for r in readies])
+        connect_s = time.perf_counter() - t0
+
+        # 一个会断线重连的订阅者：第一轮后断开，错过第二轮，带 Last-Event-ID 重连
+        resumed: list[int] = []
+        r_stop = asyncio.Event()
+        r_ready = asyncio.Event()
+        r_task = asyncio.create_task(_subscribe(client, base + "/api/live/stream", resumed, [], r_ready, r_stop))
+        await r_ready.wait()
+
+        writer = await asyncio.create_subprocess_exec(
+            *me, "--role", "writer", "--cycles", str(args.cycles), "--gap", str(args.gap), env=env,
+        )
+        expected = args.holdings * args.cycles
+        deadline = time.monotonic() + args.cycles * (args.gap + 30) + 30
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+            if len(resumed) >= args.holdings and not r_stop.is_set():
+                r_stop.set()  # 下一个事件到来时断开
+            if all(len(g) >= expected for g in gots):
+                break
+        await writer.wait()
+        last_id = await r_task if r_task.done() else None
+        if last_id is None:
+            r_task.cancel()
+        again: list[int] = []
+        r2_ready = asyncio.Event()
+        r2_stop = asyncio.Event()
+        r2 = asyncio.create_task(_subscribe(client, base + "/api/live/stream", again, [], r2_ready, r2_stop, last_id))
+        await r2_ready.wait()
+        for _ in range(40):
+            if len(set(resumed) | set(again)) >= expected:
+                break
+            await asyncio.sleep(0.25)
+        stats = (await client.get(base + "/health/live")).json()
+        stop.set()
+        r2_stop.set()
+        for t in tasks + [r2]:
+            t.cancel()
+        await asyncio.gather(*tasks, r2, return_exceptions=True)
+
+    exact = sum(1 for g in gots if len(g) == expected and len(set(g)) == expected)
+    lat.sort()
+    resumed_all = set(resumed) | set(again)
+    print(f"subscribers={args.subscribers} connect={connect_s:.1f}s snapshots/cycle={args.holdings} cycles={args.cycles}")
+    print(f"exactly-once: {exact}/{args.subscribers} subscribers received all {expected} snapshots")
+    if lat:
+        print(f"delivery latency ms: p50={lat[len(lat) // 2]:.0f} p99={lat[min(len(lat) - 1, int(len(lat) * 0.99))]:.0f} max={lat[-1]:.0f}")
+    print(
+        f"resume: first connection {len(set(resumed))}, after Last-Event-ID {len(set(again))}, "
+        f"union {len(resumed_all)}/{expected}, duplicates {len(resumed) + len(again) - len(resumed_all)}"
+    )
+    print(f"broker: {stats}")
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--role", choices=["bench", "seed", "writer"], default="bench")
+    ap.add_argument("--subscribers", type=int, default=1000)
+    ap.add_argument("--holdings", type=int, default=200)
+    ap.add_argument("--cycles", type=int, default=3)
+    ap.add_argument("--gap", type=float, default=3.0, help="seconds between agent cycles")
+    args = ap.parse_args()
+    if args.role == "seed":
+        return _seed(args.holdings)
+    if args.role == "writer":
+        return _write(args.cycles, args.gap)
+
+    import httpx
+    from bench.db_contention import _free_port
+    db_path = os.path.join(tempfile.mkdtemp(prefix="guardian-bench-"), "bench.db")
+    env = _env(db_path)
+    subprocess.run([sys.executable, "-m", "bench.live_push", "--role", "seed", "--holdings", str(args.holdings)], env=env, check=True)
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning",
+         "--backlog", str(args.subscribers + 100)],
+        env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                if httpx.get(base + "/health").status_code == 200:
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        asyncio.run(_clients(base, args, env))
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Top-30 bullets with syndicated news and cross-posted reddit threads, with and without near-duplicate clustering.
+
+Each of `--stories` stories is published by 1-6 outlets with small title variations and cross-posted to
+1-3 subreddits; every cycle re-fetches everything with growing reddit scores. "exact" disables clustering
+(CONTENT_DUP_JACCARD > 1) so only identical dedupe keys merge. "stable key" re-fetches the last cycle
+and shifts every hot label: the summary cache key of the bullets must not change.
+
+    cd backend && python -m bench.near_duplicates --stories 300 --cycles 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import tempfile
+import time
+
+OUTLETS = ["Reuters", "Bloomberg", "CNBC", "MarketWatch", "The Wall Street Journal", "Yahoo Finance"]
+SUBS = ["wallstreetbets", "stocks", "investing"]
+WORDS = (
+    "apple iphone sales china revenue guidance buyback dividend chip supplier tariff lawsuit antitrust "
+    "vision headset services growth margin analyst upgrade downgrade target launch delay recall probe"
+).split()
+
+def _stories(n: int, rnd: random.Random) -> list[list[str]]:
+    out = []
+    for _ in range(n):
+        base = rnd.sample(WORDS, 7)
+        out.append(["Apple"] + [w.capitalize() if rnd.random() < 0.3 else w for w in base])
+    return out
+
+def _variant(words: list[str], outlet: str, rnd: random.Random) -> str:
+    w = list(words)
+    roll = rnd.random()
+    if roll < 0.3:
+        w.append(f"- {outlet}")
+    elif roll < 0.5:
+        w.append(rnd.choice(["report", "sources", "update"]))
+    title = " ".join(w)
+    return title.upper() if rnd.random() < 0.1 else title
+
+def _run(mode: str, args) -> None:
+    from datetime import datetime, timedelta, timezone
+    from app import content_pipeline, sentiment
+    from app.summary_cache import summary_key
+    from app.config import settings
+    from app.db import SessionLocal
+    from app.models import ContentItem, Holding, User
+
+    settings.CONTENT_DUP_JACCARD = 1.01 if mode == "exact" else 0.75
+    vader_calls = 0
+    real_vader = sentiment.vader_score_0_100
+
+    def counted(texts):
+        nonlocal vader_calls
+        vader_calls += 1
+        return real_vader(texts)
+
+    sentiment.vader_score_0_100 = counted
+    sentiment._title_memo.clear()
+    rnd = random.Random(11)
+    stories = _stories(args.stories, rnd)
+    now = datetime.now(timezone.utc)
+    plan = []
+    for s, words in enumerate(stories):
+        age = rnd.random() * 48
+        outlets = rnd.sample(OUTLETS, rnd.randint(1, 6))
+        news = [
+            {"title": _variant(words, o, rnd), "publisher": {"name": o}, "article_url": f"https://{o}/{s}",
+             "published_utc": (now - timedelta(hours=age + rnd.random())).isoformat()}
+            for o in outlets
+        ]
+        posts = [
+            {"title": " ".join(words), "subreddit": sub, "url": f"https://reddit/{sub}/{s}",
+             "ts": now - timedelta(hours=age + rnd.random()), "score": rnd.randint(1, 500), "num_comments": rnd.randint(0, 80)}
+            for sub in rnd.sample(SUBS, rnd.randint(1, 3))
+        ]
+        plan.append((news, posts))
+
+    db = SessionLocal()
+    try:
+        user = User(email=f"{mode}@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+        holding = Holding(user_id=user.id, symbol=f"B{mode.upper()}", risk_pref="neutral")
+        db.add(holding)
+        db.commit()
+        def ingest(cycle: int) -> None:
+            news = [n for ns, _ in plan for n in ns]
+            posts = [dict(p, score=p["score"] * (cycle + 1)) for _, ps in plan for p in ps]
+            content_pipeline.ingest_polygon_news(db, holding, news)
+            content_pipeline.ingest_reddit(db, holding, posts)
+
+        t0 = time.perf_counter()
+        for cycle in range(args.cycles):
+            ingest(cycle)
+        ingest_s = time.perf_counter() - t0
+        rows = db.query(ContentItem).filter(ContentItem.holding_id == holding.id).count()
+        bullets = content_pipeline.build_top_bullets(db, holding, limit=30)
+        ingest(args.cycles - 1)  # 同样的内容再抓一轮，只有热度随时间变化
+        again = content_pipeline.build_top_bullets(db, holding, limit=30)
+        drifted = [re.sub(r"\(hot:(\d+)\)", lambda m: f"(hot:{int(m[1]) + 7})", b) for b in again]
+        stable = summary_key(holding.symbol, bullets) == summary_key(holding.symbol, again) == summary_key(holding.symbol, drifted)
+        distinct = {
+            next((i for i, words in enumerate(stories) if " ".join(words[1:]).lower() in b.lower()), None)
+            for b in bullets
+        }
+        print(
+            f"{mode:>9} {rows:>6} {vader_calls:>7} {len(distinct - {None}):>16}/30 "
+            f"{sum(len(b) for b in bullets):>12} {ingest_s:>9.2f} {'yes' if stable else 'NO':>10}"
+        )
+    finally:
+        db.close()
+        sentiment.vader_score_0_100 = real_vader
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--stories", type=int, default=300)
+    ap.add_argument("--cycles", type=int, default=5)
+    args = ap.parse_args()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='guardian-bench-'), 'bench.db')}"
+    from app.db import async_engine, init_db
+    init_db()
+    print(f"stories={args.stories} cycles={args.cycles}")
+    print(f"{'mode':>9} {'rows':>6} {'vader':>7} {'distinct stories':>19} {'prompt chars':>12} {'ingest s':>9} {'stable key':>10}")
+    try:
+        for mode in ("exact", "clustered"):
+            _run(mode, args)
+    finally:
+        asyncio.run(async_engine.dispose())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Per-cycle cost of price-history features: memory-mapped store vs. recomputing from snapshot rows.
+
+"store" is what the agent does each cycle: append one quote per symbol and read the window features
+from the mapped files. "snapshots" reads the same window of StockSnapshot prices from the DB and
+computes the same statistics in NumPy, i.e. the only alternative without a local store.
+
+    cd backend && python -m bench.price_history --symbols 500 --days 30
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+SESSION_POINTS = 26  # 6.5h 交易时段，每 15 分钟一个点
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--symbols", type=int, default=500)
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--cycles", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    tmp = tempfile.mkdtemp(prefix="guardian-bench-")
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}", PRICE_HISTORY_DIR=os.path.join(tmp, "prices"))
+
+    import numpy as np
+    from sqlalchemy import insert, select
+    from app.config import settings
+    from app.db import SessionLocal, init_db
+    from app.market import MarketQuote
+    from app.models import Holding, StockSnapshot, User
+    from app.price_history import RECORD, epoch_seconds, price_store, window_stats
+    from bench.datagen import tickers
+
+    init_db()
+    rnd = random.Random(args.seed)
+    symbols = tickers(args.symbols, args.seed)
+    start = datetime.utcnow().replace(hour=13, minute=30, second=0, microsecond=0) - timedelta(days=args.days)
+    db = SessionLocal()
+    db.execute(insert(User), [{"id": 1, "email": "bench@example.com", "password_hash": "x"}])
+    db.execute(insert(Holding), [{"id": i + 1, "user_id": 1, "symbol": s} for i, s in enumerate(symbols)])
+    rows = []
+    for i, s in enumerate(symbols):
+        p = rnd.uniform(20, 400)
+        for day in range(args.days):
+            for k in range(SESSION_POINTS):
+                p *= 1 + rnd.gauss(0, 0.004)
+                rows.append({"holding_id": i + 1, "ts": start + timedelta(days=day, minutes=15 * k), "price": round(p, 2)})
+            p *= 1 + rnd.gauss(0, 0.02)
+    for i in range(0, len(rows), 5000):
+        db.execute(insert(StockSnapshot), rows[i:i + 5000])
+    db.commit()
+    t0 = time.perf_counter()
+    seeded = price_store.seed(db)
+    print(f"{len(symbols)} symbols, {len(rows)} snapshots; store seeded with {seeded} records in {time.perf_counter() - t0:.2f}s "
+          f"({seeded * RECORD.itemsize / 1e6:.1f} MB)")
+
+    window = settings.PRICE_WINDOW_DAYS * 86400
+    now = datetime.utcnow()
+    store_s, db_s = [], []
+    for c in range(args.cycles):
+        ts = now + timedelta(minutes=15 * c)
+        quotes = [MarketQuote(s, 100.0 + c + rnd.random(), 0.0, None) for s in symbols]
+        for q in quotes:
+            q.ts = ts
+        t0 = time.perf_counter()
+        feats = price_store.record_quotes(quotes)
+        store_s.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        since = ts - timedelta(seconds=window)
+        q = (
+            select(StockSnapshot.holding_id, StockSnapshot.ts, StockSnapshot.price)
+            .where(StockSnapshot.ts >= since).order_by(StockSnapshot.holding_id, StockSnapshot.ts)
+        )
+        by_holding: dict[int, list] = {}
+        for hid, t, p in db.execute(q):
+            by_holding.setdefault(hid, []).append((epoch_seconds(t), p))
+        for pts in by_holding.values():
+            a = np.zeros(len(pts), dtype=RECORD)
+            a["ts"], a["price"] = zip(*pts)
+            r = np.diff(np.log(a["price"]))
+            gap = np.diff(a["ts"]) >= settings.PRICE_GAP_HOURS * 3600
+            a["cum_r2"][1:] = np.cumsum(np.where(gap, 0.0, r * r))
+            a["sessions"] = 1 + np.concatenate([[0], np.cumsum(gap)])
+            a["gap_pct"][1:] = np.where(gap, np.expm1(r) * 100.0, 0.0)
+            window_stats(a, epoch_seconds(ts), window)
+        db_s.append(time.perf_counter() - t0)
+    db.close()
+    print(f"features for {len(feats)}/{len(symbols)} symbols per cycle, median of {args.cycles} cycles:")
+    print(f"  store (append + mapped window): {sorted(store_s)[len(store_s) // 2] * 1000:8.1f} ms")
+    print(f"  from snapshot rows:             {sorted(db_s)[len(db_s) // 2] * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Rule evaluation time per cycle: per-holding get_or_create_rule + should_trigger vs the NumPy RuleTable.
+
+    cd backend && python -m bench.rule_engine --sizes 100 1000 10000 50000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    args = ap.parse_args()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='guardian-bench-'), 'bench.db')}"
+
+    from sqlalchemy import delete, insert
+    from app.db import SessionLocal, init_db
+    from app.models import User, Holding, TriggerRule
+    from app.rules import RuleTable, get_or_create_rule, should_trigger
+    init_db()
+
+    print(f"{'rules':>7} {'scalar ms':>10} {'vector ms':>10}")
+    rnd = random.Random(5)
+    for n in args.sizes:
+        db = SessionLocal()
+        try:
+            for model in (TriggerRule, Holding, User):
+                db.execute(delete(model))
+            db.execute(insert(User), [{"id": 1, "email": "bench@example.com", "password_hash": "x"}])
+            db.execute(insert(Holding), [{"id": i + 1, "user_id": 1, "symbol": f"S{i}", "risk_pref": "neutral"} for i in range(n)])
+            db.execute(insert(TriggerRule), [{"holding_id": i + 1} for i in range(n)])  # 规则已存在的稳态
+            db.commit()
+            holdings = db.query(Holding).all()
+            ids = [h.id for h in holdings]
+            risk = [rnd.random() * 10 for _ in ids]
+            sent = [rnd.random() * 100 for _ in ids]
+            hot = [rnd.random() * 100 for _ in ids]
+            change = [(rnd.random() - 0.5) * 16 for _ in ids]
+
+            t0 = time.perf_counter()
+            for h, a, b, c, d in zip(holdings, risk, sent, hot, change):
+                should_trigger(get_or_create_rule(db, h), a, b, c, d)
+            scalar = (time.perf_counter() - t0) * 1000
+
+            table = RuleTable()
+            table.evaluate(db, ids, risk, sent, hot, change)  # 首次加载
+            t0 = time.perf_counter()
+            table.evaluate(db, ids, risk, sent, hot, change)
+            vector = (time.perf_counter() - t0) * 1000
+            print(f"{n:>7} {scalar:>10.1f} {vector:>10.2f}")
+        finally:
+            db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""One local HTTP server standing in for every upstream: stooq, Polygon (quotes + news), Reddit (via praw),
+the OpenAI-compatible LLM and Telegram, each with its own latency and error rate.
+
+Responses are deterministic for a given seed and call sequence: news and Reddit listings advance by a few
+new items per call so repeated agent cycles see a realistic mix of known and new content, and every few
+news items is a reworded copy of the previous one (near-duplicate clustering has work to do).
+
+    cd backend && python -m bench.standins --port 8902 --symbols AAPL MSFT --upstream llm=300:0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from bench.fake_llm import FakeLLM
+
+SERVICES = ("stooq", "polygon", "reddit", "llm", "telegram")
+
+_SUBJECTS = ["shares", "stock", "earnings", "guidance", "revenue", "margins", "outlook", "buyback", "dividend", "CEO"]
+_VERBS = ["jumps", "slides", "beats", "misses", "raises", "cuts", "surges", "drops", "holds", "doubles"]
+_OBJECTS = [
+    "after analyst upgrade", "on weak demand", "ahead of product launch", "as rates climb", "on record quarter",
+    "amid supply concerns", "after guidance reset", "on takeover talk", "as insiders buy", "on regulatory probe",
+    "after index inclusion", "despite strong sales", "as competition heats up", "on China exposure",
+]
+_PUBLISHERS = ["Reuters", "Bloomberg", "The Motley Fool", "Benzinga", "Zacks", "Seeking Alpha"]
+_SUBREDDITS = ["wallstreetbets", "stocks", "investing"]
+
+@dataclass
+class Upstream:
+    latency_ms: float = 0.0
+    error_rate: float = 0.0  # fraction answered with an error (429 for llm/telegram, 502 otherwise)
+    calls: int = 0
+    errors: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+def parse_upstreams(specs: list[str], latency_ms: float = 0.0, error_rate: float = 0.0) -> dict[str, Upstream]:
+    """`name=latency_ms[:error_rate]` overrides on top of one default for every service."""
+    out = {name: Upstream(latency_ms, error_rate) for name in SERVICES}
+    for spec in specs:
+        name, _, rest = spec.partition("=")
+        if name not in out:
+            raise ValueError(f"unknown upstream {name!r}; expected one of {', '.join(SERVICES)}")
+        lat, _, err = rest.partition(":")
+        out[name] = Upstream(float(lat) if lat else latency_ms, float(err) if err else error_rate)
+    return out
+
+def headline(seed: int, symbol: str, i: int) -> str:
+    """News title number `i` of `symbol`; every 4th one rewords the one before (a syndicated copy)."""
+    r = random.Random(f"{seed}:{symbol}:news:{i}")
+    if i % 4 == 0:
+        return headline(seed, symbol, i - 1).replace(" in Q", " during Q", 1) + f" - {r.choice(_PUBLISHERS)}"
+    return f"{symbol} {r.choice(_SUBJECTS)} {r.choice(_VERBS)} {r.choice(_OBJECTS)} in {r.choice(['Q1', 'Q2', 'Q3', 'Q4'])}"
+
+def _iso(ts: datetime) -> str:
+    return ts.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # listen() 在构造时调用，必须是类属性；默认 5 会在并发建连时丢 SYN（重传等 1s）
+
+class StandIns:
+    def __init__(self, symbols: list[str], upstreams: dict[str, Upstream] | None = None, seed: int = 1,
+                 news_per_call: int = 2, reddit_per_call: int = 40):
+        self.symbols = [s.upper() for s in symbols]
+        self.upstreams = upstreams or parse_upstreams([])
+        self.seed = seed
+        self.news_per_call = news_per_call
+        self.reddit_per_call = reddit_per_call
+        self.rnd = random.Random(seed)
+        self.t0 = datetime.now(timezone.utc).replace(microsecond=0)
+        self._quote_calls: dict[str, int] = {}
+        self._news_calls: dict[str, int] = {}
+        self._reddit_head = 0
+        self.telegram_messages = 0
+        self.telegram_chars = 0
+        self._lock = threading.Lock()
+        self.server: ThreadingHTTPServer | None = None
+
+    # 行情：每个 symbol 一个确定的基准价，每次请求随机游走一步
+    def quote(self, symbol: str) -> tuple[float, float, float]:
+        """(open, close, volume) for the next request of `symbol`."""
+        with self._lock:
+            n = self._quote_calls[symbol] = self._quote_calls.get(symbol, -1) + 1
+        base = random.Random(f"{self.seed}:{symbol}").uniform(20, 400)
+        r = random.Random(f"{self.seed}:{symbol}:{n}")
+        open_ = round(base * (1 + r.gauss(0, 0.02)), 2)
+        close = round(open_ * (1 + r.gauss(0, 0.02)), 2)
+        return open_, close, float(r.randint(100_000, 5_000_000))
+
+    def news(self, symbol: str, limit: int) -> list[dict]:
+        with self._lock:
+            n = self._news_calls[symbol] = self._news_calls.get(symbol, 0) + 1
+        head = 50 + n * self.news_per_call
+        out = []
+        for i in range(head, max(0, head - limit), -1):
+            r = random.Random(f"{self.seed}:{symbol}:item:{i}")
+            out.append({
+                "id": f"{symbol}-{i}",
+                "title": headline(self.seed, symbol, i),
+                "publisher": {"name": r.choice(_PUBLISHERS)},
+                "article_url": f"https://news.example.com/{symbol.lower()}/{i}",
+                "published_utc": _iso(self.t0 - timedelta(minutes=(head - i) * 7)),
+            })
+        return out
+
+    def reddit_page(self, limit: int, after: str | None) -> dict:
+        # 全站共用一条 new 列表；每次从头请求都前进 reddit_per_call 条
+        with self._lock:
+            if after is None:
+                self._reddit_head += self.reddit_per_call
+            head = self._reddit_head + 1000
+        start = int(after.removeprefix("t3_p")) - 1 if after else head
+        children = []
+        for j in range(start, max(0, start - min(limit, 100)), -1):
+            r = random.Random(f"{self.seed}:post:{j}")
+            picks = r.sample(self.symbols, min(len(self.symbols), r.choice([1, 1, 2])))
+            tags = " and ".join(f"${s}" if r.random() < 0.5 else s for s in picks)
+            sub = r.choice(_SUBREDDITS)
+            children.append({"kind": "t3", "data": {
+                "id": f"p{j}", "name": f"t3_p{j}", "subreddit": sub,
+                "title": f"{tags} {r.choice(_VERBS)} {r.choice(_OBJECTS)}, thoughts?",
+                "permalink": f"/r/{sub}/comments/p{j}/post/",
+                "score": int(r.paretovariate(1.2) * 5), "num_comments": int(r.paretovariate(1.5) * 3),
+                "created_utc": (self.t0 - timedelta(minutes=(head - j) * 0.5)).timestamp(),
+            }})
+        after_out = children[-1]["data"]["name"] if children and start - len(children) > 0 else None
+        return {"kind": "Listing", "data": {"children": children, "after": after_out, "before": None}}
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # 头和正文分两次写出，否则每个响应多等一次延迟 ACK
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def _serve(self, method: str):
+                url = urlsplit(self.path)
+                q = {k: v[-1] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0) or 0))
+                service = fake._route(url.path)
+                if service is None:
+                    return self._send(404, {"error": "not found"})
+                up = fake.upstreams[service]
+                with fake._lock:
+                    up.calls += 1
+                    failed = fake.rnd.random() < up.error_rate
+                    up.errors += failed
+                    up.in_flight += 1
+                    up.max_in_flight = max(up.max_in_flight, up.in_flight)
+                try:
+                    if up.latency_ms > 0:
+                        time.sleep(up.latency_ms / 1000.0)
+                    if failed:
+                        if service == "llm":
+                            return self._send(429, {"error": {"message": "rate limited"}}, {"Retry-After": "0.2"})
+                        if service == "telegram":
+                            return self._send(429, {"ok": False, "parameters": {"retry_after": 1}})
+                        return self._send(502, {"error": "bad gateway"})
+                    status, payload, ctype = fake._respond(service, method, url.path, q, body)
+                    self._send(status, payload, content_type=ctype)
+                finally:
+                    with fake._lock:
+                        up.in_flight -= 1
+
+            def _send(self, status: int, payload, headers: dict | None = None, content_type: str = "application/json"):
+                out = payload.encode() if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(out)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(out)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    @staticmethod
+    def _route(path: str) -> str | None:
+        if path.startswith("/q/l"):
+            return "stooq"
+        if path.startswith("/v2/"):
+            return "polygon"
+        if path.startswith("/api/v1/access_token") or path.startswith("/r/"):
+            return "reddit"
+        if path.endswith("/chat/completions"):
+            return "llm"
+        if path.startswith("/bot"):
+            return "telegram"
+        return None
+
+    def _respond(self, service: str, method: str, path: str, q: dict, body: bytes) -> tuple[int, object, str]:
+        if service == "stooq":
+            lines = ["Symbol,Date,Time,Open,High,Low,Close,Volume"]
+            day = self.t0.strftime("%Y-%m-%d")
+            for s in q.get("s", "").replace(" ", "+").split("+"):  # parse_qs 把 + 解成空格
+                if not s:
+                    continue
+                o, c, v = self.quote(s.upper().removesuffix(".US"))
+                lines.append(f"{s.upper()},{day},22:00:00,{o},{max(o, c)},{min(o, c)},{c},{v:.0f}")
+            return 200, "\n".join(lines) + "\n", "text/csv"
+        if path.startswith("/v2/snapshot"):
+            tickers = []
+            for s in filter(None, q.get("tickers", "").split(",")):
+                o, c, v = self.quote(s)
+                tickers.append({"ticker": s, "day": {"o": o, "c": c, "v": v}, "prevDay": {"c": o}, "lastTrade": {"p": c}})
+            return 200, {"status": "OK", "tickers": tickers}, "application/json"
+        if service == "polygon":
+            return 200, {"status": "OK", "results": self.news(q.get("ticker", "").upper(), int(q.get("limit", 20)))}, "application/json"
+        if service == "reddit":
+            if method == "POST":
+                return 200, {"access_token": "standin", "token_type": "bearer", "expires_in": 86400, "scope": "*"}, "application/json"
+            return 200, self.reddit_page(int(q.get("limit", 100)), q.get("after")), "application/json"
+        if service == "llm":
+            prompt = json.loads(body or b"{}")["messages"][-1]["content"]
+            content = FakeLLM.reply(prompt)
+            return 200, {
+                "choices": [{"message": {"role": "assistant", "content": content}}],
+                "usage": {"total_tokens": len(prompt) // 2 + len(content)},
+            }, "application/json"
+        text = json.loads(body or b"{}").get("text", "")
+        with self._lock:
+            self.telegram_messages += 1
+            self.telegram_chars += len(text)
+        return 200, {"ok": True, "result": {"message_id": self.telegram_messages}}, "application/json"
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {
+                name: {"calls": u.calls, "errors": u.errors, "max_in_flight": u.max_in_flight}
+                for name, u in self.upstreams.items()
+            }
+            out["telegram"]["messages"] = self.telegram_messages
+        return out
+
+    def env(self) -> dict[str, str]:
+        """Settings pointing the app at this server (it must be started)."""
+        assert self.server is not None
+        base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        return {
+            "MARKET_DATA_PROVIDER": "stooq", "STOOQ_BASE_URL": base,
+            "POLYGON_BASE_URL": base, "POLYGON_API_KEY": "standin",
+            "REDDIT_OAUTH_URL": base, "REDDIT_URL": base,
+            "REDDIT_CLIENT_ID": "standin", "REDDIT_CLIENT_SECRET": "standin",
+            "LLM_BASE_URL": base + "/v1", "LLM_API_KEY": "standin",
+            "TELEGRAM_API_URL": base, "TELEGRAM_BOT_TOKEN": "standin", "TELEGRAM_CHAT_ID": "1",
+        }
+
+    def start(self, port: int = 0) -> str:
+        self.server = _Server(("127.0.0.1", port), self.handler())
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self) -> None:
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8902)
+    ap.add_argument("--symbols", nargs="+", default=["AAPL", "MSFT", "NVDA"])
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="default for every upstream")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="default for every upstream")
+    ap.add_argument("--upstream", nargs="*", default=[], metavar="NAME=MS[:ERR]")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    standins = StandIns(args.symbols, parse_upstreams(args.upstream, args.latency_ms, args.error_rate), args.seed)
+    print("serving", standins.start(args.port))
+    for k, v in standins.env().items():
+        print(f"{k}={v}")
+    threading.Event().wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""End-to-end load suite: synthetic data + local upstream stand-ins, one fresh database per scenario.
+
+Each scenario runs in its own process against bench.standins (stooq, Polygon, Reddit, LLM, Telegram) and
+measures, per phase:
+  ingest     content_pipeline news + reddit ingestion for a sample of holdings
+  agent      run_agent_once cycles (the first one cold)
+  daily      daily_agent.run_daily_reports
+  outbox     draining the Telegram outbox the previous phases filled
+  endpoints  p50/p99 of the report/portfolio endpoints, in-process over ASGI
+with wall time, SQL statements (both engines) and peak RSS. Results go to a JSON file; --baseline compares
+against an earlier one and exits 1 on regressions beyond --tolerance.
+
+    cd backend && python -m bench.suite --scenarios small medium --out bench-results.json
+    cd backend && python -m bench.suite --scenarios small --baseline bench-results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
+from bench.datagen import Shape
+from bench.standins import StandIns, parse_upstreams
+
+SCENARIOS = {
+    "small": Shape(users=10, holdings_per_user=5, symbols=30, snapshots_per_holding=96, content_per_holding=50),
+    "medium": Shape(users=100, holdings_per_user=10, symbols=200, snapshots_per_holding=96, content_per_holding=100),
+    "large": Shape(users=500, holdings_per_user=10, symbols=1000, snapshots_per_holding=96, content_per_holding=100),
+}
+DEFAULT_UPSTREAMS = ["stooq=40", "polygon=60", "reddit=80", "llm=150", "telegram=20"]
+INGEST_SAMPLE = 50  # holdings fed through content_pipeline in the ingest phase
+
+# (metric path, higher is better) checked by --baseline
+WATCHED = [
+    ("ingest.items_per_s", True),
+    ("ingest.queries_per_holding", False),
+    ("agent.warm_cycle_s", False),
+    ("agent.queries_per_cycle", False),
+    ("daily.s", False),
+    ("daily.queries", False),
+    ("peak_rss_mb", False),
+]
+
+def _pct(sorted_ms: list[float], p: float) -> float:
+    return sorted_ms[min(len(sorted_ms) - 1, int(len(sorted_ms) * p))]
+
+def _rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux: KiB
+
+class Counter:
+    """SQL statements sent on either engine."""
+
+    def __init__(self):
+        from sqlalchemy import event
+        from app.db import async_engine, engine
+        self.n = 0
+        for e in (engine, async_engine.sync_engine):
+            event.listen(e, "before_cursor_execute", self._count)
+
+    def _count(self, *_args) -> None:
+        self.n += 1
+
+class Phase:
+    """Wall time, statements and peak RSS of one block."""
+
+    def __init__(self, counter: Counter, out: dict):
+        self.counter = counter
+        self.out = out
+
+    def __enter__(self):
+        self.q0, self.t0 = self.counter.n, time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.out.update(s=round(time.perf_counter() - self.t0, 4), queries=self.counter.n - self.q0, rss_mb=round(_rss_mb(), 1))
+
+def _ingest(standins: StandIns, counter: Counter, out: dict) -> None:
+    from app.config import settings
+    from app.content_pipeline import ingest_polygon_news, ingest_reddit
+    from app.db import SessionLocal
+    from app.models import Holding
+    from app.reddit_client import route_posts
+
+    db = SessionLocal()
+    try:
+        holdings = db.query(Holding).order_by(Holding.id).limit(INGEST_SAMPLE).all()
+        symbols = sorted({h.symbol for h in holdings})
+        posts = []
+        for _ in range(settings.REDDIT_SCAN_LIMIT // 100):
+            after = posts[-1]["name"] if posts else None
+            posts += [c["data"] for c in standins.reddit_page(100, after)["data"]["children"]]
+        posts = [
+            {"subreddit": p["subreddit"], "title": p["title"], "url": "https://www.reddit.com" + p["permalink"],
+             "score": p["score"], "num_comments": p["num_comments"],
+             "ts": datetime.fromtimestamp(p["created_utc"], tz=timezone.utc)}
+            for p in posts
+        ]
+        reddit = route_posts(posts, symbols, settings.REDDIT_LIMIT)
+        news = {s: standins.news(s, settings.NEWS_LIMIT) for s in symbols}
+        items = 0
+        with Phase(counter, out):
+            for h in holdings:
+                items += ingest_polygon_news(db, h, news[h.symbol])
+                items += ingest_reddit(db, h, reddit.get(h.symbol, []))
+        out.update(
+            holdings=len(holdings), items=items, items_per_s=round(items / max(out["s"], 1e-9), 1),
+            queries_per_holding=round(out["queries"] / max(1, len(holdings)), 2),
+        )
+    finally:
+        db.close()
+
+async def _endpoints(paths: list[tuple[str, str]], requests: int, concurrency: int) -> dict:
+    import httpx
+    from app.main import app
+    out = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for name, path in paths:
+            lat: list[float] = []
+            left = requests
+
+            async def worker() -> None:
+                nonlocal left
+                while left > 0:
+                    left -= 1
+                    t0 = time.perf_counter()
+                    r = await client.get(path)
+                    lat.append((time.perf_counter() - t0) * 1000)
+                    assert r.status_code == 200, (path, r.status_code, r.text[:200])
+
+            await client.get(path)  # 预热
+            t0 = time.perf_counter()
+            await asyncio.gather(*[worker() for _ in range(concurrency)])
+            wall = time.perf_counter() - t0
+            lat.sort()
+            out[name] = {
+                "path": path, "p50_ms": round(_pct(lat, 0.5), 2), "p99_ms": round(_pct(lat, 0.99), 2),
+                "req_per_s": round(len(lat) / wall, 1),
+            }
+    return out
+
+def run_scenario(name: str, args) -> dict:
+    """Child process: seed, point the app at the stand-ins, run every phase."""
+    shape = SCENARIOS[name]
+    from bench.datagen import tickers
+    defaults = DEFAULT_UPSTREAMS if args.latency_ms is None else []
+    upstreams = parse_upstreams(defaults + args.upstream, args.latency_ms or 0.0, args.error_rate)
+    standins = StandIns(tickers(shape.symbols, args.seed), upstreams, args.seed)
+    standins.start()
+    os.environ.update(standins.env())
+    tmp = tempfile.mkdtemp(prefix="guardian-bench-")
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        PRICE_HISTORY_DIR=os.path.join(tmp, "prices"),
+        AGENT_COORDINATION="none",
+        QUOTE_CACHE_TTL_SECONDS="0",
+        LLM_RPM="0", LLM_TPM="0",  # 测吞吐，不测限速
+        TELEGRAM_MIN_INTERVAL_SECONDS="0",
+        praw_check_for_updates="False",
+    )
+
+    from app.db import AsyncSessionLocal, async_engine, init_db
+    from app.agent import run_agent_once
+    from app.daily_agent import run_daily_reports
+    from app.notify import drain_outbox
+    from bench.datagen import generate
+
+    result: dict = {"shape": asdict(shape)}
+    init_db()
+    counter = Counter()
+    seed_out: dict = {}
+    with Phase(counter, seed_out):
+        counts = generate(shape, args.seed)
+    symbols = counts.pop("symbols")
+    result["seed"] = {**seed_out, **counts}
+    result["ingest"] = {}
+    _ingest(standins, counter, result["ingest"])
+
+    async def phases() -> None:
+        try:
+            cycles = []
+            for _ in range(args.cycles):
+                before = standins.stats()
+                c: dict = {}
+                async with AsyncSessionLocal() as db:
+                    with Phase(counter, c):
+                        c["alerts"] = await run_agent_once(db)
+                after = standins.stats()
+                c["upstream_calls"] = {k: after[k]["calls"] - before[k]["calls"] for k in ("stooq", "polygon", "reddit", "llm")}
+                cycles.append(c)
+            warm = cycles[1:] or cycles
+            result["agent"] = {
+                "cycles": cycles,
+                "cold_cycle_s": cycles[0]["s"],
+                "warm_cycle_s": round(statistics.median(c["s"] for c in warm), 4),
+                "queries_per_cycle": int(statistics.median(c["queries"] for c in warm)),
+                "holdings": counts["holdings"], "symbols": len(symbols),
+            }
+            daily: dict = {}
+            async with AsyncSessionLocal() as db:
+                with Phase(counter, daily):
+                    daily["reports"] = await run_daily_reports(db)
+            result["daily"] = daily
+            outbox: dict = {"rows": 0}
+            with Phase(counter, outbox):
+                while n := await drain_outbox():
+                    outbox["rows"] += n
+            outbox["messages"] = standins.stats()["telegram"]["messages"]
+            result["outbox"] = outbox
+            sym = (await _default_symbols() or symbols)[0]
+            result["endpoints"] = await _endpoints([
+                ("holdings", "/api/portfolio/holdings"),
+                ("snapshots", f"/api/reports/stock/{sym}/snapshots?limit=200"),
+                ("history", f"/api/reports/stock/{sym}/history?days=30"),
+                ("alerts", f"/api/reports/stock/{sym}/alerts"),
+                ("daily_reports", "/api/daily/reports"),
+            ], args.requests, args.concurrency)
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(phases())
+    result["upstreams"] = standins.stats()
+    result["peak_rss_mb"] = round(_rss_mb(), 1)
+    standins.stop()
+    return result
+
+async def _default_symbols() -> list[str]:
+    from sqlalchemy import select
+    from app.db import AsyncSessionLocal
+    from app.models import Holding
+    async with AsyncSessionLocal() as db:
+        return list((await db.execute(select(Holding.symbol).where(Holding.user_id == 1).order_by(Holding.id))).scalars())
+
+def _git() -> dict:
+    def run(*cmd: str) -> str:
+        try:
+            return subprocess.run(cmd, capture_output=True, text=True, timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+    return {"commit": run("git", "rev-parse", "HEAD") or None, "dirty": bool(run("git", "status", "--porcelain", "--untracked-files=no"))}
+
+def _get(d: dict, path: str):
+    for k in path.split("."):
+        if not isinstance(d, dict) or k not in d:
+            return None
+        d = d[k]
+    return d
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of the WATCHED metrics and endpoint p99s beyond `tolerance` (relative)."""
+    out = []
+    for name, res in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        watched = WATCHED + [(f"endpoints.{e}.p99_ms", False) for e in res.get("endpoints", {})]
+        for path, higher_better in watched:
+            new, old = _get(res, path), _get(base, path)
+            if not isinstance(new, (int, float)) or not isinstance(old, (int, float)) or old <= 0:
+                continue
+            change = (new - old) / old
+            if (-change if higher_better else change) > tolerance:
+                out.append(f"{name} {path}: {old} -> {new} ({change:+.0%})")
+    return out
+
+def _print(name: str, r: dict) -> None:
+    a, d, i = r["agent"], r["daily"], r["ingest"]
+    print(
+        f"[{name}] holdings={a['holdings']} symbols={a['symbols']} users={r['shape']['users']} "
+        f"content={r['seed']['content']} snapshots={r['seed']['snapshots']} (seeded in {r['seed']['s']:.1f}s)"
+    )
+    print(f"  ingest   {i['items_per_s']:.0f} items/s, {i['queries_per_holding']} queries/holding")
+    print(f"  agent    cold {a['cold_cycle_s']:.2f}s, warm {a['warm_cycle_s']:.2f}s, {a['queries_per_cycle']} queries/cycle")
+    print(f"  daily    {d['reports']} reports in {d['s']:.2f}s, {d['queries']} queries")
+    print(f"  outbox   {r['outbox']['rows']} rows in {r['outbox']['messages']} messages, {r['outbox']['s']:.2f}s")
+    for e, v in r["endpoints"].items():
+        print(f"  {e:<14} p50 {v['p50_ms']:.1f} ms  p99 {v['p99_ms']:.1f} ms  {v['req_per_s']:.0f} req/s")
+    print(f"  peak rss {r['peak_rss_mb']:.0f} MB")
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=["small", "medium"])
+    ap.add_argument("--cycles", type=int, default=3)
+    ap.add_argument("--requests", type=int, default=300, help="per endpoint")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--latency-ms", type=float, default=None, help="one latency for every upstream")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="for every upstream")
+    ap.add_argument("--upstream", nargs="*", default=[], metavar="NAME=MS[:ERR]", help=f"defaults: {' '.join(DEFAULT_UPSTREAMS)}")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default="bench-results.json")
+    ap.add_argument("--baseline", help="earlier --out file to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    ap.add_argument("--run", help=argparse.SUPPRESS)  # 子进程：只跑一个场景，结果写到 --out
+    args = ap.parse_args()
+    if args.run:
+        with open(args.out, "w") as f:
+            json.dump(run_scenario(args.run, args), f)
+        return
+
+    env = {k: v for k, v in os.environ.items() if not k.endswith(("_BASE_URL", "_API_KEY", "_API_URL")) and not k.startswith(("REDDIT_", "TELEGRAM_"))}
+    results = {
+        "meta": {
+            "git": _git(), "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "args": {k: v for k, v in vars(args).items() if k not in ("run", "out", "baseline")},
+            "upstreams": (DEFAULT_UPSTREAMS if args.latency_ms is None else []) + args.upstream,
+        },
+        "scenarios": {},
+    }
+    passthrough = sys.argv[1:]
+    for name in args.scenarios:
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            subprocess.run([sys.executable, "-m", "bench.suite", *passthrough, "--run", name, "--out", path], env=env, check=True)
+            with open(path) as f:
+                results["scenarios"][name] = json.load(f)
+        finally:
+            os.unlink(path)
+        _print(name, results["scenarios"][name])
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results: {args.out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} vs {args.baseline}")
+
+if __name__ == "__main__":
+    main()